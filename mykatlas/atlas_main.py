@@ -15,6 +15,8 @@ from mykatlas.base import ArgumentParserWithDefaults
 from mykatlas.base import DEFAULT_DB_NAME
 from mykatlas.base import sequence_parser_mixin
 from mykatlas.base import sequence_or_binary_parser_mixin
+from mykatlas.base import mccortex_options_mixin
+from mykatlas.base import sample_sheet_mixin
 from mykatlas.base import probe_set_mixin
 from mykatlas.base import force_mixin
 from mykatlas.base import genotyping_mixin
@@ -33,6 +35,10 @@ def run_subtool(parser, args):
     #     from mykatlas.cmds.makeprobes import run
     if args.command == "genotype":
         from mykatlas.cmds.genotype import run
+    elif args.command == "genotype-batch":
+        from mykatlas.cmds.genotype_batch import run
+    elif args.command == "index-panel":
+        from mykatlas.cmds.index_panel import run
     elif args.command == "walk":
         from mykatlas.cmds.walk import run
     elif args.command == "place":
@@ -183,6 +189,34 @@ def main():
         help='genotype a sample using a probe set')
     parser_geno.set_defaults(func=run_subtool)
 
+    parser_geno_batch = subparsers.add_parser(
+        'genotype-batch',
+        parents=[
+            sample_sheet_mixin,
+            probe_set_mixin,
+            mccortex_options_mixin,
+            force_mixin,
+            genotyping_mixin],
+        help='genotype many samples using a probe set')
+    parser_geno_batch.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help='number of samples to genotype at once. --threads are split between them',
+        default=1)
+    parser_geno_batch.add_argument(
+        '--out_dir',
+        type=str,
+        help='write <sample>.json files here instead of printing JSON',
+        default=None)
+    parser_geno_batch.set_defaults(func=run_subtool)
+
+    parser_index_panel = subparsers.add_parser(
+        'index-panel',
+        parents=[probe_set_mixin],
+        help='precompute probe metadata for a probe set so genotyping needn\'t parse probe names')
+    parser_index_panel.set_defaults(func=run_subtool)
+
     ##############
     ## Walk ##
     #############
@@ -199,6 +233,26 @@ def main():
         default=False,
         action="store_true")
     parser_walk.add_argument('--show-all-paths', action="store_true")
+    parser_walk.add_argument(
+        '--kmer_cache_mb',
+        type=int,
+        help='memory cap (MB) for cached kmer queries',
+        default=256)
+    parser_walk.add_argument(
+        '--max_branches',
+        type=int,
+        help='give up on a walk that branches into more paths than this',
+        default=100)
+    parser_walk.add_argument(
+        '--unitigs',
+        help='index the unitigs of the graph and walk a unitig at a time',
+        default=False,
+        action="store_true")
+    parser_walk.add_argument(
+        '--in_process',
+        help='read the graph in process instead of running mccortex31 server (k <= 32)',
+        default=False,
+        action="store_true")
     parser_walk.set_defaults(func=run_subtool)
 
     ##############
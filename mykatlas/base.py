@@ -20,53 +20,65 @@ DEFAULT_MCCORTEX_31 = "mccortex31"
 # os.path.dirname(
 #   os.path.realpath(__file__))+"/../mccortex/bin/mccortex31"
 
-sequence_or_graph_parser_mixin = argparse.ArgumentParser(add_help=False)
-sequence_or_graph_parser_mixin.add_argument(
-    'sample',
-    type=str,
-    help='sample id')
-sequence_or_graph_parser_mixin.add_argument(
+# Options for running mccortex on a sample, without the sample id
+mccortex_options_mixin = argparse.ArgumentParser(add_help=False)
+mccortex_options_mixin.add_argument(
     '-k',
     '--kmer',
     metavar='kmer',
     type=int,
     help='kmer length (default:21)',
     default=DEFAULT_KMER_SIZE)
-sequence_or_graph_parser_mixin.add_argument(
+mccortex_options_mixin.add_argument(
     '--tmp',
     help='tmp directory (default: tmp/)',
     default="tmp/")
-sequence_or_graph_parser_mixin.add_argument(
+mccortex_options_mixin.add_argument(
     '--keep_tmp',
     help="Dont remove tmp files",
     action="store_true")
-sequence_or_graph_parser_mixin.add_argument(
+mccortex_options_mixin.add_argument(
     '--skeleton_dir',
     help='directory for skeleton binaries',
     default="atlas/data/skeletons/")
-sequence_or_graph_parser_mixin.add_argument(
+mccortex_options_mixin.add_argument(
+    '--skeleton_cache_mb',
+    type=int,
+    help='remove least recently used skeleton binaries once they take up more than this (MB)',
+    default=10240)
+mccortex_options_mixin.add_argument(
     '--mccortex31_path',
     help='Path to mccortex31. Default %s' % DEFAULT_MCCORTEX_31,
     default=DEFAULT_MCCORTEX_31)
-sequence_or_graph_parser_mixin.add_argument(
+mccortex_options_mixin.add_argument(
     '-t',
     '--threads',
     type=int,
     help='threads',
     default=1)
-sequence_or_graph_parser_mixin.add_argument(
+mccortex_options_mixin.add_argument(
     '-m',
     '--memory',
     type=str,
     help='memory for graph constuction',
     default="1GB")
-sequence_or_graph_parser_mixin.add_argument(
+mccortex_options_mixin.add_argument(
     '--expected_depth',
     type=int,
     help='expected depth',
     default=None)
 
 
+sample_mixin = argparse.ArgumentParser(add_help=False)
+sample_mixin.add_argument(
+    'sample',
+    type=str,
+    help='sample id')
+
+sequence_or_graph_parser_mixin = argparse.ArgumentParser(
+    parents=[sample_mixin, mccortex_options_mixin], add_help=False)
+
+
 SEQUENCE_FILES_HELP_STRING = 'sequence files (fasta,fastq,bam)'
 sequence_parser_mixin = argparse.ArgumentParser(
     parents=[sequence_or_graph_parser_mixin], add_help=False)
@@ -92,6 +104,13 @@ sequence_or_binary_parser_mixin.add_argument(
     type=str,
     help='cortex graph binary')
 
+sample_sheet_mixin = argparse.ArgumentParser(add_help=False)
+sample_sheet_mixin.add_argument(
+    'samples',
+    metavar='samples',
+    type=str,
+    help='tab separated file of sample id and its sequence files or cortex graph binary')
+
 probe_set_mixin = argparse.ArgumentParser(add_help=False)
 probe_set_mixin.add_argument(
     'probe_set',
@@ -107,6 +126,10 @@ force_mixin.add_argument(
     help='force')
 
 genotyping_mixin = argparse.ArgumentParser(add_help=False)
+genotyping_mixin.add_argument(
+    '--stream',
+    action='store_true',
+    help="parse coverages as mccortex writes them instead of via a tmp file. The sample graph is only written with --keep_tmp")
 genotyping_mixin.add_argument(
     '--ont',
     action='store_true',
@@ -12,6 +12,12 @@ logger = logging.getLogger(__name__)
 
 def run_main(parser, args):
     args = parser.parse_args()
+    return genotype_sample(args)
+
+
+def genotype_sample(args):
+    """Genotypes args.sample from args.seq or args.ctx against
+    args.probe_set"""
     verbose = True
     if args.ont:
         args.expected_error_rate = 0.15
@@ -33,6 +39,9 @@ def run_main(parser, args):
         verbose=verbose,
         tmp_dir=args.tmp,
         skeleton_dir=args.skeleton_dir,
+        skeleton_cache_max_bytes=args.skeleton_cache_mb * 1024 * 1024,
+        stream=args.stream,
+        keep_tmp=args.keep_tmp,
         threads=args.threads,
         memory=args.memory,
         mccortex31_path=args.mccortex31_path)
@@ -63,7 +72,9 @@ def run_main(parser, args):
         report_all_calls=args.report_all_calls,
         variant_confidence_threshold=args.min_variant_conf,
         sequence_confidence_threshold=args.min_gene_conf,
-        min_gene_percent_covg_threshold=args.min_gene_percent_covg_threshold)
+        min_gene_percent_covg_threshold=args.min_gene_percent_covg_threshold,
+        probe_ids=cp.probe_ids,
+        threads=args.threads)
     gt.run()
     if not args.keep_tmp:
         cp.remove_temporary_files()
@@ -0,0 +1,99 @@
+# Genotype many samples against one probe set
+from mykatlas.cmds.genotype import genotype_sample
+from mykatlas.cortex import McCortexGenoRunner
+from mykatlas.typing import Panel
+from mykatlas.reference_data import REFERENCE_DATA
+
+from multiprocessing import Pool
+from copy import copy
+import json
+import os
+import logging
+logger = logging.getLogger(__name__)
+
+
+def read_sample_sheet(filepath):
+    """Returns a list of (sample, seq, ctx) from a tab separated file of
+    sample id followed by either sequence files or one cortex graph
+    binary"""
+    samples = []
+    seen = set()
+    with open(filepath, 'r') as infile:
+        for line in infile:
+            row = line.strip().split("\t")
+            if not row[0] or row[0].startswith("#"):
+                continue
+            if len(row) < 2:
+                raise ValueError("No input files for sample %s" % row[0])
+            if row[0] in seen:
+                # Results are keyed by sample, so one would be lost
+                raise ValueError(
+                    "Sample %s is in the sample sheet more than once" % row[0])
+            seen.add(row[0])
+            if len(row) == 2 and row[1].endswith(".ctx"):
+                samples.append((row[0], None, row[1]))
+            else:
+                samples.append((row[0], row[1:], None))
+    return samples
+
+
+def build_skeleton(args):
+    """Builds (or finds in the cache) the skeleton binary for the probe set
+    once, so samples genotyped in parallel all reuse it"""
+    panels = [Panel(args.probe_set)]
+    runner = McCortexGenoRunner(
+        sample=None,
+        panels=panels,
+        kmer=args.kmer,
+        threads=args.threads,
+        memory=args.memory,
+        panel_name="-".join([panel.name for panel in panels]),
+        skeleton_dir=args.skeleton_dir,
+        mccortex31_path=args.mccortex31_path,
+        skeleton_cache_max_bytes=args.skeleton_cache_mb * 1024 * 1024)
+    runner._check_panels()
+    return runner.build_skeleton()
+
+
+def _genotype(item):
+    args, (sample, seq, ctx) = item
+    args = copy(args)
+    args.sample = sample
+    args.seq = seq
+    args.ctx = ctx
+    logger.info("Genotyping %s" % sample)
+    out_json = genotype_sample(args)
+    if args.out_dir:
+        with open(os.path.join(args.out_dir, "%s.json" % sample), 'w') as f:
+            json.dump(out_json, f, indent=1)
+        return {}
+    return out_json
+
+
+def run(parser, args):
+    samples = read_sample_sheet(args.samples)
+    build_skeleton(args)
+    if args.out_dir and not os.path.exists(args.out_dir):
+        os.makedirs(args.out_dir)
+    worker_args = args
+    if args.jobs > 1:
+        # Samples genotyped at once share --threads
+        worker_args = copy(args)
+        worker_args.threads = max(1, args.threads // args.jobs)
+    items = [(worker_args, sample) for sample in samples]
+    if args.jobs > 1:
+        # Loaded before forking so the workers share one copy
+        REFERENCE_DATA.preload()
+        pool = Pool(args.jobs)
+        try:
+            results = pool.map(_genotype, items, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_genotype(item) for item in items]
+    if not args.out_dir:
+        out_json = {}
+        for result in results:
+            out_json.update(result)
+        print(json.dumps(out_json, indent=1))
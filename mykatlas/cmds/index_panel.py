@@ -0,0 +1,10 @@
+from mykatlas.typing import Panel
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def run(parser, args):
+    panel = Panel(args.probe_set)
+    index = panel.build_index()
+    logger.info("Indexed %i probes to %s" % (len(index), panel.index_filepath))
@@ -1,16 +1,21 @@
 from __future__ import print_function
 import sys
-from mykatlas.cortex.server import WebServer
+from mykatlas.cortex.server import McCortexServerPool
 from mykatlas.cortex.server import McCortexQuery
 from mykatlas.cortex.server import GraphWalker
+from mykatlas.cortex.server import KmerCache
 from mykatlas.cortex.server import query_mccortex
+from mykatlas.cortex.unitigs import UnitigIndex
+from mykatlas.cortex.ctx import CtxGraph
 from mykatlas.utils import get_params
+from mykatlas.kmer import reverse_complement
 import socket
 import json
 from pprint import pprint
 import logging
 from Bio import SeqIO
 import argparse
+from multiprocessing.pool import ThreadPool
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -40,29 +45,30 @@ class PathDetails(object):
 def get_repeat_kmers(record, k):
     # Process repeat kmers
     kmers = {}
-    kmers_seq = []
-    for i in range(len(record.seq) - k + 1):
-        _kmers = [str(record.seq[i:i + k]),
-                  str(record.seq[i:i + k].reverse_complement())]
-        for kmer in _kmers:
-            kmers_seq.append(kmers_seq)
+    seq = str(record.seq)
+    for i in range(len(seq) - k + 1):
+        kmer = seq[i:i + k]
+        for kmer in [kmer, reverse_complement(kmer)]:
             if kmer in kmers:
                 c = max(kmers[kmer].keys()) + 1
-                kmers[kmer][c] = str(record.seq[i + 1:i + k + 1])
+                kmers[kmer][c] = seq[i + 1:i + k + 1]
             else:
                 kmers[kmer] = {}
-                kmers[kmer][1] = str(record.seq[i + 1:i + k + 1])
+                kmers[kmer][1] = seq[i + 1:i + k + 1]
     return kmers
 
 
-def find_start_kmer(seq, mcq, k):
-    skipped = 0
-    for i in range(len(seq) - k + 1):
-        kmer = seq[i:i + k]
-        q = mcq.query(kmer)
-        if q.data and q.depth > 1:
-            return kmer, skipped
-        skipped += 1
+def find_start_kmer(seq, mcq, k, batch_size=32):
+    # Kmers are looked up batch_size at a time so a seed that isn't in the
+    # graph doesn't cost a round trip per position
+    kmers = [seq[i:i + k] for i in range(len(seq) - k + 1)]
+    for i in range(0, len(kmers), batch_size):
+        batch = kmers[i:i + batch_size]
+        results = mcq.query_many(batch)
+        for j, kmer in enumerate(batch):
+            q = results[kmer]
+            if q is not None and q.data and q.depth > 1:
+                return kmer, i + j
     return None, -1
 
 
@@ -108,6 +114,33 @@ def get_paths_for_gene(gene_name, gene_dict, gw):
     return paths
 
 
+def walk_genes(genes, pool, walkers):
+    """Walks every gene, handing genes out across the servers in the pool.
+    Returns a list of (gene_name, paths) in the same order as genes.
+
+    With no pool the graph is loaded in process and walkers[None] walks
+    every gene"""
+    if pool is None:
+        return [(gene_name, get_paths_for_gene(
+            gene_name, gene_dict, walkers[None]))
+            for gene_name, gene_dict in genes.items()]
+
+    def _walk(item):
+        gene_name, gene_dict = item
+        with pool.checkout() as proc:
+            logger.debug("Walking graph with seeds defined by %s" % gene_name)
+            return gene_name, get_paths_for_gene(
+                gene_name, gene_dict, walkers[proc])
+    if pool.size == 1:
+        return [_walk(item) for item in genes.items()]
+    thread_pool = ThreadPool(pool.size)
+    try:
+        return thread_pool.map(_walk, list(genes.items()))
+    finally:
+        thread_pool.close()
+        thread_pool.join()
+
+
 def check_args(args):
     if args.seq is None and args.ctx is None:
         raise ValueError("Requires either -1 or -c to be set")
@@ -134,16 +167,39 @@ def run(parser, args):
         _out_dict[args.sample] = {}
     _out_dict[args.sample]["paths"] = {}
     out_dict = _out_dict[args.sample]["paths"]
-    wb = WebServer(
-        port=0,
-        args=[
-            args.ctx],
-        memory=args.memory,
-        mccortex_path=args.mccortex31_path)
-    logger.debug("Loading binary")
-    wb.start()
+    if args.unitigs:
+        unitigs = UnitigIndex.from_graph(
+            args.ctx, kmer_size=args.kmer,
+            mccortex_path=args.mccortex31_path)
+    else:
+        unitigs = None
+    cache = None
+    if args.in_process:
+        wb = None
+        logger.debug("Loading binary in process")
+        gw = GraphWalker(proc=None, kmer_size=args.kmer,
+                         print_depths=True, max_branches=args.max_branches,
+                         unitigs=unitigs, mcq=CtxGraph(args.ctx))
+        walkers = {None: gw}
+    else:
+        wb = McCortexServerPool(
+            size=args.threads,
+            args=[
+                args.ctx],
+            memory=args.memory,
+            mccortex_path=args.mccortex31_path)
+        logger.debug("Loading binary")
+        wb.start()
+        # One cache for all servers as they're all loaded with the same
+        # graph
+        cache = KmerCache(max_bytes=args.kmer_cache_mb * 1024 * 1024)
+        walkers = {proc: GraphWalker(proc=proc, kmer_size=args.kmer,
+                                     print_depths=True, cache=cache,
+                                     max_branches=args.max_branches,
+                                     unitigs=unitigs)
+                   for proc in wb.procs}
+        gw = walkers[wb.procs[0]]
     logger.debug("Walking the graph")
-    gw = GraphWalker(proc=wb.mccortex, kmer_size=args.kmer, print_depths=True)
     with open(args.probe_set, 'r') as infile:
         for i, record in enumerate(SeqIO.parse(infile, "fasta")):
             repeat_kmers = get_repeat_kmers(record, args.kmer)
@@ -154,7 +210,7 @@ def run(parser, args):
                 logger.debug("Loading kmer data for %s" % (gene_name))
             last_kmer = str(record.seq)[-args.kmer:]
             start_kmer, skipped = find_start_kmer(
-                str(record.seq), gw.mcq, args.kmer)
+                str(record.seq), gw, args.kmer)
             if gene_name not in genes:
                 genes[gene_name] = {}
                 genes[gene_name]["pathdetails"] = []
@@ -168,9 +224,7 @@ def run(parser, args):
             if gene_name in genes:
                 genes[gene_name]["known_kmers"] += "%sN" % str(record.seq)
 
-    for gene_name, gene_dict in genes.items():
-        logger.debug("Walking graph with seeds defined by %s" % gene_name)
-        paths = get_paths_for_gene(gene_name, gene_dict, gw)
+    for gene_name, paths in walk_genes(genes, wb, walkers):
         if args.show_all_paths:
             out_dict[gene_name] = paths.values()
         else:
@@ -183,6 +237,8 @@ def run(parser, args):
                 best_path = {"found": False}
             out_dict[gene_name] = [best_path]
     print (json.dumps(_out_dict, sort_keys=False, indent=4))
+    if cache is not None:
+        logger.debug("Kmer cache: %s" % json.dumps(cache.stats))
     logger.info("Cleaning up")
     if wb is not None:
         wb.stop()
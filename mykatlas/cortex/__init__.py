@@ -3,3 +3,7 @@ from mykatlas.cortex.mccortex import McCortexJoin
 from mykatlas.cortex.mccortex import McCortexSubgraph
 from mykatlas.cortex.mccortex import McCortexUnitigs
 from mykatlas.cortex.server import McCortexQuery
+from mykatlas.cortex.server import McCortexServerPool
+from mykatlas.cortex.server import KmerCache
+from mykatlas.cortex.unitigs import UnitigIndex
+from mykatlas.cortex.ctx import CtxGraph
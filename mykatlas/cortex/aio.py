@@ -0,0 +1,188 @@
+"""asyncio clients for querying kmers in a mccortex graph.
+
+`AsyncMcCortexQuery` drives a `mccortex31 server` subprocess directly and
+`AsyncHTTPMcCortexQuery` talks to a running `WebServer`. Both return the same
+`McCortexQueryResult` objects as `McCortexQuery`, so many graphs (or many
+walks over one graph) can be queried from a single event loop without a
+thread per graph.
+"""
+import asyncio
+import collections
+import json
+import logging
+from asyncio.subprocess import PIPE
+
+from mykatlas.cortex.server import McCortexQueryResult
+from mykatlas.cortex.server import QUERY_BATCH_SIZE
+from mykatlas.cortex.server import _trim_prompt
+from mykatlas.cortex.server import preexec_function
+from mykatlas.utils import unique
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMcCortexQuery(object):
+
+    """Queries a mccortex server subprocess from an event loop.
+
+    Queries from any number of coroutines are written to the same pipe and
+    the responses matched back up in order. At most `max_in_flight` kmers
+    are written but not yet answered at any time."""
+
+    def __init__(self, args, memory="1GB", mccortex_path="mccortex31",
+                 max_in_flight=QUERY_BATCH_SIZE):
+        self.args = args
+        self.memory = memory
+        self.mccortex_path = mccortex_path
+        self.max_in_flight = max_in_flight
+        self.proc = None
+        self._pending = collections.deque()
+        self._in_flight = None
+        self._reader = None
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            self.mccortex_path,
+            "server",
+            "-m", self.memory,
+            "--single-line",
+            "--coverages",
+            *self.args,
+            stdin=PIPE,
+            stdout=PIPE,
+            preexec_fn=preexec_function)
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._reader = asyncio.ensure_future(self._read_responses())
+        # Give test query to check it works
+        await self._send(["hi"])
+
+    async def stop(self):
+        self.proc.stdin.write(b"q\n")
+        self.proc.stdin.close()
+        returncode = await self.proc.wait()
+        await self._reader
+        logger.info("McCortex exited with: %s " % str(returncode))
+
+    async def query(self, kmer, known_kmers=[]):
+        lines = await self._send([kmer])
+        return McCortexQueryResult(
+            kmer, json.loads(lines[0]), known_kmers=known_kmers)
+
+    async def query_many(self, kmers, known_kmers=[]):
+        kmers = unique(kmers)
+        lines = await self._send(kmers)
+        return {kmer: McCortexQueryResult(
+            kmer,
+            json.loads(line),
+            known_kmers=known_kmers) for kmer, line in zip(kmers, lines)}
+
+    async def _send(self, kmers):
+        loop = asyncio.get_event_loop()
+        futures = []
+        for kmer in kmers:
+            await self._in_flight.acquire()
+            # Appending the future and writing the kmer happen without
+            # yielding so responses are read back in the order of _pending
+            future = loop.create_future()
+            self._pending.append(future)
+            self.proc.stdin.write((kmer + "\n").encode("UTF-8"))
+            futures.append(future)
+        await self.proc.stdin.drain()
+        return await asyncio.gather(*futures)
+
+    async def _read_responses(self):
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                break
+            if not self._pending:
+                # Response to the quit command
+                continue
+            future = self._pending.popleft()
+            self._in_flight.release()
+            if not future.cancelled():
+                future.set_result(_trim_prompt(line.decode("UTF-8")))
+        while self._pending:
+            self._pending.popleft().set_exception(
+                ValueError("McCortex quit [%s]" % self.proc.returncode))
+
+
+class AsyncHTTPMcCortexQuery(object):
+
+    """Queries a `WebServer` over keep-alive HTTP connections.
+
+    Up to `max_connections` requests are in flight at once. Batches go to
+    POST /query so `query_many` is a single request."""
+
+    def __init__(self, host="localhost", port=2306, max_connections=4):
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self._idle = collections.deque()
+        self._connections = None
+
+    async def start(self):
+        self._connections = asyncio.Semaphore(self.max_connections)
+
+    async def stop(self):
+        while self._idle:
+            reader, writer = self._idle.popleft()
+            writer.close()
+
+    async def query(self, kmer, known_kmers=[]):
+        body = await self._request("GET", "/" + kmer)
+        return McCortexQueryResult(
+            kmer, json.loads(body), known_kmers=known_kmers)
+
+    async def query_many(self, kmers, known_kmers=[]):
+        kmers = unique(kmers)
+        out = {}
+        for i in range(0, len(kmers), QUERY_BATCH_SIZE):
+            batch = kmers[i:i + QUERY_BATCH_SIZE]
+            data = json.loads(
+                await self._request("POST", "/query", json.dumps(batch)))
+            if "error" in data:
+                raise ValueError(data["error"])
+            for kmer in batch:
+                out[kmer] = McCortexQueryResult(
+                    kmer, data[kmer], known_kmers=known_kmers)
+        return out
+
+    async def _request(self, method, path, body=""):
+        if self._connections is None:
+            await self.start()
+        async with self._connections:
+            if self._idle:
+                reader, writer = self._idle.popleft()
+            else:
+                reader, writer = await asyncio.open_connection(
+                    self.host, self.port)
+            try:
+                response = await self._round_trip(
+                    reader, writer, method, path, body)
+            except Exception:
+                writer.close()
+                raise
+            self._idle.append((reader, writer))
+            return response
+
+    async def _round_trip(self, reader, writer, method, path, body):
+        body = body.encode("UTF-8")
+        writer.write(("%s %s HTTP/1.1\r\n"
+                      "Host: %s:%i\r\n"
+                      "Content-Length: %i\r\n\r\n" % (
+                          method, path, self.host, self.port,
+                          len(body))).encode("UTF-8") + body)
+        await writer.drain()
+        status = await reader.readline()
+        if not status:
+            raise ValueError("Webserver closed the connection")
+        length = 0
+        while True:
+            header = (await reader.readline()).decode("UTF-8").strip()
+            if not header:
+                break
+            name, _, value = header.partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return (await reader.readexactly(length)).decode("UTF-8")
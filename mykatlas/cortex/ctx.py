@@ -0,0 +1,190 @@
+"""Reads mccortex .ctx graph files in process.
+
+`CtxGraph` answers the same queries as `mccortex31 server` without starting
+a subprocess. The first time a graph is opened, its records are sorted by
+kmer and written to a `.sorted.npy` file next to it. That file is
+memory-mapped and searched with a binary search, so every process reading
+the same graph shares one copy through the OS page cache.
+
+Only graphs with k <= 32 (one 64 bit word per kmer) and, for version 7,
+without shades are supported.
+"""
+import os
+import struct
+import logging
+
+import numpy as np
+
+from mykatlas.cortex.server import McCortexQueryResult
+from mykatlas.kmer import encode
+from mykatlas.kmer import decode
+from mykatlas.kmer import canonical
+from mykatlas.utils import unique
+logger = logging.getLogger(__name__)
+
+CTX_MAGIC = b"CORTEX"
+SORTED_SUFFIX = ".sorted.npy"
+_BASES = "ACGT"
+_COMPLEMENT_BASES = "TGCA"
+
+
+class _HeaderReader(object):
+
+    def __init__(self, infile):
+        self.infile = infile
+
+    def read(self, n):
+        data = self.infile.read(n)
+        if len(data) != n:
+            raise ValueError("Unexpected end of .ctx header")
+        return data
+
+    def unpack(self, fmt):
+        return struct.unpack("<" + fmt, self.read(struct.calcsize("<" + fmt)))
+
+    def string(self):
+        length, = self.unpack("I")
+        return self.read(length).decode("UTF-8", "replace")
+
+
+def read_ctx_header(infile):
+    """Returns a dict describing the graph and leaves infile at the first
+    kmer record"""
+    reader = _HeaderReader(infile)
+    if reader.read(len(CTX_MAGIC)) != CTX_MAGIC:
+        raise ValueError("Not a .ctx file")
+    version, kmer_size, num_words, num_colours = reader.unpack("4I")
+    if version < 6:
+        raise ValueError("Unsupported .ctx version %i" % version)
+    header = {"version": version,
+              "kmer_size": kmer_size,
+              "num_words": num_words,
+              "num_colours": num_colours}
+    if version >= 7:
+        header["num_kmers"], num_shades = reader.unpack("QI")
+        if num_shades:
+            # Shaded records are longer and aren't supported
+            raise ValueError("Unsupported .ctx with %i shades" % num_shades)
+    header["mean_read_lengths"] = list(reader.unpack("%iI" % num_colours))
+    header["total_seq"] = list(reader.unpack("%iQ" % num_colours))
+    header["sample_names"] = [reader.string() for _ in range(num_colours)]
+    # Sequencing error rates are stored as 16 byte long doubles
+    reader.read(16 * num_colours)
+    for _ in range(num_colours):
+        # Cleaning flags, thresholds and the name of the cleaning graph
+        reader.read(4)
+        reader.unpack("2I")
+        reader.string()
+    if reader.read(len(CTX_MAGIC)) != CTX_MAGIC:
+        raise ValueError("Malformed .ctx header")
+    header["offset"] = infile.tell()
+    return header
+
+
+def record_dtype(num_colours):
+    return np.dtype([("kmer", "<u8"),
+                     ("covgs", "<u4", (num_colours,)),
+                     ("edges", "u1", (num_colours,))])
+
+
+def _edge_bases(edges):
+    right = "".join(b for i, b in enumerate(_BASES) if edges & (1 << i))
+    left = "".join(b for i, b in enumerate(_COMPLEMENT_BASES)
+                   if edges & (1 << (i + 4)))
+    return "".join(sorted(left)), right
+
+
+class CtxGraph(object):
+
+    # No cache: lookups are a binary search of a memory-mapped array
+    cache = None
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, "rb") as infile:
+            self.header = read_ctx_header(infile)
+        if self.header["num_words"] != 1 or self.header["kmer_size"] > 32:
+            raise ValueError(
+                "In process graphs need k <= 32. %s has k=%i" % (
+                    filepath, self.header["kmer_size"]))
+        self.kmer_size = self.header["kmer_size"]
+        self.num_colours = self.header["num_colours"]
+        self.records = self._load_sorted()
+        self._kmers = self.records["kmer"]
+
+    @property
+    def sorted_filepath(self):
+        return self.filepath + SORTED_SUFFIX
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, kmer):
+        return self._index(kmer) is not None
+
+    def _read_records(self):
+        dtype = record_dtype(self.num_colours)
+        size = os.path.getsize(self.filepath) - self.header["offset"]
+        if size % dtype.itemsize:
+            raise ValueError("Truncated .ctx file %s" % self.filepath)
+        return np.memmap(self.filepath, dtype=dtype, mode="r",
+                         offset=self.header["offset"],
+                         shape=(size // dtype.itemsize,))
+
+    def _load_sorted(self):
+        path = self.sorted_filepath
+        if os.path.exists(path) and os.path.getmtime(
+                path) >= os.path.getmtime(self.filepath):
+            return np.load(path, mmap_mode="r")
+        records = self._read_records()
+        records = records[np.argsort(records["kmer"], kind="mergesort")]
+        tmp_path = "%s.%i.tmp" % (path, os.getpid())
+        try:
+            with open(tmp_path, "wb") as outfile:
+                np.save(outfile, records)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            logger.warning(
+                "Could not write %s (%s). Keeping sorted graph in memory" % (
+                    path, str(e)))
+            return records
+        return np.load(path, mmap_mode="r")
+
+    def _index(self, kmer):
+        try:
+            packed = encode(canonical(kmer))
+        except ValueError:
+            return None
+        i = np.searchsorted(self._kmers, packed)
+        if i < len(self._kmers) and self._kmers[i] == packed:
+            return i
+        return None
+
+    def _data(self, i):
+        record = self.records[i]
+        edges = 0
+        for e in record["edges"]:
+            edges |= int(e)
+        left, right = _edge_bases(edges)
+        return {"key": decode(int(record["kmer"]), self.kmer_size),
+                "colours": [int(c) for c in record["covgs"]],
+                "left": left,
+                "right": right,
+                "edges": "".join("%02x" % e for e in record["edges"]),
+                "links": []}
+
+    def lookup(self, kmer):
+        """Returns the kmer's record in the form `mccortex31 server` gives
+        it, or an empty dict if it's not in the graph"""
+        i = self._index(kmer)
+        if i is None:
+            return {}
+        return self._data(i)
+
+    def query(self, kmer, known_kmers=[]):
+        return McCortexQueryResult(
+            kmer, self.lookup(kmer), known_kmers=known_kmers)
+
+    def query_many(self, kmers, known_kmers=[]):
+        return {kmer: self.query(kmer, known_kmers=known_kmers)
+                for kmer in unique(kmers)}
@@ -5,6 +5,10 @@ import os
 import subprocess
 import logging
 import tempfile
+from mykatlas.cortex.skeletons import SkeletonCache
+from mykatlas.cortex.skeletons import skeleton_key
+from mykatlas.cortex.skeletons import DEFAULT_SKELETON_CACHE_BYTES
+from mykatlas.utils import lazyprop
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
@@ -131,7 +135,10 @@ class McCortexGenoRunner(McCortexRunner):
             panel_name=None,
             tmp_dir='tmp/',
             skeleton_dir='data/skeletons/',
-            mccortex31_path="mccortex31"):
+            mccortex31_path="mccortex31",
+            skeleton_cache_max_bytes=DEFAULT_SKELETON_CACHE_BYTES,
+            stream=False,
+            keep_tmp=False):
         super(McCortexRunner, self).__init__()
         self.sample = sample
         self.panels = panels
@@ -144,15 +151,47 @@ class McCortexGenoRunner(McCortexRunner):
         self.threads = threads
         self.memory = memory
         self.skeleton_dir = skeleton_dir
+        self.skeleton_cache = SkeletonCache(
+            skeleton_dir, max_bytes=skeleton_cache_max_bytes)
         self.mccortex31_path = mccortex31_path
+        # Stream coverages from mccortex rather than writing them to
+        # tmp_dir. The sample graph is only written if keep_tmp is set.
+        self.stream = stream
+        self.keep_tmp = keep_tmp
         if self.seq and self.ctx:
             raise ValueError("Can't have both -1 and -c")
 
     def run(self):
-        if self.force or not os.path.exists(self.covg_tmp_file_path):
+        if self.stream:
+            # Coverages are generated as they're read by stream_coverages
+            self._check_panels()
+            self._build_panel_binary_if_required()
+        elif self.force or not os.path.exists(self.covg_tmp_file_path):
             self._check_panels()
             self._run_cortex()
 
+    def stream_coverages(self):
+        """Runs mccortex geno yielding coverage rows as they're written"""
+        # The skeleton can't be evicted while mccortex reads it
+        with self.skeleton():
+            logger.debug("running %s" % " ".join(self.coverages_cmd))
+            try:
+                proc = subprocess.Popen(
+                    self.coverages_cmd, stdout=subprocess.PIPE,
+                    universal_newlines=True)
+            except OSError:
+                raise ValueError(
+                    "Could not run mccortex31. Is it on PATH? check by running `mccortex31 geno`.")
+            try:
+                for line in proc.stdout:
+                    yield line
+            finally:
+                proc.stdout.close()
+                returncode = proc.wait()
+        if returncode != 0:
+            raise ValueError(
+                "mccortex31 raised an error. Is it on PATH? check by running `mccortex31 geno`. The command that through the error was `%s`  " % subprocess.list2cmdline(self.coverages_cmd))
+
     def _check_panels(self):
         # If panel does not exists then build it
         for panel in self.panels:
@@ -162,26 +201,37 @@ class McCortexGenoRunner(McCortexRunner):
                     panel.filepath)
 
     def _run_cortex(self):
-        # If ctx binary does not exist then build it
-        self._build_panel_binary_if_required()
-        # Now get coverage on panel
-        self._run_coverage_if_required()
+        # If ctx binary does not exist then build it, and keep it from being
+        # evicted while getting coverage on the panel
+        with self.skeleton():
+            self._run_coverage_if_required()
 
     def _build_panel_binary_if_required(self):
-        if not os.path.exists(self.ctx_skeleton_filepath) or self.force:
-            if os.path.exists(self.ctx_skeleton_filepath):
-                os.remove(self.ctx_skeleton_filepath)
-            # panel
-            seq_list = self._create_sequence_list()
-            cmd = [self.mccortex31_path,
-                   "build",
-                   "-q",
-                   "-m %s" % self.memory,
-                   "-t", "%i" % self.threads,
-                   "-k",
-                   str(self.kmer)] + seq_list + [self.ctx_skeleton_filepath]
-            # print (cmd)
-            subprocess.check_output(cmd)
+        self.build_skeleton()
+
+    def skeleton(self):
+        """Context holding the panel's skeleton binary, building it if it
+        isn't in the skeleton cache. Skeletons are keyed on the panel
+        contents so they never go stale, and --force doesn't rebuild them"""
+        return self.skeleton_cache.get(
+            self.skeleton_key, self._build_panel_binary)
+
+    def build_skeleton(self):
+        """Returns the path to the panel's skeleton binary, building it if
+        it isn't in the skeleton cache"""
+        with self.skeleton() as filepath:
+            return filepath
+
+    def _build_panel_binary(self, filepath):
+        seq_list = self._create_sequence_list()
+        cmd = [self.mccortex31_path,
+               "build",
+               "-q",
+               "-m %s" % self.memory,
+               "-t", "%i" % self.threads,
+               "-k",
+               str(self.kmer)] + seq_list + [filepath]
+        subprocess.check_output(cmd)
 
     def _create_sequence_list(self):
         seq_list = []
@@ -223,7 +273,7 @@ class McCortexGenoRunner(McCortexRunner):
         return [self.mccortex31_path, "geno", "-q", "-t", "%i" % self.threads,
                 "-m %s" % self.memory,
                 "-k", str(self.kmer),
-                "-o", self.covg_tmp_file_path]
+                "-o", self.covg_output_path]
 
     @property
     def coverages_cmd_seq(self):
@@ -234,7 +284,7 @@ class McCortexGenoRunner(McCortexRunner):
             cmd.extend(["-1", seq])
         for panel in self.panels:
             cmd.extend(["-c", panel.filepath])
-        cmd.append(self.ctx_tmp_filepath)
+        cmd.append(self.ctx_output_path)
         return cmd
 
     @property
@@ -243,9 +293,21 @@ class McCortexGenoRunner(McCortexRunner):
         cmd.extend(["-g", self.ctx])
         for panel in self.panels:
             cmd.extend(["-c", panel.filepath])
-        cmd.append(self.ctx_tmp_filepath)
+        cmd.append(self.ctx_output_path)
         return cmd
 
+    @property
+    def covg_output_path(self):
+        if self.stream:
+            return "-"
+        return self.covg_tmp_file_path
+
+    @property
+    def ctx_output_path(self):
+        if self.stream and not self.keep_tmp:
+            return os.devnull
+        return self.ctx_tmp_filepath
+
     @property
     def sample_name(self):
         return "-".join([self.sample, str(self.kmer)])
@@ -271,13 +333,16 @@ class McCortexGenoRunner(McCortexRunner):
         sample_panel_name = self.sample_panel_name + '.covgs'
         return os.path.join(self.tmp_dir, sample_panel_name)
 
+    @lazyprop
+    def skeleton_key(self):
+        return skeleton_key([panel.filepath for panel in self.panels],
+                            self.kmer, self.mccortex31_path)
+
     @property
     def ctx_skeleton_filepath(self):
-        panel_name = self.panel_name.replace("/", "-")[:100]
-        panel_fname = '{panel_name}_{kmer}.ctx'.format(panel_name=panel_name,
-                                                       kmer=self.kmer)
-        return os.path.join(self.skeleton_dir, panel_fname)
+        return self.skeleton_cache.filepath(self.skeleton_key)
 
     def remove_temporary_files(self):
-        os.remove(self.ctx_tmp_filepath)
-        os.remove(self.covg_tmp_file_path)
+        for filepath in [self.ctx_tmp_filepath, self.covg_tmp_file_path]:
+            if os.path.exists(filepath):
+                os.remove(filepath)
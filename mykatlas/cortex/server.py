@@ -6,12 +6,20 @@ import time
 import signal
 from Bio.Seq import Seq
 from mykatlas.utils import median
+from mykatlas.utils import unique
+from mykatlas.kmer import canonical
+from mykatlas.kmer import encode_canonical
+from mykatlas.kmer import reverse_complement
 from subprocess import Popen, PIPE
 from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
 import socketserver
 import logging
 from pprint import pprint
-import copy
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from queue import Queue
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
@@ -33,16 +41,38 @@ def check_mccortex_alive(proc):
         sys.exit(1)
 
 
+# Maximum number of kmers written to the server before reading back the
+# responses. Keeps the pipes from filling up in both directions at once.
+QUERY_BATCH_SIZE = 256
+
+
+def _trim_prompt(line):
+    # Trim off prompt text
+    if line[0:2] == "> ":
+        line = line[2:len(line)]
+    return line
+
+
 def query_mccortex(proc, kmer):
     print(kmer, file=proc.stdin)
     proc.stdin.flush()
     # check_mccortex_alive(proc)
     line = proc.stdout.readline()
-    # Trim off prompt text
-    if line[0:2] == "> ":
-        line = line[2:len(line)]
     # check_mccortex_alive(proc)
-    return line
+    return _trim_prompt(line)
+
+
+def query_mccortex_many(proc, kmers):
+    """Pipelines kmers into the server, returning the responses in the same
+    order as the kmers were given"""
+    lines = []
+    for i in range(0, len(kmers), QUERY_BATCH_SIZE):
+        batch = kmers[i:i + QUERY_BATCH_SIZE]
+        proc.stdin.write("".join([kmer + "\n" for kmer in batch]))
+        proc.stdin.flush()
+        for _ in batch:
+            lines.append(_trim_prompt(proc.stdout.readline()))
+    return lines
 
 # when we start mccortex we set it to ignore interrupt signal, we handle it.
 
@@ -53,43 +83,89 @@ def preexec_function():
     signal.signal(signal.SIGINT, signal.SIG_IGN)
 
 
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
 class WebServer(object):
 
-    def __init__(self, port, args, memory="1GB", mccortex_path="mccortex31"):
+    """Serves kmer queries over HTTP.
+
+    Each connection is handled on its own thread. Queries wait in line for
+    a free mccortex process from a pool of `threads` servers, so concurrent
+    clients share the loaded graph(s) and never interleave on one pipe.
+
+    GET /<kmer> returns the mccortex response for one kmer. POST /query
+    with a JSON list of kmers returns a JSON object of kmer -> response."""
+
+    def __init__(self, port, args, memory="1GB", mccortex_path="mccortex31",
+                 threads=1):
         self.port = port
         self.args = args
         self.mccortex = None
         self.httpd = None
         self.memory = memory
         self.mccortex_path = mccortex_path
+        self.pool = McCortexServerPool(
+            threads, args, memory=memory, mccortex_path=mccortex_path)
 
     def start(self):
-        self.mccortex = self._start_mccortex()
+        self.pool.start()
+        self.mccortex = self.pool.procs[0]
 
     def serve(self):
-        mccortex = self.mccortex
+        pool = self.pool
         logger.debug("Starting server")
 
         class McCortexHTTPServer(BaseHTTPRequestHandler):
 
+            # Keep connections alive between requests
+            protocol_version = "HTTP/1.1"
+
             def log_message(self, format, *args):
                 # Remove logging
                 pass
 
-            def do_GET(self):
+            def _send_json(self, jsonstr):
+                try:
+                    body = jsonstr.encode("UTF-8")
+                except UnicodeDecodeError:
+                    body = "{}".encode("UTF-8")
                 self.send_response(200)
                 self.send_header("Content-type", "text/html")
+                self.send_header("Content-Length", str(len(body)))
                 self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
                 if len(self.path) < 4 or len(self.path) > 300:
-                    jsonstr = "{\"error\": \"Webserver: bad query\"}\n"
+                    jsonstr = BAD_QUERY
                 else:
-                    jsonstr = query_mccortex(mccortex, self.path[1:])
+                    with pool.checkout() as proc:
+                        jsonstr = query_mccortex(proc, self.path[1:])
+                self._send_json(jsonstr)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
                 try:
-                    self.wfile.write(jsonstr.encode("UTF-8"))
-                except UnicodeDecodeError:
-                    self.wfile.write("{}".encode("UTF-8"))
+                    kmers = json.loads(body.decode("UTF-8"))
+                except ValueError:
+                    kmers = None
+                if self.path != "/query" or not _valid_kmer_list(kmers):
+                    self._send_json(BAD_QUERY)
+                    return
+                with pool.checkout() as proc:
+                    lines = query_mccortex_many(proc, kmers)
+                out = {}
+                for kmer, line in zip(kmers, lines):
+                    try:
+                        out[kmer] = json.loads(line)
+                    except ValueError:
+                        out[kmer] = {"error": line.strip()}
+                self._send_json(json.dumps(out) + "\n")
         try:
-            self.httpd = socketserver.TCPServer(
+            self.httpd = ThreadingHTTPServer(
                 ("", self.port), McCortexHTTPServer)
         except Exception as e:
             logger.error("Cannot start HTTP server: %s" % str(e))
@@ -102,56 +178,194 @@ class WebServer(object):
     def stop(self):
         if self.httpd:
             self.httpd.server_close()
-        self._stop_mccortex()
+        self.pool.stop()
         logger.info("Closed succesfully.")
 
-    def _start_mccortex(self):
-        script_dir = os.path.dirname(os.path.realpath(__file__))
-        # Adding two lists together appends one to the other
+
+BAD_QUERY = "{\"error\": \"Webserver: bad query\"}\n"
+
+
+def _valid_kmer_list(kmers):
+    return isinstance(kmers, list) and all(
+        isinstance(k, str) and 3 <= len(k) < 300 for k in kmers)
+
+
+def start_mccortex(args, memory="1GB", mccortex_path="mccortex31"):
+    # Adding two lists together appends one to the other
+    try:
+        proc = Popen([mccortex_path,
+                      "server",
+                      "-m", memory,
+                      "--single-line",
+                      "--coverages"] + args,
+                     stdin=PIPE,
+                     stdout=PIPE,
+                     universal_newlines=True,
+                     preexec_fn=preexec_function)
+    except Exception as e:
+        logger.error(
+            "Couldn't start McCortex is mccortex31 in path? : %s " %
+            str(e))
+        sys.exit(1)
+
+    # Give test query to check it works
+    check_mccortex_alive(proc)
+    resp = query_mccortex(proc, "hi")
+    return proc
+
+
+def stop_mccortex(proc):
+    print("q\n", file=proc.stdin)
+    proc.stdin.close()
+    # sleep until process has closed
+    while proc.poll() is None:
+        time.sleep(1)
+    logger.info("McCortex exited with: %s " % str(proc.poll()))
+
+
+class McCortexServerPool(object):
+
+    """Runs `size` mccortex servers on the same graph.
+
+    A server answers one query at a time, so callers check a process out
+    of the pool, query it and hand it back. Each server loads its own copy
+    of the graph so memory use is `size` times that of a single server."""
+
+    def __init__(self, size, args, memory="1GB", mccortex_path="mccortex31"):
+        if size < 1:
+            raise ValueError("Pool needs at least one mccortex server")
+        self.size = size
+        self.args = args
+        self.memory = memory
+        self.mccortex_path = mccortex_path
+        self.procs = []
+        self._available = Queue()
+
+    def start(self):
+        for _ in range(self.size):
+            proc = start_mccortex(self.args, memory=self.memory,
+                                  mccortex_path=self.mccortex_path)
+            self.procs.append(proc)
+            self._available.put(proc)
+
+    def stop(self):
+        for proc in self.procs:
+            stop_mccortex(proc)
+        self.procs = []
+
+    @contextmanager
+    def checkout(self):
+        proc = self._available.get()
         try:
-            proc = Popen([self.mccortex_path,
-                          "server",
-                          "-m", self.memory,
-                          "--single-line",
-                          "--coverages"] + self.args,
-                         stdin=PIPE,
-                         stdout=PIPE,
-                         universal_newlines=True,
-                         preexec_fn=preexec_function)
-        except Exception as e:
-            logger.error(
-                "Couldn't start McCortex is mccortex31 in path? : %s " %
-                str(e))
-            sys.exit(1)
+            yield proc
+        finally:
+            self._available.put(proc)
+
+
+# Default memory cap for cached mccortex responses
+DEFAULT_KMER_CACHE_BYTES = 256 * 1024 * 1024
+# Rough per entry overhead of the parsed response dict on top of the
+# length of the JSON line
+KMER_CACHE_ENTRY_OVERHEAD = 500
+
+
+def _cache_key(kmer):
+    try:
+        return encode_canonical(kmer)
+    except ValueError:
+        # Not a plain ACGT kmer
+        return canonical(kmer)
+
+
+class KmerCache(object):
+
+    """LRU cache of parsed mccortex responses keyed by packed canonical
+    kmer.
+
+    Entry sizes are estimated from the length of the server's response so
+    max_bytes caps memory rather than the number of kmers. Safe to share
+    between threads."""
+
+    def __init__(self, max_bytes=DEFAULT_KMER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
 
-        # Give test query to check it works
-        check_mccortex_alive(proc)
-        resp = query_mccortex(proc, "hi")
-        return proc
+    def __len__(self):
+        return len(self._entries)
 
-    def _stop_mccortex(self):
-        print("q\n", file=self.mccortex.stdin)
-        self.mccortex.stdin.close()
-        # sleep until process has closed
-        while self.mccortex.poll() is None:
-            time.sleep(1)
-        logger.info("McCortex exited with: %s " % str(self.mccortex.poll()))
+    def __contains__(self, kmer):
+        return _cache_key(kmer) in self._entries
+
+    def get(self, kmer):
+        key = _cache_key(kmer)
+        with self._lock:
+            try:
+                data, size = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries[key] = (data, size)
+            self.hits += 1
+            return data
+
+    def put(self, kmer, data, size):
+        key = _cache_key(kmer)
+        size += KMER_CACHE_ENTRY_OVERHEAD
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (data, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._entries:
+                self.bytes -= self._entries.popitem(last=False)[1][1]
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "kmers": len(self._entries), "bytes": self.bytes}
 
 
 class McCortexQuery(object):
 
-    def __init__(self, proc):
+    def __init__(self, proc, cache=None):
         # self.base_url = "http://localhost:%i/" % port
         self.proc = proc
+        if cache is None:
+            cache = KmerCache()
+        self.cache = cache
 
     def query(self, kmer, known_kmers=[]):
-        return McCortexQueryResult(
-            kmer,
-            json.loads(
-                query_mccortex(
-                    self.proc,
-                    kmer)),
-            known_kmers=known_kmers)
+        data = self.cache.get(kmer)
+        if data is None:
+            line = query_mccortex(self.proc, kmer)
+            data = json.loads(line)
+            self.cache.put(kmer, data, len(line))
+        return McCortexQueryResult(kmer, data, known_kmers=known_kmers)
+
+    def query_many(self, kmers, known_kmers=[]):
+        """Queries all kmers not already in the cache in a single round
+        trip. Returns a dict of kmer -> McCortexQueryResult"""
+        out = {}
+        missing = []
+        for kmer in unique(kmers):
+            data = self.cache.get(kmer)
+            if data is None:
+                missing.append(kmer)
+            else:
+                out[kmer] = McCortexQueryResult(
+                    kmer, data, known_kmers=known_kmers)
+        if missing:
+            lines = query_mccortex_many(self.proc, missing)
+            for kmer, line in zip(missing, lines):
+                data = json.loads(line)
+                self.cache.put(kmer, data, len(line))
+                out[kmer] = McCortexQueryResult(
+                    kmer, data, known_kmers=known_kmers)
+        return out
 
 
 class McCortexQueryResult(object):
@@ -172,7 +386,7 @@ class McCortexQueryResult(object):
         if self.complement:
             for l in self.left:
                 forward_kmers.append(
-                    str(Seq(l + self.data["key"][:-1]).reverse_complement()))
+                    reverse_complement(l + self.data["key"][:-1]))
         else:
             for r in self.right:
                 forward_kmers.append(str(self.data["key"][1:] + r))
@@ -181,9 +395,10 @@ class McCortexQueryResult(object):
         elif mcq:
             # filter kmers with low depth
             m_depth = max(self.depth * 0.1, 10)
+            results = mcq.query_many(forward_kmers)
             forward_kmers = [
-                k for k in forward_kmers if mcq.query(
-                    k,).depth > m_depth]
+                k for k in forward_kmers if results[k] is not None and
+                results[k].depth > m_depth]
         if suggested_kmer is not None and suggested_kmer in forward_kmers:
             return [suggested_kmer]
         if len(forward_kmers) > 1 and self.known_kmers:
@@ -199,7 +414,7 @@ class McCortexQueryResult(object):
         if self.complement:
             for l in self.right:
                 reverse_kmers.append(
-                    str(Seq(self.data["key"][1:] + l).reverse_complement()))
+                    reverse_complement(self.data["key"][1:] + l))
         else:
             for r in self.left:
                 reverse_kmers.append(r + str(self.data["key"][:-1]))
@@ -208,9 +423,10 @@ class McCortexQueryResult(object):
         elif mcq:
             # filter kmers with low depth
             m_depth = max(self.depth * 0.1, 10)
+            results = mcq.query_many(reverse_kmers)
             reverse_kmers = [
-                k for k in reverse_kmers if mcq.query(
-                    k,).depth > m_depth]
+                k for k in reverse_kmers if results[k] is not None and
+                results[k].depth > m_depth]
         if suggested_kmer is not None and suggested_kmer in reverse_kmers:
             return [suggested_kmer]
         if len(reverse_kmers) > 1 and self.known_kmers:
@@ -248,215 +464,259 @@ class McCortexQueryResult(object):
         return self.kmer != self.query_kmer
 
 
+# Default cap on the number of paths a single walk may branch into
+DEFAULT_MAX_BRANCHES = 100
+
+
+class GraphPath(object):
+
+    """A path through the graph being extended by GraphWalker.
+
+    The sequence is held as a list of bases and the visited kmers as a set,
+    so extending the path and checking for cycles don't scale with its
+    length."""
+
+    __slots__ = ["N_left", "start_kmer", "kmer", "seq", "kmers", "ended",
+                 "depth", "steps"]
+
+    def __init__(self, start_kmer, N_left=0, depth=None):
+        self.N_left = N_left
+        self.start_kmer = start_kmer
+        self.kmer = start_kmer
+        self.seq = list(start_kmer)
+        self.kmers = set([start_kmer])
+        self.ended = False
+        self.depth = depth
+        # Bases added to the right of the seed
+        self.steps = 0
+
+    def __len__(self):
+        return len(self.seq)
+
+    def extend(self, kmer):
+        self.seq.append(kmer[-1])
+        self.kmers.add(kmer)
+        self.kmer = kmer
+        self.steps += 1
+
+    def extend_left(self, bases):
+        """Prepends bases (given in the order they were walked) in one go"""
+        self.seq = list(reversed(bases)) + self.seq
+
+    def branch(self, kmer):
+        path = GraphPath(kmer, N_left=self.N_left)
+        path.kmer = self.kmer
+        path.seq = list(self.seq)
+        path.kmers = set(self.kmers)
+        path.steps = self.steps
+        if self.depth is not None:
+            path.depth = list(self.depth)
+        path.extend(kmer)
+        return path
+
+    def to_dict(self):
+        dna = "".join(self.seq)
+        if self.ended:
+            dna += "*"
+        d = {"N_left": self.N_left,
+             "dna": dna,
+             "start_kmer": self.start_kmer,
+             "len_dna": len(dna)}
+        d["prot"] = str(Seq("".join(self.seq)).translate(11))
+        d["len_prot"] = len(d["prot"])
+        if self.depth is not None:
+            d["median_depth"] = median(self.depth)
+            d["min_non_zero_depth"] = min(self.depth)
+            d["depth"] = "-".join([str(x) for x in self.depth])
+        return d
+
+
 class GraphWalker(object):
 
-    def __init__(self, proc, kmer_size=31, print_depths=False):
-        self.mcq = McCortexQuery(proc)
-        self.queries = {}
+    def __init__(self, proc, kmer_size=31, print_depths=False, cache=None,
+                 max_branches=DEFAULT_MAX_BRANCHES, unitigs=None, mcq=None):
+        # mcq can be anything with McCortexQuery's query and query_many,
+        # e.g. a CtxGraph to walk a graph loaded in process
+        if mcq is None:
+            mcq = McCortexQuery(proc, cache=cache)
+        self.mcq = mcq
         self.kmer_size = kmer_size
         self.print_depths = print_depths
+        self.max_branches = max_branches
+        # Optional UnitigIndex of the graph to jump between branch points
+        self.unitigs = unitigs
 
-    def _count_k(self, k, count):
-        try:
-            count[k] += 1
-        except KeyError:
-            count[k] = 1
-        return count
-
-    def _path_ended(self, paths, i):
-        return paths[i]["dna"][-1] == "*"
-
-    def _get_next_kmer_right(self, paths, i):
-        return paths[i]["dna"][-self.kmer_size:]
-
-    def _get_next_kmer_left(self, paths, i):
-        return paths[i]["dna"][:self.kmer_size]
-
-    def _reached_end_of_path(self, k, end_kmers):
-        return k in end_kmers
-
-    def _mark_path_and_ended(self, paths, i):
-        paths[i]["dna"] = paths[i]["dna"] + "*"
-        return paths
+    @property
+    def cache(self):
+        return self.mcq.cache
 
     def _make_query(self, k, known_kmers=[]):
         try:
-            q = self.queries[k]
-        except KeyError:
-            try:
-                q = self.mcq.query(k, known_kmers=known_kmers)
-                self.queries[k] = q
-            except ValueError as e:
-                q = None
-                logging.error(str(e))
-                self.queries[k] = None
+            q = self.mcq.query(k, known_kmers=known_kmers)
+        except ValueError as e:
+            q = None
+            logging.error(str(e))
         return q
 
+    def _make_queries(self, kmers, known_kmers=[]):
+        try:
+            return self.mcq.query_many(kmers, known_kmers=known_kmers)
+        except ValueError:
+            # Fall back to querying one at a time to isolate the bad
+            # response
+            return {k: self._make_query(k, known_kmers) for k in kmers}
+
+    def query_many(self, kmers, known_kmers=[]):
+        return self._make_queries(kmers, known_kmers=known_kmers)
+
     def _query_is_valid(self, q):
         return q is not None and q.data.get("key")
 
-    def _get_next_kmers_right(
-            self,
-            i,
-            q,
-            k,
-            paths,
-            repeat_kmers,
-            known_kmers,
-            count):
+    def _filter_by_depth(self, q, kmers, known_kmers):
+        depth = max(q.depth * 0.1, 10)
+        results = self._make_queries(kmers, known_kmers=known_kmers)
+        return [k for k in kmers if results[k] is not None and
+                results[k].depth > depth]
+
+    def _get_next_kmers_right(self, path, q, k, repeat_kmers, known_kmers,
+                              count):
+        # Neighbours are queried in one batch and cached so the depth filter
+        # below doesn't go back to the server
         kmers = q.forward(
             suggested_kmer=repeat_kmers.get(
                 k, {}).get(
-                count[k]), mcq=self.mcq)
+                count[k]), mcq=self)
         if q.depth is not None:
-            if self.print_depths:
-                paths[i]["depth"].append(q.depth)
+            if path.depth is not None:
+                path.depth.append(q.depth)
             if len(kmers) > 1:
-                depth = max(q.depth * 0.1, 10)
-                kmers = [
-                    k for k in kmers if self.mcq.query(
-                        k,
-                        known_kmers=known_kmers).depth > depth]
+                kmers = self._filter_by_depth(q, kmers, known_kmers)
         if len(kmers) > 1:
-            kmers = [k for k in kmers if k not in paths[i]["dna"]]
+            kmers = [k for k in kmers if k not in path.kmers]
         return kmers
 
-    def _get_next_kmers_left(
-            self,
-            i,
-            q,
-            k,
-            paths,
-            repeat_kmers,
-            known_kmers=[],
-            count={}):
-        kmers = q.reverse(mcq=self.mcq)
-        if q.depth is not None:
-            if len(kmers) > 1:
-                depth = max(q.depth * 0.1, 10)
-                kmers = [
-                    k for k in kmers if self.mcq.query(
-                        k,
-                        known_kmers=known_kmers).depth > depth]
+    def _get_next_kmers_left(self, path, q, known_kmers=[]):
+        kmers = q.reverse(mcq=self)
+        if q.depth is not None and len(kmers) > 1:
+            kmers = self._filter_by_depth(q, kmers, known_kmers)
         if len(kmers) > 1:
-            kmers = [k for k in kmers if k not in paths[i]["dna"]]
+            kmers = [k for k in kmers if k not in path.kmers]
         return kmers
 
-    def _check_if_next_kmers_are_valid(self, kmers, paths, i):
-        if len(kmers) < 1:
-            paths = self._mark_path_and_ended(paths, i)
-        return paths
-
-    def _split_paths(self, i, kmers, paths):
-        for j, kmer in enumerate(kmers):
-            if j == 0:
-                paths[i]["dna"] = paths[i]["dna"] + kmer[-1]
-            else:
-                paths[sorted(
-                    paths.keys())[-j]]["dna"] = paths[sorted(paths.keys())[-j]]["dna"] + kmer[-1]
-        return paths
-
-    def _init_paths(self, seed, N_left):
-        if self.print_depths:
-            return {0: {"N_left": N_left,
-                        "dna": seed[:self.kmer_size],
-                        "start_kmer": seed[:self.kmer_size],
-                        "depth": []}}
-        else:
-            return {0: {"N_left": N_left,
-                        "dna": seed[:self.kmer_size],
-                        "start_kmer": seed[:self.kmer_size]}}
+    def _extend_left(self, path, N_left, known_kmers):
+        # Only extends while there is a single way to go
+        k = path.start_kmer
+        bases = []
+        for _ in range(N_left):
+            q = self._make_query(k)
+            if not self._query_is_valid(q):
+                continue
+            next_kmers = self._get_next_kmers_left(path, q, known_kmers)
+            if not len(next_kmers) == 1:
+                break
+            k = next_kmers[0]
+            if k in path.kmers:
+                # Walked round a cycle back onto the path
+                break
+            # Added as they're walked so later branch points drop them
+            path.kmers.add(k)
+            bases.append(k[0])
+        path.extend_left(bases)
+
+    def _jump(self, path, tail, steps, end_kmers, known_kmers, count):
+        """Extends path along the rest of its unitig, stopping early at an
+        end kmer or after `steps` bases"""
+        kmers = []
+        k = path.kmer
+        for base in tail[:steps]:
+            kmers.append(k)
+            k = k[1:] + base
+            if k in end_kmers:
+                break
+        if path.depth is not None:
+            # Depths of the kmers jumped over come back in one round trip
+            results = self._make_queries(kmers, known_kmers)
+            for kmer in kmers:
+                if self._query_is_valid(results[kmer]):
+                    path.depth.append(results[kmer].depth)
+        for kmer in kmers[1:]:
+            count[kmer] = count.get(kmer, 0) + 1
+        for kmer in kmers[1:] + [k]:
+            path.extend(kmer)
+
+    def _step(self, path, steps, end_kmers, known_kmers, repeat_kmers,
+              count):
+        """Extends path by one base, or to the end of its unitig if there's
+        a unitig index, taking at most `steps` bases. Returns any new paths
+        branching off at this point"""
+        k = path.kmer
+        count[k] = count.get(k, 0) + 1
+        if k in end_kmers:
+            path.ended = True
+            return []
+        if self.unitigs is not None:
+            tail = self.unitigs.tail(k)
+            if tail:
+                self._jump(path, tail, steps, end_kmers, known_kmers, count)
+                return []
+        q = self._make_query(k, known_kmers)
+        if not self._query_is_valid(q):
+            path.ended = True
+            return []
+        kmers = self._get_next_kmers_right(
+            path, q, k, repeat_kmers, known_kmers, count)
+        if not kmers:
+            path.ended = True
+            return []
+        branches = []
+        if len(kmers) > 1:
+            logger.debug("Branch point")
+            logger.debug("Origin %s" % q.data.get("key"))
+            logger.debug("Options %s" % ",".join(kmers))
+            # Neighbours already on this path were dropped above, so a
+            # branch can't loop back on itself
+            for kmer in kmers[1:]:
+                branches.append(path.branch(kmer))
+        path.extend(kmers[0])
+        return branches
 
     def breath_first_search(self, N, seed, end_kmers=[],
                             known_kmers=[], repeat_kmers={},
                             N_left=0):
-        paths = self._init_paths(seed, N_left)
+        """Walks N bases from seed (N_left of them to the left) returning
+        paths of length N that finish at one of end_kmers.
+
+        Paths are extended in rounds from a frontier of unfinished paths,
+        one base (or one unitig) per round, and the walk stops early once
+        every path has finished. Raises ValueError if the walk branches into
+        more than max_branches paths."""
+        path = GraphPath(seed[:self.kmer_size], N_left=N_left,
+                         depth=[] if self.print_depths else None)
+        self._extend_left(path, N_left, known_kmers)
+        end_kmers = set(end_kmers)
         count = {}
-        for _ in range(N_left):
-            k = self._get_next_kmer_left(paths, 0)
-            q = self._make_query(k)
-            if self._query_is_valid(q):
-                kmers = self._get_next_kmers_left(
-                    0,
-                    q,
-                    k,
-                    paths,
-                    repeat_kmers,
-                    known_kmers,
-                    count)
-                if not len(kmers) == 1:
-                    break
-                else:
-                    # Add left
-                    paths[0]["dna"] = kmers[0][0] + paths[0]["dna"]
-        #
-        #
-        for _ in range(N - N_left):
-            for i in paths.keys():
-                if not self._path_ended(paths, i):
-                    k = self._get_next_kmer_right(paths, i)
-                    count = self._count_k(k, count)
-                    if self._reached_end_of_path(k, end_kmers):
-                        paths = self._mark_path_and_ended(paths, i)
-                    else:
-                        q = self._make_query(k, known_kmers)
-                        if self._query_is_valid(q):
-                            kmers = self._get_next_kmers_right(
-                                i,
-                                q,
-                                k,
-                                paths,
-                                repeat_kmers,
-                                known_kmers,
-                                count)
-                            paths = self._check_if_next_kmers_are_valid(
-                                kmers,
-                                paths,
-                                i)
-                            # Create new paths
-                            paths = self.create_new_paths(
-                                paths,
-                                i,
-                                kmers,
-                                origin=q.data.get("key"))
-                            paths = self._split_paths(i, kmers, paths)
-                        else:
-                            paths = self._mark_path_and_ended(paths, i)
-
-            # DEBUG prints progress every N bps
-            # if i % 250 == 0:
-            #     with open("tmp/paths.json", "w") as outfile:
-            #         json.dump(paths, outfile)
-            ###
-
-        keep_paths = {}
-        for k, v in paths.items():
-            v["len_dna"] = len(v["dna"])
-            v["prot"] = str(Seq(v["dna"].rstrip("*")).translate(11))
-            v["len_prot"] = len(v["prot"])
-            if self.print_depths:
-                paths[i]["median_depth"] = median(paths[i]["depth"])
-                paths[i]["min_non_zero_depth"] = min(paths[i]["depth"])
-                paths[i]["depth"] = "-".join([str(x)
-                                              for x in paths[i]["depth"]])
-
-            if v["len_dna"] == N + 1 and v["dna"][-1] == "*":
-                keep_paths[k] = v
-        return keep_paths.values()
-
-    def create_new_paths(self, paths, i, kmers, origin):
-        num = len(kmers) - 1
-        num_paths = max(paths.keys())
-        if num > 0:
-            logger.debug("Branch point")
-            logger.debug("Origin %s" % origin)
-            logger.debug("Options %s" % ",".join(kmers))
-        for j in range(num):
-            paths[num_paths + j + 1] = copy.copy(paths[i])
-            paths[num_paths + j + 1]["start_kmer"] = kmers[1]
-            if kmers[1] in [d["start_kmer"] for d in paths.values()]:
-                raise ValueError("Going around in circles?")
-        return paths
+        paths = [path]
+        frontier = [path]
+        max_steps = N - N_left
+        while frontier:
+            next_frontier = []
+            new_paths = []
+            for path in frontier:
+                if path.steps >= max_steps:
+                    continue
+                new_paths.extend(self._step(
+                    path, max_steps - path.steps, end_kmers, known_kmers,
+                    repeat_kmers, count))
+                if not path.ended:
+                    next_frontier.append(path)
+            if new_paths:
+                paths.extend(new_paths)
+                if len(paths) > self.max_branches:
+                    raise ValueError(
+                        "Walk from %s branched into more than %i paths" % (
+                            seed, self.max_branches))
+            frontier = next_frontier + new_paths
+        return [p.to_dict() for p in paths if p.ended and len(p) == N]
 
 
 # def main():
@@ -0,0 +1,152 @@
+"""A cache of skeleton graphs built from panels, shared by genotype jobs.
+
+Skeletons are named by a hash of the panel contents, kmer size and the
+mccortex binary, so editing a panel or upgrading mccortex builds a new
+skeleton instead of reusing a stale one. Jobs hold a shared lock on the
+skeleton while they use it. Builds take the lock exclusively, so concurrent
+jobs wait for one build rather than racing, and are written to a temporary
+file and renamed into place so a half written skeleton is never used. Once
+the cache grows past `max_bytes` the least recently used skeletons are
+removed, skipping any that another job is building or using.
+"""
+import os
+import glob
+import errno
+import fcntl
+import shutil
+import hashlib
+import logging
+from contextlib import contextmanager
+logger = logging.getLogger(__name__)
+
+DEFAULT_SKELETON_CACHE_BYTES = 10 * 1024 * 1024 * 1024
+
+
+def _file_digest(filepath, digest):
+    with open(filepath, "rb") as infile:
+        for block in iter(lambda: infile.read(1024 * 1024), b""):
+            digest.update(block)
+
+
+def mccortex_fingerprint(mccortex_path):
+    """Identifies the mccortex binary by its resolved path, size and
+    modification time, so it changes when mccortex is upgraded"""
+    path = shutil.which(mccortex_path) or mccortex_path
+    try:
+        stat = os.stat(os.path.realpath(path))
+    except OSError:
+        return mccortex_path
+    return "%s:%i:%i" % (os.path.realpath(path), stat.st_size,
+                         int(stat.st_mtime))
+
+
+def skeleton_key(panel_filepaths, kmer, mccortex_path="mccortex31"):
+    digest = hashlib.sha1()
+    for filepath in panel_filepaths:
+        _file_digest(filepath, digest)
+        digest.update(b"\0")
+    digest.update(("k=%i;%s" % (
+        kmer, mccortex_fingerprint(mccortex_path))).encode("UTF-8"))
+    return digest.hexdigest()
+
+
+class SkeletonCache(object):
+
+    def __init__(self, directory, max_bytes=DEFAULT_SKELETON_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def filepath(self, key):
+        return os.path.join(self.directory, "%s.ctx" % key)
+
+    def _lock_filepath(self, key):
+        return os.path.join(self.directory, "%s.lock" % key)
+
+    @contextmanager
+    def _try_lock(self, key):
+        """Holds the key's lock exclusively, yielding True, or yields False
+        without waiting if another job holds it"""
+        with open(self._lock_filepath(key), "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError) as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @contextmanager
+    def get(self, key, build):
+        """Yields the path to the skeleton for key, calling build(filepath)
+        to create it if it isn't cached. The skeleton can't be evicted until
+        the context exits, so it should be held while mccortex reads it"""
+        filepath = self.filepath(key)
+        if not os.path.exists(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # Made by another job
+                pass
+        with open(self._lock_filepath(key), "a") as f:
+            try:
+                while True:
+                    # Jobs using the skeleton share the lock. Building or
+                    # evicting it takes the lock exclusively.
+                    fcntl.flock(f, fcntl.LOCK_SH)
+                    if os.path.exists(filepath):
+                        break
+                    # Converting the lock isn't atomic, so another job may
+                    # build it, or evict it again, in between
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    if not os.path.exists(filepath):
+                        self._build(filepath, build)
+                        self.evict(keep=filepath)
+                # Recently used skeletons are the last to be evicted
+                os.utime(filepath, None)
+                yield filepath
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _build(self, filepath, build):
+        # Hidden, so it's never picked up for eviction while being built
+        tmp_filepath = os.path.join(
+            self.directory, ".%i.%s" % (os.getpid(),
+                                        os.path.basename(filepath)))
+        logger.debug("Building skeleton %s" % filepath)
+        try:
+            build(tmp_filepath)
+            os.rename(tmp_filepath, filepath)
+        finally:
+            if os.path.exists(tmp_filepath):
+                os.remove(tmp_filepath)
+
+    def evict(self, keep=None):
+        skeletons = []
+        for filepath in glob.glob(os.path.join(self.directory, "*.ctx")):
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                continue
+            skeletons.append((stat.st_mtime, stat.st_size, filepath))
+        total = sum(size for _, size, _ in skeletons)
+        for _, size, filepath in sorted(skeletons):
+            if total <= self.max_bytes:
+                break
+            if filepath == keep:
+                continue
+            key = os.path.basename(filepath)[:-len(".ctx")]
+            # Lock files are left in place as another job may hold one
+            with self._try_lock(key) as locked:
+                if not locked:
+                    # Being built or used by another job
+                    continue
+                logger.debug("Evicting skeleton %s" % filepath)
+                try:
+                    os.remove(filepath)
+                except OSError:
+                    pass
+            total -= size
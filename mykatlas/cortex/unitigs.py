@@ -0,0 +1,81 @@
+"""Index of the unitigs of a graph, used by GraphWalker to jump over the
+linear stretches between branch points.
+
+Only the first and last kmer of each unitig and every `stride`th kmer in
+between are indexed, so memory stays a fraction of the graph size. A walk
+that starts in the middle of a unitig steps at most `stride` bases before it
+reaches an indexed kmer and can jump.
+"""
+from mykatlas.cortex.mccortex import McCortexUnitigs
+from mykatlas.kmer import encode_canonical
+from mykatlas.kmer import reverse_complement
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_UNITIG_STRIDE = 16
+
+
+def parse_unitigs(fasta):
+    """Yields the sequences in the FASTA output of `mccortex31 unitigs`"""
+    seq = []
+    for line in fasta.splitlines():
+        line = line.strip()
+        if line.startswith(">"):
+            if seq:
+                yield "".join(seq)
+            seq = []
+        elif line:
+            seq.append(line)
+    if seq:
+        yield "".join(seq)
+
+
+class UnitigIndex(object):
+
+    def __init__(self, unitigs, kmer_size=31, stride=DEFAULT_UNITIG_STRIDE):
+        self.kmer_size = kmer_size
+        self.stride = stride
+        self.unitigs = []
+        self._offsets = {}
+        for unitig in unitigs:
+            self.add(unitig)
+
+    @classmethod
+    def from_graph(cls, ctx, kmer_size=31, mccortex_path="mccortex31",
+                   stride=DEFAULT_UNITIG_STRIDE):
+        logger.debug("Building unitig index for %s" % ctx)
+        fasta = McCortexUnitigs(ctx, mccortex31_path=mccortex_path).run()
+        if isinstance(fasta, bytes):
+            fasta = fasta.decode("UTF-8")
+        return cls(parse_unitigs(fasta), kmer_size=kmer_size, stride=stride)
+
+    def __len__(self):
+        return len(self.unitigs)
+
+    def add(self, unitig):
+        i = len(self.unitigs)
+        self.unitigs.append(unitig)
+        last = len(unitig) - self.kmer_size
+        if last < 0:
+            return
+        offsets = list(range(0, last, self.stride)) + [last]
+        for offset in offsets:
+            kmer = unitig[offset:offset + self.kmer_size]
+            try:
+                self._offsets[encode_canonical(kmer)] = (i, offset)
+            except ValueError:
+                # Non ACGT bases
+                continue
+
+    def tail(self, kmer):
+        """Returns the bases that follow kmer on its unitig, reading in the
+        direction of kmer. Empty if kmer is at the end of its unitig or
+        isn't indexed."""
+        try:
+            i, offset = self._offsets[encode_canonical(kmer)]
+        except (KeyError, ValueError):
+            return ""
+        unitig = self.unitigs[i]
+        if unitig[offset:offset + self.kmer_size] == kmer:
+            return unitig[offset + self.kmer_size:]
+        return reverse_complement(unitig[:offset])
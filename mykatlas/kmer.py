@@ -0,0 +1,41 @@
+"""Fast kmer helpers for graph walking.
+
+Kmers are plain strings. Packed kmers are ints holding 2 bits per base
+(A=0, C=1, G=2, T=3) with the first base in the most significant bits, the
+same order mccortex uses, so comparing packed kmers of equal length gives
+the same answer as comparing the strings.
+"""
+
+_COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCANtgcan")
+_TO_BASE_4 = str.maketrans("ACGTacgt", "01230123")
+_BASES = "ACGT"
+
+
+def reverse_complement(seq):
+    return seq.translate(_COMPLEMENT)[::-1]
+
+
+def canonical(kmer):
+    """Returns the lexicographically smaller of kmer and its reverse
+    complement (the orientation mccortex stores)"""
+    rc = reverse_complement(kmer)
+    if rc < kmer:
+        return rc
+    return kmer
+
+
+def encode(kmer):
+    """Packs kmer into an int. Raises ValueError for non ACGT bases"""
+    return int(kmer.translate(_TO_BASE_4), 4)
+
+
+def decode(packed, k):
+    bases = []
+    for _ in range(k):
+        bases.append(_BASES[packed & 3])
+        packed >>= 2
+    return "".join(reversed(bases))
+
+
+def encode_canonical(kmer):
+    return encode(canonical(kmer))
@@ -1,2 +1,3 @@
 from mykatlas.metagenomics.phylo import SpeciesPredictor
 from mykatlas.metagenomics.phylo import AMRSpeciesPredictor
+from mykatlas.metagenomics.abundance import estimate_abundances
@@ -0,0 +1,115 @@
+"""Estimates the relative abundance of the taxa in a mixed sample from the
+coverage of their species panel probes.
+
+Each taxon's probes are modelled as a mixture of two Poisson components:
+probes covered at the taxon's depth, and probes whose coverage is noise
+(reads from related taxa or sequencing errors) shared by every taxon. EM
+fits the depth and the fraction of probes present for every taxon at once,
+with probes weighted by their length. Panel bases without coverage are
+observed at depth 0. A taxon's abundance is its depth times the fraction of
+its panel present.
+"""
+import logging
+
+import numpy as np
+
+from mykatlas.stats import log_poisson_prob_array
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_EM_ITERATIONS = 50
+DEFAULT_EM_TOLERANCE = 1e-4
+DEFAULT_MIN_RELATIVE_ABUNDANCE = 0.05
+MIN_NOISE_DEPTH = 0.01
+# Starting fraction of each taxon's probes that are present. Too close to 1
+# and noise probes are never reassigned.
+INITIAL_FRACTION_PRESENT = 0.9
+_MIN_FRACTION = 1e-6
+
+
+def _probe_arrays(covgs):
+    names = list(covgs.keys())
+    depths = []
+    lengths = []
+    groups = []
+    for i, name in enumerate(names):
+        median = np.asarray(covgs[name].get("median", []), dtype=float)
+        length = np.asarray(covgs[name].get("length", []), dtype=float)
+        # Probes of unknown length count once
+        length = np.where(length > 0, length, 1)
+        # CoverageParser only keeps covered probes. The rest of the panel's
+        # bases are one observation of depth 0, so a taxon with a few
+        # covered probes isn't counted as fully present.
+        uncovered = covgs[name].get("total_bases", 0) - length.sum()
+        if uncovered > 0:
+            median = np.append(median, 0)
+            length = np.append(length, uncovered)
+        depths.append(median)
+        lengths.append(length)
+        groups.append(np.full(len(median), i, dtype=int))
+    if not names:
+        return names, np.zeros(0), np.zeros(0), np.zeros(0, dtype=int)
+    return (names, np.concatenate(depths), np.concatenate(lengths),
+            np.concatenate(groups))
+
+
+def _weighted_sums(groups, weights, n):
+    return np.bincount(groups, weights=weights, minlength=n)
+
+
+def estimate_abundances(covgs, max_iterations=DEFAULT_MAX_EM_ITERATIONS,
+                        tolerance=DEFAULT_EM_TOLERANCE):
+    """Takes species panel coverage, as parsed by CoverageParser, and
+    returns {taxon: {"depth", "fraction_present", "relative_abundance"}}"""
+    names, depths, lengths, groups = _probe_arrays(covgs)
+    n = len(names)
+    totals = _weighted_sums(groups, lengths, n)
+    has_probes = totals > 0
+    lam = np.where(has_probes, _weighted_sums(
+        groups, lengths * depths, n) / np.where(has_probes, totals, 1), 0)
+    fraction = np.where(has_probes, INITIAL_FRACTION_PRESENT, 0)
+    noise = max(MIN_NOISE_DEPTH, 0.1 * float(np.min(lam[has_probes]))
+                if has_probes.any() else MIN_NOISE_DEPTH)
+    iterations = 0
+    while len(depths) and iterations < max_iterations:
+        iterations += 1
+        # E step: the responsibility of each taxon's depth for its probes
+        present = np.log(np.clip(fraction[groups], _MIN_FRACTION, 1)) + \
+            log_poisson_prob_array(np.maximum(lam[groups], MIN_NOISE_DEPTH),
+                                   depths)
+        absent = np.log(np.clip(1 - fraction[groups], _MIN_FRACTION, 1)) + \
+            log_poisson_prob_array(noise, depths)
+        r = 1 / (1 + np.exp(np.clip(absent - present, -700, 700)))
+        # M step
+        present_weight = _weighted_sums(groups, r * lengths, n)
+        new_lam = np.where(
+            present_weight > 0,
+            _weighted_sums(groups, r * lengths * depths, n) /
+            np.where(present_weight > 0, present_weight, 1), 0)
+        fraction = np.where(has_probes, present_weight /
+                            np.where(has_probes, totals, 1), 0)
+        absent_weight = ((1 - r) * lengths).sum()
+        if absent_weight > 0:
+            noise = max(MIN_NOISE_DEPTH,
+                        ((1 - r) * lengths * depths).sum() / absent_weight)
+        change = np.max(np.abs(new_lam - lam) / np.maximum(lam, 1))
+        lam = new_lam
+        if change < tolerance:
+            break
+    logger.debug("Abundance EM stopped after %i iterations" % iterations)
+    abundance = lam * fraction
+    total = abundance.sum()
+    return {name: {"depth": float(lam[i]),
+                   "fraction_present": float(fraction[i]),
+                   "relative_abundance": float(abundance[i] / total)
+                   if total > 0 else 0.0}
+            for i, name in enumerate(names)}
+
+
+def abundance_expected_depths(
+        abundances, min_relative_abundance=DEFAULT_MIN_RELATIVE_ABUNDANCE):
+    """Depths of the taxa abundant enough to type variants against, most
+    abundant first"""
+    present = [a for a in abundances.values()
+               if a["relative_abundance"] >= min_relative_abundance]
+    present.sort(key=lambda a: a["relative_abundance"], reverse=True)
+    return [a["depth"] for a in present]
@@ -1,39 +1,112 @@
 from __future__ import print_function
-import json
-import os
 import operator
-from mykatlas.utils import median
-from mykatlas.utils import load_json
+import numpy as np
 from mykatlas.utils import flatten
 from mykatlas.stats import percent_coverage_from_expected_coverage
+from mykatlas.reference_data import REFERENCE_DATA
+from mykatlas.metagenomics.abundance import estimate_abundances
+from mykatlas.metagenomics.abundance import abundance_expected_depths
+from mykatlas.metagenomics.abundance import DEFAULT_MIN_RELATIVE_ABUNDANCE
 
 
 DEFAULT_THRESHOLD = 30
 
 
+def _median(values):
+    """mykatlas.utils.median of an array"""
+    if not len(values):
+        return 0
+    values = np.sort(values)
+    index = (len(values) - 1) // 2
+    if len(values) % 2:
+        return values[index].item()
+    else:
+        return (values[index].item() + values[index + 1].item()) / 2.0
+
+
+class TaxonomyIndex(object):
+
+    """Maps each taxon in a hierarchy to its node, parent, depth and
+    children, so lookups don't walk the tree.
+
+    A taxon that appears more than once is indexed where a pre-order walk
+    of the tree first finds it."""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.nodes = {}
+        self.parents = {}
+        self.depths = {}
+        # Each level is an iterator over its remaining children, so every
+        # node is visited once
+        stack = [(None, 0, iter(tree.items()))]
+        while stack:
+            parent, depth, items = stack[-1]
+            try:
+                name, node = next(items)
+            except StopIteration:
+                stack.pop()
+                continue
+            if name not in self.nodes:
+                self.nodes[name] = node
+                self.parents[name] = parent
+                self.depths[name] = depth
+            stack.append((name, depth + 1,
+                          iter(node.get("children", {}).items())))
+
+    @classmethod
+    def from_file(cls, filepath):
+        """The index of the hierarchy at filepath, loaded once per process
+        while the file is unchanged"""
+        return REFERENCE_DATA.hierarchy(filepath)
+
+    def __contains__(self, name):
+        return name in self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get(self, name):
+        return self.nodes.get(name)
+
+    def parent(self, name):
+        return self.parents.get(name)
+
+    def depth(self, name):
+        return self.depths.get(name)
+
+    def children(self, name):
+        node = self.nodes.get(name)
+        if node is None:
+            return {}
+        return node.get("children", {})
+
+    def grandchildren(self, name, exclude=[]):
+        """Names of the children of name's children, skipping children
+        named in exclude"""
+        return flatten([list(grandchildren.get("children", {}).keys())
+                        for child, grandchildren in self.children(name).items()
+                        if child not in exclude])
+
+
 class Hierarchy(object):
 
-    def __init__(self, _dict):
+    def __init__(self, _dict, index=None):
         self.dict = _dict
+        if index is None:
+            index = TaxonomyIndex(_dict)
+        self.index = index
+
+    @classmethod
+    def from_file(cls, filepath):
+        index = TaxonomyIndex.from_file(filepath)
+        return cls(index.tree, index=index)
 
     def get_children(self, target_species):
-        phylo_group = self.get_phylo_group(target_species)
-        return phylo_group.get("children", {})
+        return self.index.children(target_species)
 
     def get_phylo_group(self, target_species):
-        phylo_group = []
-        for k, v in self.dict.items():
-            if k == target_species:
-                return v
-            for k2, v2 in v["children"].items():
-                if k2 == target_species:
-                    return v2
-                for k3, v3 in v2["children"].items():
-                    if k3 == target_species:
-                        return v3
-                    for k4, v4 in v3["children"].items():
-                        if k4 == target_species:
-                            return v4
+        return self.index.get(target_species)
 
 
 class SpeciesPredictor(object):
@@ -46,7 +119,8 @@ class SpeciesPredictor(object):
             lineage_covgs,
             base_json,
             verbose=False,
-            hierarchy_json_file=None):
+            hierarchy_json_file=None,
+            estimate_abundance=False):
         self.phylo_group_covgs = phylo_group_covgs
         self.sub_complex_covgs = sub_complex_covgs
         self.species_covgs = species_covgs
@@ -54,10 +128,12 @@ class SpeciesPredictor(object):
         self.out_json = base_json
         self.threshold = {}
         self.verbose = verbose
-        try:
-            self.hierarchy = Hierarchy(load_json(hierarchy_json_file))
-        except TypeError:
+        self.estimate_abundance = estimate_abundance
+        self.abundances = {}
+        if hierarchy_json_file is None:
             self.hierarchy = {}
+        else:
+            self.hierarchy = Hierarchy.from_file(hierarchy_json_file)
 
     def run(self):
         self._load_taxon_thresholds()
@@ -68,27 +144,24 @@ class SpeciesPredictor(object):
             covgs["Unknown"] = {"percent_coverage": -1, "median_depth": -1}
 
     def _load_taxon_thresholds(self):
-        taxon_coverage_threshold_file = os.path.realpath(
-            os.path.join(
-                os.path.dirname(__file__),
-                "..",
-                "data/predict/taxon_coverage_threshold.json"))
-        with open(taxon_coverage_threshold_file, "r") as infile:
-            self.threshold = json.load(infile)
+        self.threshold = REFERENCE_DATA.taxon_coverage_thresholds()
 
     def calc_expected_depth(self):
         # Get all of the panels with % coverage > 30
-        _median = []
-        for phylo_group, coverage_dict in self.phylo_group_covgs.items():
-            _median.extend(coverage_dict["median"])
-        if _median:
-            return median(_median)
+        medians = [np.asarray(coverage_dict["median"])
+                   for coverage_dict in self.phylo_group_covgs.values()
+                   if len(coverage_dict["median"])]
+        if medians:
+            return _median(np.concatenate(medians))
         else:
             return 0
 
     def _aggregate_all(self):
         # Calculate expected coverage
         self.expected_depth = self.calc_expected_depth()
+        if self.estimate_abundance:
+            # Needs the coverage of each probe, which _aggregate summarises
+            self.abundances = estimate_abundances(self.species_covgs)
         self._aggregate(self.phylo_group_covgs)
         self._aggregate(self.sub_complex_covgs, threshold=50)
         self._aggregate(self.species_covgs)
@@ -98,6 +171,8 @@ class SpeciesPredictor(object):
         self.out_json["phylogenetics"]["sub_complex"] = self.sub_complex_covgs
         self.out_json["phylogenetics"]["species"] = self.species_covgs
         self.out_json["phylogenetics"]["lineage"] = self.lineage_covgs
+        if self.estimate_abundance:
+            self.out_json["phylogenetics"]["abundance"] = self.abundances
         if not self.verbose:
             self.out_json["phylogenetics"] = self.choose_best(
                 self.out_json["phylogenetics"])
@@ -111,38 +186,43 @@ class SpeciesPredictor(object):
             self.out_json["phylogenetics"]["lineage"])
 
     def _bases_covered(self, percent_coverage, length):
-        return sum([percent_coverage[i] * length[i]
-                    for i in range(len(length))])
+        # A running sum adds in the same order as summing a list, so
+        # results round exactly as they did before
+        if not len(length):
+            return 0
+        return float(np.cumsum(percent_coverage * length)[-1])
 
     def _aggregate(self, covgs, threshold=5):
         del_phylo_groups = []
         for phylo_group, covg_dict in covgs.items():
-            percent_coverage = covg_dict["percent_coverage"]
-            length = covg_dict["length"]
+            percent_coverage = np.asarray(
+                covg_dict["percent_coverage"], dtype=float)
+            length = np.asarray(covg_dict["length"])
             bases_covered = self._bases_covered(percent_coverage, length)
             total_bases = covg_dict["total_bases"]
             total_percent_covered = round(bases_covered / total_bases, 3)
-            _median = covg_dict.get("median", [0])
+            medians = np.asarray(covg_dict.get("median", [0]))
             minimum_percentage_coverage_required = percent_coverage_from_expected_coverage(
                 self.expected_depth) * self.threshold.get(phylo_group, DEFAULT_THRESHOLD)
-            if total_percent_covered < minimum_percentage_coverage_required or median(
-                    _median) < 0.1 * self.expected_depth:
+            if total_percent_covered < minimum_percentage_coverage_required or _median(
+                    medians) < 0.1 * self.expected_depth:
                 # Remove low coverage nodes
-                _index = [
-                    i for i,
-                    d in enumerate(_median) if d > 0.1 *
-                    self.expected_depth]
-                percent_coverage = [percent_coverage[i] for i in _index]
-                length = [length[i] for i in _index]
-                bases_covered = self._bases_covered(percent_coverage, length)
-                _median = [_median[i] for i in _index]
+                keep = medians > 0.1 * self.expected_depth
+                bases_covered = self._bases_covered(
+                    percent_coverage[keep], length[keep])
+                medians = medians[keep]
                 total_percent_covered = round(bases_covered / total_bases, 3)
             if total_percent_covered > threshold:
                 if phylo_group == "Mycobacterium_llatzerense":  # Mistake in panel
+                    # The misnamed entry is left in place, so keep it
+                    # serialisable
+                    covgs[phylo_group] = {
+                        k: v.tolist() if isinstance(v, np.ndarray) else v
+                        for k, v in covg_dict.items()}
                     phylo_group = "Mycobacterium_mucogenicum"
                 covgs[phylo_group] = {
                     "percent_coverage": total_percent_covered,
-                    "median_depth": median(_median)}
+                    "median_depth": _median(medians)}
             else:
                 del_phylo_groups.append(phylo_group)
         for phylo_group in del_phylo_groups:
@@ -162,8 +242,8 @@ class SpeciesPredictor(object):
         species = {}
         for pg in phylo_groups.keys():
             if self.hierarchy:
-                allowed_species = flatten([self.hierarchy.dict[pg]["children"][subc]["children"].keys(
-                ) for subc in self.hierarchy.dict[pg]["children"].keys() if subc is not "Unknown"])
+                allowed_species = self.hierarchy.index.grandchildren(
+                    pg, exclude=["Unknown"])
                 species_to_consider = {k: phylogenetics["species"].get(
                     k, {"percent_coverage": 0}) for k in allowed_species}
             else:
@@ -229,7 +309,8 @@ class AMRSpeciesPredictor(SpeciesPredictor):
             lineage_covgs,
             base_json,
             verbose=False,
-            hierarchy_json_file=None):
+            hierarchy_json_file=None,
+            estimate_abundance=False):
         super(
             AMRSpeciesPredictor,
             self).__init__(
@@ -239,7 +320,8 @@ class AMRSpeciesPredictor(SpeciesPredictor):
             lineage_covgs,
             base_json,
             verbose=verbose,
-            hierarchy_json_file=hierarchy_json_file)
+            hierarchy_json_file=hierarchy_json_file,
+            estimate_abundance=estimate_abundance)
 
     def is_saureus_present(self):
         return "Staphaureus" in self.out_json["phylogenetics"]["phylo_group"]
@@ -278,3 +360,12 @@ class AMRSpeciesPredictor(SpeciesPredictor):
             if node not in ignore:
                 contamination_depths.append(covg_collection["median_depth"])
         return contamination_depths
+
+    def expected_depths(
+            self, min_relative_abundance=DEFAULT_MIN_RELATIVE_ABUNDANCE):
+        """Depths of each sufficiently abundant species in a mixed sample,
+        for genotyping with. Needs estimate_abundance."""
+        if not self.estimate_abundance:
+            raise ValueError("Abundances weren't estimated")
+        return abundance_expected_depths(
+            self.abundances, min_relative_abundance)
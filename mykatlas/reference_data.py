@@ -0,0 +1,85 @@
+"""Process wide registry of the reference data shipped in mykatlas/data.
+
+Taxon thresholds, species hierarchies and variant to drug resistance
+tables are loaded the first time they're asked for and then shared by
+every sample the process types. Entries are keyed by file path and
+modification time, so an edited file is loaded again.
+
+Batch and server modes call `REFERENCE_DATA.preload()` before starting
+worker processes, so the workers share the parent's copy through
+copy-on-write instead of each loading their own. Loaded data is shared:
+callers must copy it before modifying it.
+"""
+import os
+import glob
+import threading
+import logging
+
+from mykatlas.utils import load_json
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), "data"))
+
+
+class ReferenceData(object):
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, filepath, parse=load_json, kind="json"):
+        """Returns parse(filepath), parsing it only if this kind of data
+        hasn't been loaded from the file since it last changed"""
+        filepath = os.path.realpath(filepath)
+        key = (kind, filepath, os.path.getmtime(filepath))
+        with self._lock:
+            if key not in self._entries:
+                logger.debug("Loading %s %s" % (kind, filepath))
+                self._entries[key] = parse(filepath)
+            return self._entries[key]
+
+    @property
+    def taxon_coverage_thresholds_filepath(self):
+        return os.path.join(
+            self.data_dir, "predict", "taxon_coverage_threshold.json")
+
+    def taxon_coverage_thresholds(self):
+        return self.load(self.taxon_coverage_thresholds_filepath)
+
+    def hierarchy(self, filepath):
+        """Returns the TaxonomyIndex of the hierarchy JSON at filepath"""
+        from mykatlas.metagenomics.phylo import TaxonomyIndex
+        return self.load(filepath, lambda f: TaxonomyIndex(load_json(f)),
+                         kind="taxonomy")
+
+    def hierarchy_filepaths(self):
+        return sorted(glob.glob(os.path.join(self.data_dir, "*hierarchy.json")) +
+                      glob.glob(os.path.join(self.data_dir, "phylo", "*hierarchy.json")))
+
+    def variant_to_resistance_drug(self, species):
+        return self.load(os.path.join(
+            self.data_dir, "predict", species,
+            "variant_to_resistance_drug.json"))
+
+    def resistance_species(self):
+        return sorted(
+            os.path.basename(os.path.dirname(f)) for f in glob.glob(
+                os.path.join(self.data_dir, "predict", "*",
+                             "variant_to_resistance_drug.json")))
+
+    def preload(self, hierarchy_filepaths=[]):
+        """Loads all of the bundled reference data, and any other hierarchies
+        given"""
+        self.taxon_coverage_thresholds()
+        for filepath in self.hierarchy_filepaths() + list(hierarchy_filepaths):
+            self.hierarchy(filepath)
+        for species in self.resistance_species():
+            self.variant_to_resistance_drug(species)
+        return self
+
+
+REFERENCE_DATA = ReferenceData()
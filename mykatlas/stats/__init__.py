@@ -4,3 +4,8 @@ from mykatlas.stats.stats import log_lik_depth
 from mykatlas.stats.stats import log_lik_R_S_coverage
 from mykatlas.stats.stats import log_lik_probability_of_N_gaps
 from mykatlas.stats.stats import log_lik_R_S_kmer_count
+from mykatlas.stats.stats import log_factorial_array
+from mykatlas.stats.stats import log_poisson_prob_array
+from mykatlas.stats.stats import log_lik_R_S_coverage_array
+from mykatlas.stats.stats import log_lik_R_S_kmer_count_array
+from mykatlas.stats.stats import LogPoissonCache
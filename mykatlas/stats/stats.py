@@ -1,7 +1,8 @@
 from math import exp
-from math import factorial
+from math import lgamma
 from math import log
 import logging
+import numpy as np
 logger = logging.getLogger(__name__)
 
 
@@ -25,32 +26,108 @@ def log_poisson_prob(lam, k):
     return -lam + k * log(lam) - log_factorial(k)
 
 
+DEFAULT_LOG_POISSON_CACHE_ENTRIES = 1000000
+
+
+class LogPoissonCache(object):
+
+    """Memo of log_poisson_prob(lam, k).
+
+    Within a run every probe is typed against the same expected depths, and
+    observed counts (zero especially) repeat across probes, so most lookups
+    are hits. Once max_entries are cached the oldest are dropped."""
+
+    def __init__(self, max_entries=DEFAULT_LOG_POISSON_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def log_poisson_prob(self, lam, k):
+        key = (lam, k)
+        try:
+            out = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            out = log_poisson_prob(lam, k)
+            if self.max_entries > 0:
+                if len(self._entries) >= self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+                self._entries[key] = out
+            return out
+        self.hits += 1
+        return out
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "entries": len(self._entries)}
+
+
+def _log_poisson_prob(lam, k, cache=None):
+    if cache is None:
+        return log_poisson_prob(lam, k)
+    return cache.log_poisson_prob(lam, k)
+
+
+# log(n!) is lgamma(n + 1). Small n, which most kmer counts are, are looked
+# up in a table.
+LOG_FACTORIAL_TABLE_SIZE = 1024
+_LOG_FACTORIALS = np.array([lgamma(i + 1)
+                            for i in range(LOG_FACTORIAL_TABLE_SIZE)])
+
+try:
+    from scipy.special import gammaln as _gammaln
+except ImportError:
+    _gammaln = np.vectorize(lgamma, otypes=[float])
+
+
 def log_factorial(n):
     assert n >= 0
-    out = 0
-    for i in range(int(n)):
-        out += log(i + 1)
+    n = int(n)
+    if n < LOG_FACTORIAL_TABLE_SIZE:
+        return float(_LOG_FACTORIALS[n])
+    return lgamma(n + 1)
+
+
+def log_factorial_array(n):
+    n = np.asarray(n).astype(int)
+    if n.size and n.min() < 0:
+        raise ValueError("Can't take the factorial of a negative number")
+    small = n < LOG_FACTORIAL_TABLE_SIZE
+    if small.all():
+        return _LOG_FACTORIALS[n]
+    out = np.empty(n.shape)
+    out[small] = _LOG_FACTORIALS[n[small]]
+    out[~small] = _gammaln(n[~small] + 1.0)
     return out
 
 
-def log_lik_depth(depth, expected_depth):
+def log_poisson_prob_array(lam, k):
+    """log_poisson_prob for arrays of lam and k"""
+    return -lam + k * np.log(lam) - log_factorial_array(k)
+
+
+def log_lik_depth(depth, expected_depth, cache=None):
     if expected_depth <= 0:
         raise ValueError("Expected depth must be greater than 0")
     if depth < 0:
         raise ValueError("Depth must not be negative")
-    return log_poisson_prob(lam=expected_depth, k=depth)
+    return _log_poisson_prob(expected_depth, depth, cache)
 
 
 def log_lik_R_S_coverage(observed_alternate_depth,
                          observed_reference_depth,
                          expected_alternate_depth,
-                         expected_reference_depth):
-    lne = log_poisson_prob(
-        lam=expected_alternate_depth,
-        k=observed_alternate_depth)
-    le = log_poisson_prob(
-        lam=expected_reference_depth,
-        k=observed_reference_depth)
+                         expected_reference_depth,
+                         cache=None):
+    lne = _log_poisson_prob(
+        expected_alternate_depth, observed_alternate_depth, cache)
+    le = _log_poisson_prob(
+        expected_reference_depth, observed_reference_depth, cache)
     return lne + le
 
 
@@ -61,7 +138,8 @@ def depth_to_expected_kmer_count(depth):
 def log_lik_R_S_kmer_count(observed_reference_kmer_count,
                            observed_alternate_kmer_count,
                            expected_reference_depth,
-                           expected_alternate_depth):
+                           expected_alternate_depth,
+                           cache=None):
     expected_reference_kmer_count = depth_to_expected_kmer_count(
         expected_reference_depth)
     expected_alternate_kmer_count = depth_to_expected_kmer_count(
@@ -70,12 +148,34 @@ def log_lik_R_S_kmer_count(observed_reference_kmer_count,
     #                              expected_reference_kmer_count, observed_reference_kmer_count))
     # logger.debug("%f, %f, %f" % (expected_alternate_depth,
     # expected_alternate_kmer_count, observed_alternate_kmer_count))
-    lne = log_poisson_prob(
-        lam=expected_reference_kmer_count, k=observed_reference_kmer_count)
-    le = log_poisson_prob(
-        lam=expected_alternate_kmer_count, k=observed_alternate_kmer_count)
+    lne = _log_poisson_prob(
+        expected_reference_kmer_count, observed_reference_kmer_count, cache)
+    le = _log_poisson_prob(
+        expected_alternate_kmer_count, observed_alternate_kmer_count, cache)
     # logger.debug("%i, %i, %i, %f" % (expected_reference_depth,
     #                                  expected_reference_kmer_count, observed_reference_kmer_count, lne))
     # logger.debug("%i, %i, %i, %f" % (expected_alternate_depth,
     # expected_alternate_kmer_count, observed_alternate_kmer_count, le))
     return lne + le
+
+
+def log_lik_R_S_coverage_array(observed_alternate_depth,
+                               observed_reference_depth,
+                               expected_alternate_depth,
+                               expected_reference_depth):
+    return log_poisson_prob_array(
+        expected_alternate_depth, observed_alternate_depth) + \
+        log_poisson_prob_array(
+            expected_reference_depth, observed_reference_depth)
+
+
+def log_lik_R_S_kmer_count_array(observed_reference_kmer_count,
+                                 observed_alternate_kmer_count,
+                                 expected_reference_depth,
+                                 expected_alternate_depth):
+    return log_poisson_prob_array(
+        depth_to_expected_kmer_count(expected_reference_depth),
+        observed_reference_kmer_count) + \
+        log_poisson_prob_array(
+            depth_to_expected_kmer_count(expected_alternate_depth),
+            observed_alternate_kmer_count)
@@ -1,5 +1,6 @@
 from mykatlas.typing.models.base import ProbeCoverage
 from mykatlas.typing.models.presence import SequenceProbeCoverage
+from mykatlas.typing.models.presence import SequenceCall
 from mykatlas.typing.models.panel import Panel
 from mykatlas.typing.models.variant import VariantProbeCoverage
 from mykatlas.typing.typer.presence import PresenceTyper
@@ -1,4 +1,117 @@
 import os
+import logging
+
+import numpy as np
+
+from mykatlas.utils import get_params
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".index.npy"
+
+# Probe kinds in a panel index
+SEQUENCE_PROBE = 0
+REF_PROBE = 1
+ALT_PROBE = 2
+# Species, lineage etc. probes that are summarised by name
+SUMMARY_PROBE = 3
+
+
+def read_probe_names(filepath):
+    with open(filepath, 'r') as infile:
+        return [line[1:].rstrip("\r\n") for line in infile
+                if line.startswith(">")]
+
+
+def _probe_kind(name):
+    alt_or_ref = name.split('?')[0].split('-')[0]
+    if alt_or_ref == "ref":
+        return REF_PROBE
+    elif alt_or_ref == "alt":
+        return ALT_PROBE
+    params = get_params(name)
+    if params.get("panel_type", "presence") in ["variant", "presence"]:
+        return SEQUENCE_PROBE
+    return SUMMARY_PROBE
+
+
+def index_probes(names):
+    """Returns a structured array with a row of metadata for each probe
+    name, in the order they appear in the panel.
+
+    Variant probes are grouped as CoverageParser reads them: `group` is the
+    row of the variant's first probe and `group_size` (set on that row) the
+    number of ref and alt rows that follow it."""
+    rows = []
+    i = 0
+    while i < len(names):
+        name = names[i]
+        params = get_params(name)
+        kind = _probe_kind(name)
+        if kind in [REF_PROBE, ALT_PROBE]:
+            if 'var_name' in params:
+                var_name = params.get('var_name')
+            else:
+                var_name = name.split('?')[0].split('-')[1]
+            num_alts = int(params.get("num_alts", 0))
+            start = i
+            group = [(name, REF_PROBE)]
+            i += 1
+            for _ in range(num_alts - 1):
+                if _probe_kind(names[i]) != REF_PROBE:
+                    group.append((names[i], ALT_PROBE))
+                    i += 1
+                    num_alts -= 1
+                    break
+                group.append((names[i], REF_PROBE))
+                i += 1
+            for _ in range(num_alts):
+                group.append((names[i], ALT_PROBE))
+                i += 1
+            for j, (probe_name, probe_kind) in enumerate(group):
+                rows.append((probe_name, probe_kind, "variant", num_alts,
+                             var_name, params.get("gene", ""),
+                             variant_probe_id(name, params), "",
+                             "", "", start, len(group) if j == 0 else 0))
+        else:
+            rows.append((name, kind, params.get("panel_type", "presence"), 0,
+                         "", params.get("gene", ""), "", params.get("name", ""),
+                         params.get('version', '1'), params.get("length", ""),
+                         i, 1))
+            i += 1
+    return _rows_to_array(rows)
+
+
+def variant_probe_id(name, params=None):
+    """The id a variant probe's calls are reported under"""
+    if params is None:
+        params = get_params(name)
+    names = []
+    if params.get("mut"):
+        names.append("_".join([params.get("gene"), params.get("mut")]))
+        var_name = params.get("var_name")
+    else:
+        var_name = name.split('?')[0].split('-')[1]
+    names.append(var_name)
+    return "-".join(names)
+
+
+_INDEX_FIELDS = [("allele", "S"), ("kind", "u1"), ("panel_type", "S"),
+                 ("num_alts", "<i4"), ("var_name", "S"), ("gene", "S"),
+                 ("probe_id", "S"), ("name", "S"), ("version", "S"),
+                 ("length", "S"), ("group", "<i8"), ("group_size", "<i4")]
+
+
+def _rows_to_array(rows):
+    dtype = []
+    for j, (field, t) in enumerate(_INDEX_FIELDS):
+        if t == "S":
+            width = max([len(str(row[j]).encode("UTF-8"))
+                         for row in rows] + [1])
+            t = "S%i" % width
+        dtype.append((field, t))
+    return np.array([tuple(
+        v.encode("UTF-8") if isinstance(v, str) else v for v in row)
+        for row in rows], dtype=dtype)
 
 
 class Panel(object):
@@ -13,3 +126,30 @@ class Panel(object):
 
     def __repr__(self):
         return self.name
+
+    @property
+    def index_filepath(self):
+        return self.filepath + INDEX_SUFFIX
+
+    def build_index(self):
+        """Writes the panel's probe metadata to a sidecar that genotyping
+        memory maps instead of parsing probe names"""
+        index = index_probes(read_probe_names(self.filepath))
+        tmp_filepath = "%s.%i.tmp" % (self.index_filepath, os.getpid())
+        with open(tmp_filepath, 'wb') as outfile:
+            np.save(outfile, index)
+        os.rename(tmp_filepath, self.index_filepath)
+        return index
+
+    def load_index(self):
+        """Returns the panel index, or None if it hasn't been built or is
+        older than the panel"""
+        if not os.path.exists(self.index_filepath):
+            return None
+        if os.path.getmtime(self.index_filepath) < os.path.getmtime(
+                self.filepath):
+            logger.warning(
+                "Ignoring %s as %s has changed since. Rerun `atlas index-panel`" % (
+                    self.index_filepath, self.filepath))
+            return None
+        return np.load(self.index_filepath, mmap_mode="r")
@@ -30,3 +30,54 @@ class SequenceProbeCoverage(object):
     @property
     def coverage_dict(self):
         return self.probe_coverage.coverage_dict
+
+
+def _genotype_to_list(genotype):
+    try:
+        return [int(i) for i in genotype.split('/')]
+    except ValueError:
+        return []
+
+
+class SequenceCall(object):
+
+    """A gene presence call.
+
+    Serialises to the same dict as ga4ghmongo's SequenceCall, without
+    building or validating a mongoengine document. Use `to_document` when a
+    call needs to be saved to the database."""
+
+    __slots__ = ["genotype", "genotype_likelihoods", "info"]
+
+    def __init__(self, genotype, genotype_likelihoods=[], info={}):
+        if isinstance(genotype, str):
+            genotype = _genotype_to_list(genotype)
+        self.genotype = genotype
+        self.genotype_likelihoods = [float(l) for l in genotype_likelihoods]
+        self.info = info
+
+    def __getstate__(self):
+        return (self.genotype, self.genotype_likelihoods, self.info)
+
+    def __setstate__(self, state):
+        self.genotype, self.genotype_likelihoods, self.info = state
+
+    @property
+    def genotype_conf(self):
+        genotype_likelihoods = sorted(self.genotype_likelihoods, reverse=True)
+        return genotype_likelihoods[0] - genotype_likelihoods[1]
+
+    def to_dict(self):
+        return {"_cls": "Call.SequenceCall",
+                "genotype": self.genotype,
+                "genotype_likelihoods": self.genotype_likelihoods,
+                "info": self.info}
+
+    def to_document(self, sequence=None, call_set=None):
+        from ga4ghmongo.schema import SequenceCall as SequenceCallDocument
+        return SequenceCallDocument.create(
+            sequence=sequence,
+            call_set=call_set,
+            genotype=self.genotype,
+            genotype_likelihoods=self.genotype_likelihoods,
+            info=self.info)
@@ -5,22 +5,30 @@ import csv
 import glob
 import logging
 import subprocess
+import multiprocessing
 from copy import copy
+from itertools import islice
+
+import numpy as np
 
 from mykatlas.typing import SequenceProbeCoverage
 from mykatlas.typing import VariantProbeCoverage
 from mykatlas.typing import ProbeCoverage
 from mykatlas.typing import Panel
+from mykatlas.typing.models.panel import SEQUENCE_PROBE
+from mykatlas.typing.models.panel import REF_PROBE
+from mykatlas.typing.models.panel import ALT_PROBE
+from mykatlas.typing.models.panel import SUMMARY_PROBE
+from mykatlas.typing.models.panel import variant_probe_id
 
 from mykatlas.typing.typer.presence import GeneCollectionTyper
 from mykatlas.typing.typer.variant import VariantTyper
 from mykatlas.typing.typer.base import DEFAULT_MINOR_FREQ
 from mykatlas.typing.typer.base import DEFAULT_ERROR_RATE
-
-from ga4ghmongo.schema import VariantCallSet
-from ga4ghmongo.schema import Variant
+from mykatlas.stats import LogPoissonCache
 
 from mykatlas.cortex import McCortexGenoRunner
+from mykatlas.cortex.skeletons import DEFAULT_SKELETON_CACHE_BYTES
 
 from mykatlas.utils import get_params
 from mykatlas.utils import split_var_name
@@ -28,6 +36,16 @@ from mykatlas.utils import median
 
 logger = logging.getLogger(__name__)
 
+# Parsed probe name parameters, by panel
+PROBE_PARAMS_CACHE = {}
+
+# Below this many genes and variants typing in a pool costs more than it
+# saves
+MIN_PARALLEL_TYPING_ITEMS = 1000
+
+# Rows of mccortex's coverage table parsed at once
+COVGS_TABLE_CHUNK_ROWS = 100000
+
 
 class CoverageParser(object):
 
@@ -45,7 +63,10 @@ class CoverageParser(object):
             verbose=True,
             tmp_dir='tmp/',
             skeleton_dir='atlas/data/skeletons/',
-            mccortex31_path="mccortex31"):
+            mccortex31_path="mccortex31",
+            skeleton_cache_max_bytes=DEFAULT_SKELETON_CACHE_BYTES,
+            stream=False,
+            keep_tmp=False):
         self.sample = sample
         self.seq = seq
         self.ctx = ctx
@@ -54,9 +75,14 @@ class CoverageParser(object):
         self.covgs = {"variant": {}, "presence": {}}
         self.variant_covgs = self.covgs["variant"]
         self.gene_presence_covgs = self.covgs["presence"]
+        # Variant probe name -> id, when read from a panel index
+        self.probe_ids = {}
         self.mc_cortex_runner = None
         self.verbose = verbose
         self.skeleton_dir = skeleton_dir
+        self.skeleton_cache_max_bytes = skeleton_cache_max_bytes
+        self.stream = stream
+        self.keep_tmp = keep_tmp
         self.tmp_dir = tmp_dir
         self.panel_file_paths = panel_file_paths
         self.panels = []
@@ -86,7 +112,10 @@ class CoverageParser(object):
             panel_name=self.panel_name,
             tmp_dir=self.tmp_dir,
             skeleton_dir=self.skeleton_dir,
-            mccortex31_path=self.mccortex31_path)
+            mccortex31_path=self.mccortex31_path,
+            skeleton_cache_max_bytes=self.skeleton_cache_max_bytes,
+            stream=self.stream,
+            keep_tmp=self.keep_tmp)
         self.mc_cortex_runner.run()
 
     def estimate_depth(self):
@@ -121,16 +150,161 @@ class CoverageParser(object):
             return row[0], 0, 0, 0.0, 0
 
     def _parse_covgs(self):
-        with open(self.mc_cortex_runner.covg_tmp_file_path, 'r') as infile:
-            self.reader = csv.reader(infile, delimiter="\t")
-            for row in self.reader:
-                allele, median_depth, min_depth, percent_coverage, k_count = self._parse_summary_covgs_row(
-                    row)
-                allele_name = allele.split('?')[0]
-                if self._is_variant_panel(allele_name):
-                    self._parse_variant_panel(row)
-                else:
-                    self._parse_seq_panel(row)
+        if self.stream:
+            # Rows are parsed as mccortex writes them
+            self._parse_covgs_lines(self.mc_cortex_runner.stream_coverages())
+        else:
+            with open(self.mc_cortex_runner.covg_tmp_file_path, 'r') as infile:
+                self._parse_covgs_lines(infile)
+
+    def _parse_covgs_lines(self, lines):
+        alleles, values = self._read_covgs_table(lines)
+        index = self._load_panel_index(alleles)
+        if index is not None:
+            self._parse_indexed_covgs(index, alleles, values)
+            return
+        species = []
+        i = 0
+        while i < len(alleles):
+            allele_name = alleles[i].split('?')[0]
+            if self._is_variant_panel(allele_name):
+                i = self._parse_variant_panel(alleles, values, i)
+            else:
+                if not self._parse_seq_panel(alleles[i], values[i]):
+                    species.append(i)
+                i += 1
+        if species:
+            keys = {}
+            groups = []
+            lengths = []
+            for i in species:
+                params = self._params(alleles[i])
+                key = (params.get("panel_type", "presence"),
+                       params.get('name'))
+                groups.append(keys.setdefault(key, len(keys)))
+                lengths.append(int(params.get("length", -1)))
+            self._parse_species_panels(
+                list(keys.keys()), np.array(groups), np.array(lengths),
+                values[species])
+
+    def _load_panel_index(self, alleles):
+        """Returns the index of the panel if there is one for exactly the
+        probes in the coverage table"""
+        if len(self.panels) != 1:
+            return None
+        index = self.panels[0].load_index()
+        if index is None or len(index) != len(alleles):
+            return None
+        try:
+            if np.array_equal(index["allele"], np.array(alleles, dtype="S")):
+                return index
+        except UnicodeEncodeError:
+            pass
+        logger.warning("Ignoring %s as its probes don't match the coverages" %
+                       self.panels[0].index_filepath)
+        return None
+
+    def _parse_indexed_covgs(self, index, alleles, values):
+        kinds = np.asarray(index["kind"])
+        groups = np.asarray(index["group"])
+        group_sizes = np.asarray(index["group_size"])
+        for i in np.flatnonzero(
+                (kinds == REF_PROBE) & (groups == np.arange(len(kinds)))):
+            rows = range(i, i + group_sizes[i])
+            allele = alleles[i]
+            variant_probe_coverage = VariantProbeCoverage(
+                reference_coverages=[self._probe_coverage(values[j])
+                                     for j in rows if kinds[j] == REF_PROBE],
+                alternate_coverages=[self._probe_coverage(values[j])
+                                     for j in rows if kinds[j] == ALT_PROBE],
+                var_name=index["var_name"][i].decode("UTF-8"),
+                params=self._params(allele))
+            self.variant_covgs.setdefault(allele, []).append(
+                variant_probe_coverage)
+            self.probe_ids[allele] = index["probe_id"][i].decode("UTF-8")
+        for i in np.flatnonzero(kinds == SEQUENCE_PROBE):
+            panel_type = index["panel_type"][i].decode("UTF-8")
+            name = index["name"][i].decode("UTF-8") or None
+            version = index["version"][i].decode("UTF-8")
+            sequence_probe_coverage = SequenceProbeCoverage(
+                name=name,
+                probe_coverage=self._probe_coverage(values[i]),
+                version=version,
+                length=index["length"][i].decode("UTF-8") or None)
+            self.covgs[panel_type].setdefault(
+                name, {})[version] = sequence_probe_coverage
+        summary = kinds == SUMMARY_PROBE
+        if summary.any():
+            keys = np.char.add(np.char.add(
+                np.asarray(index["panel_type"])[summary], b"\t"),
+                np.asarray(index["name"])[summary])
+            unique_keys, first, inverse = np.unique(
+                keys, return_index=True, return_inverse=True)
+            # Number groups in the order they first appear in the panel
+            order = np.argsort(first)
+            rank = np.empty_like(order)
+            rank[order] = np.arange(len(order))
+            lengths = np.asarray(index["length"])[summary]
+            lengths = np.where(lengths == b"", b"-1", lengths).astype(int)
+            keys = []
+            for key in unique_keys[order]:
+                panel_type, name = key.decode("UTF-8").split("\t")
+                keys.append((panel_type, name or None))
+            self._parse_species_panels(
+                keys, rank[inverse], lengths, values[summary])
+
+    def _read_covgs_table(self, lines):
+        """Returns the allele names and an array of median depth, min depth,
+        percent coverage and kmer count, one row per allele. Lines are
+        parsed COVGS_TABLE_CHUNK_ROWS at a time, so only a chunk of the
+        stream's text is held at once"""
+        lines = (line for line in lines if line.strip())
+        alleles = []
+        blocks = []
+        while True:
+            chunk = list(islice(lines, COVGS_TABLE_CHUNK_ROWS))
+            if not chunk:
+                break
+            alleles.extend(line.split("\t", 1)[0] for line in chunk)
+            blocks.append(self._read_covgs_block(chunk))
+        if not blocks:
+            return alleles, np.zeros((0, 4))
+        return alleles, np.concatenate(blocks)
+
+    def _read_covgs_block(self, lines):
+        try:
+            values = np.loadtxt(lines, delimiter="\t", usecols=(2, 3, 4, 5),
+                                ndmin=2)
+        except ValueError:
+            # Fall back to parsing row by row, zeroing unparsable rows
+            return np.array([self._parse_summary_covgs_row(
+                line.rstrip("\n").split("\t"))[1:] for line in lines],
+                dtype=float).reshape(-1, 4)
+        values[:, 2] *= 100
+        return values
+
+    def _params(self, allele):
+        try:
+            return self._params_cache[allele]
+        except KeyError:
+            params = get_params(allele)
+            self._params_cache[allele] = params
+            return params
+
+    @property
+    def _params_cache(self):
+        # Probe names are parsed once per panel and shared by every sample
+        # genotyped against it in this process
+        return PROBE_PARAMS_CACHE.setdefault(
+            tuple(self.panel_file_paths), {})
+
+    def _probe_coverage(self, values):
+        median_depth, min_depth, percent_coverage, k_count = values
+        return ProbeCoverage(
+            percent_coverage=float(percent_coverage),
+            median_depth=int(median_depth),
+            min_depth=int(min_depth),
+            k_count=int(k_count))
 
     def _is_variant_panel(self, allele_name):
         try:
@@ -139,108 +313,82 @@ class CoverageParser(object):
         except ValueError:
             return False
 
-    def _parse_seq_panel(self, row):
-        allele, median_depth, min_depth, percent_coverage, k_count = self._parse_summary_covgs_row(
-            row)
-        probe_coverage = ProbeCoverage(
-            percent_coverage=percent_coverage,
-            median_depth=median_depth,
-            min_depth=min_depth,
-            k_count=k_count)
-
-        allele_name = allele.split('?')[0]
-        params = get_params(allele)
+    def _parse_seq_panel(self, allele, values):
+        """Adds coverage of a variant or presence sequence probe. Returns
+        False, without parsing, for species panel probes"""
+        params = self._params(allele)
         panel_type = params.get("panel_type", "presence")
+        if panel_type not in ["variant", "presence"]:
+            return False
         name = params.get('name')
         version = params.get(
             'version',
             '1')
-        if panel_type in ["variant", "presence"]:
-            sequence_probe_coverage = SequenceProbeCoverage(
-                name=name,
-                probe_coverage=probe_coverage,
-                version=version,
-                length=params.get("length"))
-            try:
-                self.covgs[panel_type][name][version] = sequence_probe_coverage
-            except KeyError:
-                self.covgs[panel_type][name] = {}
-                self.covgs[panel_type][name][version] = sequence_probe_coverage
-
-        else:
-            # Species panels are treated differently
-            l = int(params.get("length", -1))
-            try:
-                self.covgs[panel_type][name]["total_bases"] += l
-                if percent_coverage > 75 and median_depth > 0:
-                    self.covgs[panel_type][name][
-                        "percent_coverage"].append(percent_coverage)
-                    self.covgs[panel_type][name]["length"].append(l)
-                    self.covgs[panel_type][name]["median"].append(median_depth)
-            except KeyError:
-                if panel_type not in self.covgs:
-                    self.covgs[panel_type] = {}
-                self.covgs[panel_type][name] = {}
-                self.covgs[panel_type][name]["total_bases"] = l
-                if percent_coverage > 75 and median_depth > 0:
-                    self.covgs[panel_type][name][
-                        "percent_coverage"] = [percent_coverage]
-                    self.covgs[panel_type][name]["length"] = [l]
-                    self.covgs[panel_type][name]["median"] = [median_depth]
-                else:
-                    self.covgs[panel_type][name]["percent_coverage"] = []
-                    self.covgs[panel_type][name]["length"] = []
-                    self.covgs[panel_type][name]["median"] = []
-
-    def _parse_variant_panel(self, row):
-        allele, median_depth, min_depth, percent_coverage, k_count = self._parse_summary_covgs_row(
-            row)
-        params = get_params(allele)
+        sequence_probe_coverage = SequenceProbeCoverage(
+            name=name,
+            probe_coverage=self._probe_coverage(values),
+            version=version,
+            length=params.get("length"))
+        try:
+            self.covgs[panel_type][name][version] = sequence_probe_coverage
+        except KeyError:
+            self.covgs[panel_type][name] = {}
+            self.covgs[panel_type][name][version] = sequence_probe_coverage
+        return True
+
+    def _parse_species_panels(self, keys, groups, lengths, values):
+        """Summarises species probe coverage by (panel_type, name). groups
+        gives the index in keys of each row. Coverage of each name is kept
+        as arrays for SpeciesPredictor"""
+        # Species panels are treated differently: the coverage of every
+        # probe for a name is summarised together
+        median_depths = values[:, 0].astype(int)
+        percent_coverages = values[:, 2]
+        total_bases = np.bincount(groups, weights=lengths,
+                                  minlength=len(keys)).astype(int)
+        covered = np.flatnonzero(
+            (percent_coverages > 75) & (median_depths > 0))
+        # Covered rows grouped by key, in panel order within each group
+        rows = covered[np.argsort(groups[covered], kind="mergesort")]
+        bounds = np.searchsorted(groups[rows], np.arange(len(keys) + 1))
+        for group, (panel_type, name) in enumerate(keys):
+            group_rows = rows[bounds[group]:bounds[group + 1]]
+            self.covgs.setdefault(panel_type, {})[name] = {
+                "total_bases": int(total_bases[group]),
+                "percent_coverage": percent_coverages[group_rows],
+                "length": lengths[group_rows],
+                "median": median_depths[group_rows]}
+
+    def _parse_variant_panel(self, alleles, values, i):
+        """Adds coverage of the variant starting at row i. Returns the row
+        after its last alt allele"""
+        allele = alleles[i]
+        params = self._params(allele)
         if 'var_name' in params:
             var_name = params.get('var_name')
         else:
             var_name = allele.split('?')[0].split('-')[1]
 
         num_alts = int(params.get("num_alts", 0))
-        reference_coverages = [ProbeCoverage(
-            percent_coverage=percent_coverage,
-            median_depth=median_depth,
-            min_depth=min_depth,
-            k_count=k_count)]
-        alt_or_ref = 'ref'
+        reference_coverages = [self._probe_coverage(values[i])]
+        i += 1
         alternate_coverages = []
-        for i in range(num_alts-1):
-            row = next(self.reader)
-            ref_allele, median_depth, min_depth, percent_coverage, k_count = self._parse_summary_covgs_row(
-                row)
+        for _ in range(num_alts-1):
+            ref_allele = alleles[i]
             if ref_allele.split('-')[0] != 'ref':
                 logger.warning(
                     "Fewer ref alleles than alt alleles for %s" % ref_allele)
-                alternate_coverages.append(ProbeCoverage(
-                    min_depth=min_depth,
-                    k_count=k_count,
-                    percent_coverage=percent_coverage,
-                    median_depth=median_depth))
+                alternate_coverages.append(self._probe_coverage(values[i]))
+                i += 1
                 num_alts -= 1
                 break
-
-            assert ref_allele.split('-')[0] == 'ref'
-            reference_coverages.append(ProbeCoverage(
-                percent_coverage=percent_coverage,
-                median_depth=median_depth,
-                min_depth=min_depth,
-                k_count=k_count))
-        for i in range(num_alts):
-            row = next(self.reader)
-            alt_allele, median_depth, min_depth, percent_coverage, k_count = self._parse_summary_covgs_row(
-                row)
+            reference_coverages.append(self._probe_coverage(values[i]))
+            i += 1
+        for _ in range(num_alts):
+            alt_allele = alleles[i]
             assert alt_allele.split('-')[0] == 'alt'
-            alternate_coverages.append(
-                ProbeCoverage(
-                    min_depth=min_depth,
-                    k_count=k_count,
-                    percent_coverage=percent_coverage,
-                    median_depth=median_depth))
+            alternate_coverages.append(self._probe_coverage(values[i]))
+            i += 1
         variant_probe_coverage = VariantProbeCoverage(
             reference_coverages=reference_coverages,
             alternate_coverages=alternate_coverages,
@@ -250,6 +398,32 @@ class CoverageParser(object):
             self.variant_covgs[allele].append(variant_probe_coverage)
         except KeyError:
             self.variant_covgs[allele] = [variant_probe_coverage]
+        return i
+
+
+def _chunks(items, n):
+    """Splits items into n contiguous chunks"""
+    size = (len(items) + n - 1) // n
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _type_gene_chunk(chunk):
+    typer_kwargs, min_gene_percent_covg_threshold, genes = chunk
+    gt = GeneCollectionTyper(**typer_kwargs)
+    typed = []
+    for gene_name, gene_collection in genes:
+        calls = gt.type(
+            gene_collection,
+            min_gene_percent_covg_threshold=min_gene_percent_covg_threshold)
+        typed.append((gene_name, calls,
+                      [gpc.to_dict() for gpc in calls]))
+    return typed, gt.presence_typer.likelihood_cache.stats
+
+
+def _type_variant_chunk(chunk):
+    typer_kwargs, variants = chunk
+    vt = VariantTyper(**typer_kwargs)
+    return vt.type_many(variants), vt.likelihood_cache.stats
 
 
 class Genotyper(object):
@@ -272,15 +446,15 @@ class Genotyper(object):
             variant_confidence_threshold=1,
             sequence_confidence_threshold=0,
             min_gene_percent_covg_threshold=100,
-            model="depth"):
+            model="depth",
+            probe_ids={},
+            threads=1):
         self.sample = sample
         self.variant_covgs = variant_covgs
         self.gene_presence_covgs = gene_presence_covgs
         self.out_json = base_json
-        if expected_depths[0] < 1:
-            self.expected_depths = [1]
-        else:
-            self.expected_depths = expected_depths
+        # One depth per species in a mixed sample
+        self.expected_depths = [max(1, d) for d in expected_depths]
         self.contamination_depths = contamination_depths
         self.variant_calls = {}
         self.sequence_calls = {}
@@ -295,48 +469,110 @@ class Genotyper(object):
         self.variant_confidence_threshold = variant_confidence_threshold
         self.sequence_confidence_threshold = sequence_confidence_threshold
         self.min_gene_percent_covg_threshold = min_gene_percent_covg_threshold
+        # Ids from the panel index, so probe names needn't be parsed
+        self.probe_ids = probe_ids
+        # Shared by every typer in the run, as they all use the same
+        # expected depths
+        self.likelihood_cache = LogPoissonCache()
+        # Stats of the caches of the typing pool's workers, which each have
+        # their own
+        self._worker_cache_stats = []
+        # Processes used to type genes and variants
+        self.threads = threads
 
     def run(self):
         self._type()
+        logger.debug("Likelihood cache: %s" % self.likelihood_cache_stats)
+
+    @property
+    def likelihood_cache_stats(self):
+        """Likelihood cache stats, summed over the typing pool's workers if
+        typing was split across a pool"""
+        stats = dict(self.likelihood_cache.stats)
+        for worker_stats in self._worker_cache_stats:
+            for key, value in worker_stats.items():
+                stats[key] += value
+        return stats
 
     def _type(self):
-        self._type_genes()
-        self._type_variants()
-
-    def _type_genes(self):
-        gt = GeneCollectionTyper(
-            expected_depths=self.expected_depths,
-            contamination_depths=self.contamination_depths,
-            confidence_threshold=self.sequence_confidence_threshold)
-        for gene_name, gene_collection in self.gene_presence_covgs.items():
-            self.gene_presence_covgs[gene_name] = gt.type(
-                gene_collection,
-                min_gene_percent_covg_threshold=self.min_gene_percent_covg_threshold)
-            self.sequence_calls_dict[gene_name] = [
-                gpc.to_mongo().to_dict() for gpc in self.gene_presence_covgs[gene_name]]
+        pool = self._typing_pool()
+        try:
+            self._type_genes(pool)
+            self._type_variants(pool)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def _typing_pool(self):
+        if self.threads <= 1:
+            return None
+        if len(self.gene_presence_covgs) + len(
+                self.variant_covgs) < MIN_PARALLEL_TYPING_ITEMS:
+            return None
+        if multiprocessing.current_process().daemon:
+            # e.g. a genotype-batch worker, which can't start its own pool
+            logger.debug("Typing in a single process")
+            return None
+        return multiprocessing.Pool(self.threads)
+
+    def _map_chunks(self, pool, f, typer_kwargs, items, *args):
+        """Types items with f, in chunks across the pool if there is one.
+        Results are returned in the order of items."""
+        if pool is None or not items:
+            chunks = [items]
+        else:
+            chunks = _chunks(items, self.threads)
+        chunks = [(typer_kwargs,) + args + (chunk,) for chunk in chunks]
+        if pool is None:
+            results = [f(chunk) for chunk in chunks]
+        else:
+            results = pool.map(f, chunks, chunksize=1)
+            self._worker_cache_stats.extend(stats for _, stats in results)
+        return [r for typed, _ in results for r in typed]
+
+    def _gene_typer_kwargs(self):
+        return {"expected_depths": self.expected_depths,
+                "contamination_depths": self.contamination_depths,
+                "confidence_threshold": self.sequence_confidence_threshold}
+
+    def _variant_typer_kwargs(self):
+        return {"expected_depths": self.expected_depths,
+                "error_rate": self.expected_error_rate,
+                "contamination_depths": self.contamination_depths,
+                "ignore_filtered": self.ignore_filtered,
+                "minor_freq": self.minor_freq,
+                "confidence_threshold": self.variant_confidence_threshold,
+                "filters": self.filters,
+                "model": self.model}
+
+    def _type_genes(self, pool=None):
+        typer_kwargs = self._gene_typer_kwargs()
+        if pool is None:
+            typer_kwargs["likelihood_cache"] = self.likelihood_cache
+        typed = self._map_chunks(
+            pool, _type_gene_chunk, typer_kwargs,
+            list(self.gene_presence_covgs.items()),
+            self.min_gene_percent_covg_threshold)
+        for gene_name, calls, call_dicts in typed:
+            self.gene_presence_covgs[gene_name] = calls
+            self.sequence_calls_dict[gene_name] = call_dicts
         self.out_json[self.sample][
             "sequence_calls"] = self.sequence_calls_dict
 
-    def _type_variants(self):
+    def _type_variants(self, pool=None):
         self.out_json[self.sample]["variant_calls"] = {}
-        gt = VariantTyper(
-            expected_depths=self.expected_depths,
-            error_rate=self.expected_error_rate,
-            contamination_depths=self.contamination_depths,
-            ignore_filtered=self.ignore_filtered,
-            minor_freq=self.minor_freq,
-            confidence_threshold=self.variant_confidence_threshold,
-            filters=self.filters,
-            model=self.model
-        )
+        typer_kwargs = self._variant_typer_kwargs()
+        if pool is None:
+            typer_kwargs["likelihood_cache"] = self.likelihood_cache
         genotypes = []
         filters = []
-        for probe_name, probe_coverages in self.variant_covgs.items():
+        variants = list(self.variant_covgs.items())
+        # Likelihoods for every probe in a chunk are calculated together
+        calls = self._map_chunks(
+            pool, _type_variant_chunk, typer_kwargs, variants)
+        for (probe_name, probe_coverages), call in zip(variants, calls):
             probe_id = self._name_to_id(probe_name)
-            variant = None
-
-            call = gt.type(probe_coverages, variant=probe_name)
-
             genotypes.append(sum(call["genotype"]))
             filters.append(int(call["info"]["filter"] == "PASS"))
             if sum(call["genotype"]) > 0 or not call[
@@ -349,17 +585,12 @@ class Genotyper(object):
         self.out_json[self.sample]["variant_calls"] = self.variant_calls_dict
 
     def _name_to_id(self, probe_name):
-        names = []
-        params = get_params(probe_name)
-        if params.get("mut"):
-            names.append("_".join([params.get("gene"), params.get("mut")]))
-            var_name = params.get("var_name")
-        else:
-            var_name = probe_name.split('?')[0].split('-')[1]
-        names.append(var_name)
-        return "-".join(names)
+        if probe_name in self.probe_ids:
+            return self.probe_ids[probe_name]
+        return variant_probe_id(probe_name)
 
     def _create_variant(self, probe_name):
+        from ga4ghmongo.schema import Variant
         names = []
         params = get_params(probe_name)
         if params.get("mut"):
@@ -1,7 +1,8 @@
 from mykatlas.typing.typer.base import Typer
 from mykatlas.typing.typer.base import MIN_LLK
-from ga4ghmongo.schema import SequenceCall
+from mykatlas.typing.models.presence import SequenceCall
 from mykatlas.stats import log_lik_depth
+from mykatlas.stats import LogPoissonCache
 from mykatlas.stats import percent_coverage_from_expected_coverage
 from math import log
 
@@ -11,15 +12,16 @@ class PresenceTyper(Typer):
     "Initiated with expected depths and contamination depths"
 
     def __init__(self, expected_depths, contamination_depths=[],
-                 confidence_threshold=1):
+                 confidence_threshold=1, likelihood_cache=None):
         super(
             PresenceTyper,
             self).__init__(
             expected_depths,
             contamination_depths,
             confidence_threshold=confidence_threshold)
-        if len(expected_depths) > 1:
-            raise NotImplementedError("Mixed samples not supported")
+        if likelihood_cache is None:
+            likelihood_cache = LogPoissonCache()
+        self.likelihood_cache = likelihood_cache
 
     def type(self, sequence_probe_coverage):
         "Takes a single SequenceCoverage object (or child) and returns genotype"
@@ -30,11 +32,14 @@ class PresenceTyper(Typer):
         hom_alt_likelihoods = []
         het_likelihoods = []
         hom_ref_likelihoods = []
+        best_hom_alt = None
         for expected_depth in self.expected_depths:
             hom_alt_likelihoods.append(
                 self._hom_alt_likeihood(
                     median_depth=sequence_probe_coverage.median_depth,
                     expected_depth=expected_depth))
+            if best_hom_alt is None or hom_alt_likelihoods[-1] > best_hom_alt[0]:
+                best_hom_alt = (hom_alt_likelihoods[-1], expected_depth)
             if not self.has_contamination():
                 het_likelihoods.append(
                     self._het_likelihood(
@@ -60,6 +65,9 @@ class PresenceTyper(Typer):
                         median_depth=sequence_probe_coverage.median_depth,
                         expected_depth=contamination_depth))
             # Posterior
+        # In a mixed sample, the depth of the species the gene most likely
+        # comes from
+        expected_depth = best_hom_alt[1]
         hom_ref_likelihood = self._log_post_hom_ref(max(hom_ref_likelihoods))
         hom_alt_likelihood = self._log_post_het_or_alt(
             max(hom_alt_likelihoods),
@@ -84,24 +92,25 @@ class PresenceTyper(Typer):
         if sequence_probe_coverage.length is not None:
             info["length"] = sequence_probe_coverage.length
 
-        return SequenceCall.create(
-            sequence=None,
-            call_set=None,
+        return SequenceCall(
             genotype=gt,
             genotype_likelihoods=likelihoods,
             info=info)
 
     def _hom_alt_likeihood(self, median_depth, expected_depth):
-        return log_lik_depth(median_depth, expected_depth * 0.75)
+        return log_lik_depth(median_depth, expected_depth * 0.75,
+                             cache=self.likelihood_cache)
 
     def _het_likelihood(self, median_depth, expected_depth):
         return log_lik_depth(
             median_depth,
             expected_depth *
-            self.minimum_detectable_frequency)
+            self.minimum_detectable_frequency,
+            cache=self.likelihood_cache)
 
     def _hom_ref_likelihood(self, median_depth, expected_depth):
-        return log_lik_depth(median_depth, expected_depth * 0.001)
+        return log_lik_depth(median_depth, expected_depth * 0.001,
+                             cache=self.likelihood_cache)
 
     @property
     def minimum_detectable_frequency(self):
@@ -133,7 +142,8 @@ class GeneCollectionTyper(Typer):
             self,
             expected_depths,
             contamination_depths=[],
-            confidence_threshold=1):
+            confidence_threshold=1,
+            likelihood_cache=None):
         super(
             GeneCollectionTyper,
             self).__init__(
@@ -141,7 +151,8 @@ class GeneCollectionTyper(Typer):
             contamination_depths,
             confidence_threshold=confidence_threshold)
         self.presence_typer = PresenceTyper(
-            expected_depths, contamination_depths)
+            expected_depths, contamination_depths,
+            likelihood_cache=likelihood_cache)
 
     def type(self, sequence_coverage_collection,
              min_gene_percent_covg_threshold=99):
@@ -157,14 +168,19 @@ class GeneCollectionTyper(Typer):
             self,
             sequence_coverages,
             min_gene_percent_covg_threshold):
-        sequence_coverages=list(sequence_coverages)
-        sequence_coverages.sort(key=lambda x: x.percent_coverage, reverse=True)
-        current_best_gene = sequence_coverages[0]
-        current_best_genes = [current_best_gene]
-        for gene in sequence_coverages[1:]:
-            # Report if above threshold regardless if it is
+        """Returns every version with at least min_gene_percent_covg_threshold
+        percent coverage, best first, or the best version if there are
+        none"""
+        # Versions below the threshold are only reported if none are above
+        # it, and then only the best, so only versions above it are sorted
+        best = None
+        above_threshold = []
+        for gene in sequence_coverages:
+            if best is None or gene.percent_coverage > best.percent_coverage:
+                best = gene
             if gene.percent_coverage >= min_gene_percent_covg_threshold:
-                current_best_genes.append(gene)
-            elif gene.percent_coverage < min_gene_percent_covg_threshold:
-                return current_best_genes
-        return current_best_genes
+                above_threshold.append(gene)
+        if not above_threshold:
+            return [best] if best is not None else []
+        above_threshold.sort(key=lambda x: x.percent_coverage, reverse=True)
+        return above_threshold
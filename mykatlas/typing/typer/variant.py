@@ -1,7 +1,11 @@
 from mykatlas.typing.typer.base import Typer
 from mykatlas.stats import log_lik_R_S_coverage
 from mykatlas.stats import log_lik_R_S_kmer_count
+from mykatlas.stats import log_lik_R_S_coverage_array
+from mykatlas.stats import log_lik_R_S_kmer_count_array
+from mykatlas.stats import LogPoissonCache
 from mykatlas.typing.typer.base import MIN_LLK
+from mykatlas.typing.typer.base import MIN_CONF
 from mykatlas.typing.typer.base import DEFAULT_MINOR_FREQ
 from mykatlas.typing.typer.base import DEFAULT_ERROR_RATE
 
@@ -9,8 +13,11 @@ from mykatlas.typing.typer.base import DEFAULT_ERROR_RATE
 from mykatlas.stats import percent_coverage_from_expected_coverage
 from mykatlas.stats import log_lik_probability_of_N_gaps
 import logging
+import numpy as np
 logger = logging.getLogger(__name__)
 
+GENOTYPES = ["0/0", "0/1", "1/1"]
+
 
 def likelihoods_to_confidence(l):
     if not len(l) > 1:
@@ -25,6 +32,39 @@ def likelihoods_to_confidence(l):
         return int(round(l_sorted[0] - l_sorted[1]))
 
 
+def likelihoods_to_confidences(likelihoods):
+    """likelihoods_to_confidence for each column of a 3xN array"""
+    l_sorted = -np.sort(-likelihoods, axis=0)
+    return np.rint(np.where(
+        l_sorted[2] == likelihoods[0],
+        l_sorted[0] - likelihoods[0],
+        l_sorted[0] - l_sorted[1])).astype(int)
+
+
+class VariantCoverageArrays(object):
+
+    """The best reference and alternate coverages of many
+    VariantProbeCoverages, as arrays"""
+
+    def __init__(self, variant_probe_coverages):
+        self.reference_kmer_count = self._array(
+            variant_probe_coverages, "reference_kmer_count")
+        self.alternate_kmer_count = self._array(
+            variant_probe_coverages, "alternate_kmer_count")
+        self.reference_median_depth = self._array(
+            variant_probe_coverages, "reference_median_depth")
+        self.alternate_median_depth = self._array(
+            variant_probe_coverages, "alternate_median_depth")
+        self.reference_percent_coverage = self._array(
+            variant_probe_coverages, "reference_percent_coverage")
+        self.alternate_percent_coverage = self._array(
+            variant_probe_coverages, "alternate_percent_coverage")
+
+    def _array(self, variant_probe_coverages, attr):
+        return np.array([getattr(vpc, attr)
+                         for vpc in variant_probe_coverages], dtype=float)
+
+
 class VariantTyper(Typer):
 
     def __init__(self, expected_depths, contamination_depths=[],
@@ -33,7 +73,8 @@ class VariantTyper(Typer):
                  ignore_filtered=False,
                  filters=[],
                  confidence_threshold=3,
-                 model="kmer_count"):
+                 model="kmer_count",
+                 likelihood_cache=None):
 
         super(
             VariantTyper,
@@ -47,20 +88,22 @@ class VariantTyper(Typer):
         self.method = "MAP"
         self.error_rate = error_rate
         self.minor_freq = minor_freq
+        if likelihood_cache is None:
+            likelihood_cache = LogPoissonCache()
+        self.likelihood_cache = likelihood_cache
 
         if model == "depth":
             self.model = DepthCoverageGenotypeModel(
-                self.expected_depths, self.contamination_depths, self.error_rate, self.minor_freq)
+                self.expected_depths, self.contamination_depths, self.error_rate, self.minor_freq,
+                cache=likelihood_cache)
         elif model == "kmer_count":
             logger.debug("Genotyping using kc model")
             self.model = KmerCountGenotypeModel(
-                self.expected_depths, self.contamination_depths, self.error_rate, self.minor_freq)
+                self.expected_depths, self.contamination_depths, self.error_rate, self.minor_freq,
+                cache=likelihood_cache)
         self.ignore_filtered = ignore_filtered
         self.filters = filters
 
-        if len(expected_depths) > 1:
-            raise NotImplementedError("Mixed samples not handled yet")
-
     def type(self, variant_probe_coverages, variant=None):
         """
             Takes a list of VariantProbeCoverages and returns a Call for the Variant.
@@ -75,6 +118,48 @@ class VariantTyper(Typer):
             calls.append(
                 self._type_variant_probe_coverages(
                     variant_probe_coverage, variant))
+        return self._choose_call(calls)
+
+    def type_many(self, variants):
+        """
+            Takes a list of (variant, VariantProbeCoverages) and returns a Call for each,
+            as `type` would. The likelihoods of every probe are calculated together as arrays.
+
+        """
+        probes = []
+        owners = []
+        for i, (variant, variant_probe_coverages) in enumerate(variants):
+            if not isinstance(variant_probe_coverages, list):
+                variant_probe_coverages = [variant_probe_coverages]
+            probes.extend(variant_probe_coverages)
+            owners.extend([i] * len(variant_probe_coverages))
+        if not probes:
+            return []
+        coverages = VariantCoverageArrays(probes)
+        likelihoods = np.vstack([self.model.hom_ref_liks(coverages),
+                                 self.model.het_liks(coverages),
+                                 self.model.hom_alt_liks(coverages)])
+        if self.has_contamination():
+            likelihoods[1] = MIN_LLK
+        confidences = likelihoods_to_confidences(likelihoods)
+        best = np.argmax(likelihoods, axis=0)
+        missing = (best == 0) & (likelihoods[0] <= MIN_CONF)
+        calls = [[] for _ in variants]
+        for j, variant_probe_coverage in enumerate(probes):
+            if missing[j]:
+                gt = "-/-"
+            else:
+                gt = GENOTYPES[best[j]]
+            calls[owners[j]].append(self._make_call(
+                variant_probe_coverage,
+                variants[owners[j]][0],
+                [MIN_LLK if l == MIN_LLK else l
+                 for l in likelihoods[:, j].tolist()],
+                int(confidences[j]),
+                gt))
+        return [self._choose_call(c) for c in calls]
+
+    def _choose_call(self, calls):
         hom_alt_calls = [c for c in calls if sum(c["genotype"]) > 1]
         het_calls = [c for c in calls if sum(c["genotype"]) == 1]
         if hom_alt_calls:
@@ -100,6 +185,11 @@ class VariantTyper(Typer):
         gt = self.likelihoods_to_genotype(
             likelihoods
         )
+        return self._make_call(
+            variant_probe_coverage, variant, likelihoods, confidence, gt)
+
+    def _make_call(self, variant_probe_coverage, variant, likelihoods,
+                   confidence, gt):
         info = {"coverage": variant_probe_coverage.coverage_dict,
                 "expected_depths": self.expected_depths,
                 "contamination_depths": self.contamination_depths,
@@ -130,11 +220,14 @@ class VariantTyper(Typer):
 
 class GenotypeModel(object):
 
-    def __init__(self, expected_depths, contamination_depths, error_rate, minor_freq):
+    def __init__(self, expected_depths, contamination_depths, error_rate, minor_freq,
+                 cache=None):
         self.expected_depths = expected_depths
         self.contamination_depths = contamination_depths
         self.error_rate = error_rate
         self.minor_freq = minor_freq
+        # Memo of log_poisson_prob shared by the scalar likelihoods
+        self.cache = cache
 
     def hom_ref_lik(self, variant_probe_coverage):
         raise NotImplementedError
@@ -145,12 +238,38 @@ class GenotypeModel(object):
     def het_lik(self, variant_probe_coverage):
         raise NotImplementedError
 
+    # The *_liks methods take VariantCoverageArrays and return an array
+    # of likelihoods, one per probe
+
+    def hom_ref_liks(self, coverages):
+        raise NotImplementedError
+
+    def hom_alt_liks(self, coverages):
+        raise NotImplementedError
+
+    def het_liks(self, coverages):
+        raise NotImplementedError
+
+    def _hom_liks(self, log_lik, observed, other):
+        # Either alt+cov or alt_covg + contam_covg
+        liks = []
+        for expected_depth in self.expected_depths:
+            liks.append(log_lik(observed, other, expected_depth,
+                                expected_depth * self.error_rate / 3))
+            for contamination in self.contamination_depths:
+                liks.append(log_lik(
+                    observed, other, expected_depth + contamination,
+                    (expected_depth + contamination) * self.error_rate / 3))
+        return np.max(liks, axis=0)
+
 
 class KmerCountGenotypeModel(GenotypeModel):
 
-    def __init__(self, expected_depths, contamination_depths, error_rate, minor_freq):
+    def __init__(self, expected_depths, contamination_depths, error_rate, minor_freq,
+                 cache=None):
         super(KmerCountGenotypeModel, self).__init__(
-            expected_depths, contamination_depths, error_rate, minor_freq)
+            expected_depths, contamination_depths, error_rate, minor_freq,
+            cache=cache)
 
     def hom_ref_lik(self, variant_probe_coverage):
         hom_ref_likes = []
@@ -163,14 +282,16 @@ class KmerCountGenotypeModel(GenotypeModel):
                     expected_depth,
                     expected_depth *
                     self.error_rate /
-                    3))
+                    3,
+                    cache=self.cache))
             for contamination in self.contamination_depths:
                 hom_ref_likes.append(
                     log_lik_R_S_kmer_count(
                         variant_probe_coverage.reference_kmer_count,
                         variant_probe_coverage.alternate_kmer_count,
                         expected_depth + contamination,
-                        (expected_depth + contamination) * self.error_rate / 3))
+                        (expected_depth + contamination) * self.error_rate / 3,
+                        cache=self.cache))
         return max(hom_ref_likes)
 
     def hom_alt_lik(self, variant_probe_coverage):
@@ -184,14 +305,16 @@ class KmerCountGenotypeModel(GenotypeModel):
                     expected_depth,
                     expected_depth *
                     self.error_rate /
-                    3))
+                    3,
+                    cache=self.cache))
             for contamination in self.contamination_depths:
                 hom_alt_liks.append(
                     log_lik_R_S_kmer_count(
                         variant_probe_coverage.alternate_kmer_count,
                         variant_probe_coverage.reference_kmer_count,
                         expected_depth + contamination,
-                        (expected_depth + contamination) * self.error_rate / 3))
+                        (expected_depth + contamination) * self.error_rate / 3,
+                        cache=self.cache))
         return max(hom_alt_liks)
 
     def het_lik(self, variant_probe_coverage):
@@ -208,16 +331,47 @@ class KmerCountGenotypeModel(GenotypeModel):
                         variant_probe_coverage.reference_kmer_count,
                         expected_depth/2 +
                         (expected_depth/2 * self.error_rate/3),
-                        expected_depth/2 + (expected_depth/2 * self.error_rate/3))
+                        expected_depth/2 + (expected_depth/2 * self.error_rate/3),
+                        cache=self.cache)
                 )
             return max(het_liks)
 
+    def hom_ref_liks(self, coverages):
+        return self._hom_liks(log_lik_R_S_kmer_count_array,
+                              coverages.reference_kmer_count,
+                              coverages.alternate_kmer_count)
+
+    def hom_alt_liks(self, coverages):
+        return self._hom_liks(log_lik_R_S_kmer_count_array,
+                              coverages.alternate_kmer_count,
+                              coverages.reference_kmer_count)
+
+    def het_liks(self, coverages):
+        het_liks = []
+        for expected_depth in self.expected_depths:
+            het_liks.append(
+                log_lik_R_S_kmer_count_array(
+                    coverages.alternate_kmer_count,
+                    coverages.reference_kmer_count,
+                    expected_depth/2 +
+                    (expected_depth/2 * self.error_rate/3),
+                    expected_depth/2 + (expected_depth/2 * self.error_rate/3))
+            )
+        no_kmers = (coverages.alternate_kmer_count +
+                    coverages.reference_kmer_count) == 0
+        not_covered = (coverages.alternate_percent_coverage < 100) | (
+            coverages.reference_percent_coverage < 100)
+        return np.where(no_kmers | not_covered, MIN_LLK,
+                        np.max(het_liks, axis=0))
+
 
 class DepthCoverageGenotypeModel(GenotypeModel):
 
-    def __init__(self, expected_depths, contamination_depths, error_rate, minor_freq):
+    def __init__(self, expected_depths, contamination_depths, error_rate, minor_freq,
+                 cache=None):
         super(DepthCoverageGenotypeModel, self).__init__(
-            expected_depths, contamination_depths, error_rate, minor_freq)
+            expected_depths, contamination_depths, error_rate, minor_freq,
+            cache=cache)
 
     def hom_ref_lik(self, variant_probe_coverage):
         if variant_probe_coverage.reference_percent_coverage < 100 * \
@@ -234,14 +388,16 @@ class DepthCoverageGenotypeModel(GenotypeModel):
                         expected_depth,
                         expected_depth *
                         self.error_rate /
-                        3))
+                        3,
+                        cache=self.cache))
                 for contamination in self.contamination_depths:
                     hom_ref_likes.append(
                         log_lik_R_S_coverage(
                             variant_probe_coverage.reference_median_depth,
                             variant_probe_coverage.alternate_median_depth,
                             expected_depth + contamination,
-                            (expected_depth + contamination) * self.error_rate / 3))
+                            (expected_depth + contamination) * self.error_rate / 3,
+                            cache=self.cache))
             return max(hom_ref_likes)
 
     def hom_alt_lik(self, variant_probe_coverage):
@@ -259,14 +415,16 @@ class DepthCoverageGenotypeModel(GenotypeModel):
                         expected_depth,
                         expected_depth *
                         self.error_rate /
-                        3))
+                        3,
+                        cache=self.cache))
                 for contamination in self.contamination_depths:
                     hom_alt_liks.append(
                         log_lik_R_S_coverage(
                             variant_probe_coverage.alternate_median_depth,
                             variant_probe_coverage.reference_median_depth,
                             expected_depth + contamination,
-                            (expected_depth + contamination) * self.error_rate / 3))
+                            (expected_depth + contamination) * self.error_rate / 3,
+                            cache=self.cache))
             return max(hom_alt_liks)
 
     def het_lik(self, variant_probe_coverage):
@@ -281,5 +439,40 @@ class DepthCoverageGenotypeModel(GenotypeModel):
                         variant_probe_coverage.reference_median_depth,
                         expected_depth * self.minor_freq,
                         expected_depth * (
-                            1 - self.minor_freq)))
+                            1 - self.minor_freq),
+                            cache=self.cache))
             return max(het_liks)
+
+    def _min_percent_coverage(self):
+        return 100 * percent_coverage_from_expected_coverage(
+            max(self.expected_depths))
+
+    def hom_ref_liks(self, coverages):
+        return np.where(
+            coverages.reference_percent_coverage < self._min_percent_coverage(),
+            MIN_LLK,
+            self._hom_liks(log_lik_R_S_coverage_array,
+                           coverages.reference_median_depth,
+                           coverages.alternate_median_depth))
+
+    def hom_alt_liks(self, coverages):
+        return np.where(
+            coverages.alternate_percent_coverage < self._min_percent_coverage(),
+            MIN_LLK,
+            self._hom_liks(log_lik_R_S_coverage_array,
+                           coverages.alternate_median_depth,
+                           coverages.reference_median_depth))
+
+    def het_liks(self, coverages):
+        het_liks = []
+        for expected_depth in self.expected_depths:
+            het_liks.append(
+                log_lik_R_S_coverage_array(
+                    coverages.alternate_median_depth,
+                    coverages.reference_median_depth,
+                    expected_depth * self.minor_freq,
+                    expected_depth * (
+                        1 - self.minor_freq)))
+        not_covered = (coverages.alternate_percent_coverage < 100) | (
+            coverages.reference_percent_coverage < 100)
+        return np.where(not_covered, MIN_LLK, np.max(het_liks, axis=0))
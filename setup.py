@@ -42,7 +42,8 @@ setup(
             'Biopython',
             'mongoengine',
             'pyvcf',
-            'ga4ghmongo'],
+            'ga4ghmongo',
+            'numpy'],
     entry_points={
         'console_scripts': [
             'atlas = mykatlas.atlas_main:main',
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+from unittest import TestCase
+
+import pytest
+
+from mykatlas.base import force_mixin
+from mykatlas.base import genotyping_mixin
+from mykatlas.base import mccortex_options_mixin
+from mykatlas.base import probe_set_mixin
+from mykatlas.base import sample_sheet_mixin
+from mykatlas.cmds.genotype_batch import read_sample_sheet
+from mykatlas.cmds.genotype_batch import run
+
+PROBE = "ref-A1T?num_alts=1&ref=t1"
+
+# Stands in for mccortex31, logging each build and geno run. Sample s2 has
+# the alternate allele.
+FAKE_MCCORTEX = """#!%s
+import os
+import sys
+args = sys.argv[1:]
+with open(os.path.join(os.path.dirname(sys.argv[0]), "calls.log"),
+          "a") as log:
+    if args[0] == "build":
+        open(args[-1], "w").close()
+        log.write("build\\n")
+    else:
+        assert os.path.exists(args[args.index("-I") + 1])
+        sample = args[args.index("-s") + 1]
+        log.write("geno %%s -t %%s\\n" %% (sample, args[args.index("-t") + 1]))
+        ref, alt = (0, 25) if sample.startswith("s2") else (25, 0)
+        for probe, depth in [("ref", ref), ("alt", alt)]:
+            name = probe + "-A1T?num_alts=1&ref=t1"
+            sys.stdout.write("%%s\\t31\\t%%i\\t%%i\\t%%s\\t%%i\\n" %% (
+                name, depth, depth, "1.0" if depth else "0.0", 32 * depth))
+""" % sys.executable
+
+
+def _write(filepath, s):
+    with open(filepath, "w") as outfile:
+        outfile.write(s)
+
+
+def test_read_sample_sheet():
+    fd, filepath = tempfile.mkstemp(suffix=".tsv")
+    with os.fdopen(fd, "w") as outfile:
+        outfile.write("# sample\tfiles\n"
+                      "s1\ts1_1.fq.gz\ts1_2.fq.gz\n"
+                      "\n"
+                      "s2\ts2.ctx\n"
+                      "s3\ts3.bam\n")
+    try:
+        assert read_sample_sheet(filepath) == [
+            ("s1", ["s1_1.fq.gz", "s1_2.fq.gz"], None),
+            ("s2", None, "s2.ctx"),
+            ("s3", ["s3.bam"], None)]
+    finally:
+        os.remove(filepath)
+
+
+def test_duplicate_samples_are_rejected():
+    fd, filepath = tempfile.mkstemp(suffix=".tsv")
+    with os.fdopen(fd, "w") as outfile:
+        outfile.write("s1\ts1.fq.gz\ns1\ts1_rerun.fq.gz\n")
+    try:
+        with pytest.raises(ValueError):
+            read_sample_sheet(filepath)
+    finally:
+        os.remove(filepath)
+
+
+class GenotypeBatchTest(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.mccortex = os.path.join(self.tmp_dir, "mccortex31")
+        _write(self.mccortex, FAKE_MCCORTEX)
+        os.chmod(self.mccortex, stat.S_IRWXU)
+        self.panel = os.path.join(self.tmp_dir, "panel.fasta")
+        _write(self.panel, ">%s\nAAAAAAA\n>alt%s\nAAATAAA\n" % (
+            PROBE, PROBE[3:]))
+        self.samples = os.path.join(self.tmp_dir, "samples.tsv")
+        _write(self.samples, "s1\ts1.fq.gz\ns2\ts2.fq.gz\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _calls(self):
+        with open(os.path.join(self.tmp_dir, "calls.log")) as infile:
+            return [line.strip() for line in infile]
+
+    def _run(self, jobs):
+        parser = argparse.ArgumentParser(parents=[
+            sample_sheet_mixin, probe_set_mixin, mccortex_options_mixin,
+            force_mixin, genotyping_mixin])
+        args = parser.parse_args([
+            self.samples, self.panel, "--stream", "--report_all_calls",
+            "--expected_depth", "25", "-t", "4", "-k", "31",
+            "--tmp", os.path.join(self.tmp_dir, "tmp"),
+            "--skeleton_dir", os.path.join(self.tmp_dir, "skeletons"),
+            "--mccortex31_path", self.mccortex])
+        args.jobs = jobs
+        args.out_dir = None
+        run(parser, args)
+
+    def _genotypes(self, out):
+        out_json = json.loads(out)
+        return {sample: out_json[sample]["variant_calls"]["A1T"]["genotype"]
+                for sample in out_json}
+
+    @pytest.fixture(autouse=True)
+    def _capsys(self, capsys):
+        self.capsys = capsys
+
+    def test_run_genotypes_every_sample(self):
+        self._run(jobs=1)
+        serial = self.capsys.readouterr().out
+        assert self._genotypes(serial) == {"s1": [0, 0], "s2": [1, 1]}
+        self._run(jobs=2)
+        assert json.loads(self.capsys.readouterr().out) == json.loads(serial)
+        calls = self._calls()
+        # The skeleton is built once and shared by every sample and run
+        assert calls.count("build") == 1
+        # Jobs genotyped at once split --threads between them
+        assert sorted(calls[1:]) == [
+            "geno s1-31 -t 2", "geno s1-31 -t 4",
+            "geno s2-31 -t 2", "geno s2-31 -t 4"]
@@ -0,0 +1,86 @@
+#! /usr/bin/env python
+import sys
+import json
+
+# Self contained as it is also run as a stand-in mccortex31 executable
+COMPLEMENT = str.maketrans("ACGT", "TGCA")
+KMER_SIZE = 7
+# No kmer or (k-1)mer occurs twice in either orientation
+SEQ = "CCGTAATGCCTTTCCCTAACAGAGTTTTTC"
+
+
+def canonical(s):
+    return min(s, s.translate(COMPLEMENT)[::-1])
+
+
+class FakeMcCortexPipe(object):
+
+    """Answers queries the way `mccortex31 server --single-line --coverages`
+    does, for a graph built from a list of sequences"""
+
+    def __init__(self, proc):
+        self.proc = proc
+
+    def write(self, s):
+        self.proc.pending.extend(s.split())
+
+    def flush(self):
+        self.proc.flushes += 1
+
+    def readline(self):
+        return "> " + self.proc.respond(self.proc.pending.pop(0)) + "\n"
+
+
+class FakeMcCortexProc(object):
+
+    def __init__(self, seqs, k=KMER_SIZE, depth=20):
+        self.k = k
+        self.depth = depth
+        self.covgs = {}
+        for seq in seqs:
+            for i in range(len(seq) - k + 1):
+                key = canonical(seq[i:i + k])
+                self.covgs[key] = self.covgs.get(key, 0) + depth
+        self.pending = []
+        self.flushes = 0
+        self.queried = []
+        self.stdin = FakeMcCortexPipe(self)
+        self.stdout = self.stdin
+
+    def respond(self, kmer):
+        self.queried.append(kmer)
+        key = canonical(kmer)
+        if key not in self.covgs:
+            return "{}"
+        right = "".join(
+            b for b in "ACGT" if canonical(key[1:] + b) in self.covgs)
+        left = "".join(
+            b for b in "ACGT" if canonical(b + key[:-1]) in self.covgs)
+        return json.dumps({"key": key, "colours": [self.covgs[key]],
+                           "left": left, "right": right, "edges": "00",
+                           "links": []})
+
+
+def fill_pool(pool, seqs):
+    """Fills a McCortexServerPool with fake servers instead of starting
+    mccortex"""
+    for _ in range(pool.size):
+        proc = FakeMcCortexProc(seqs)
+        pool.procs.append(proc)
+        pool._available.put(proc)
+    return pool
+
+
+def main():
+    # Stands in for `mccortex31 server` on a graph of SEQ
+    proc = FakeMcCortexProc([SEQ])
+    while True:
+        line = sys.stdin.readline()
+        if not line or line.strip() == "q":
+            break
+        print("> " + proc.respond(line.strip()))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import asyncio
+import threading
+from unittest import TestCase
+from mykatlas.cortex.aio import AsyncMcCortexQuery
+from mykatlas.cortex.aio import AsyncHTTPMcCortexQuery
+from mykatlas.cortex.server import WebServer
+from fake_mccortex import SEQ
+from fake_mccortex import fill_pool
+
+FAKE_MCCORTEX = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "fake_mccortex.py")
+KMERS = [SEQ[i:i + 7] for i in range(len(SEQ) - 6)]
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class AsyncMcCortexQueryTest(TestCase):
+
+    def test_interleaved_queries_on_one_pipe(self):
+        async def go():
+            mcq = AsyncMcCortexQuery([], mccortex_path=FAKE_MCCORTEX,
+                                     max_in_flight=3)
+            await mcq.start()
+            singles = await asyncio.gather(*[mcq.query(k) for k in KMERS])
+            many = await mcq.query_many(KMERS + ["AAAAAAA"])
+            await mcq.stop()
+            return singles, many
+        singles, many = run(go())
+        assert [q.kmer for q in singles] == [
+            many[k].kmer for k in KMERS]
+        assert all(q.depth == 20 for q in singles)
+        assert many["AAAAAAA"].data == {}
+
+
+class AsyncHTTPMcCortexQueryTest(TestCase):
+
+    def setUp(self):
+        self.wb = WebServer(port=0, args=[], threads=2)
+        fill_pool(self.wb.pool, [SEQ])
+        self.thread = threading.Thread(target=self.wb.serve)
+        self.thread.start()
+        while self.wb.httpd is None:
+            pass
+
+    def tearDown(self):
+        self.wb.httpd.shutdown()
+        self.wb.httpd.server_close()
+        self.thread.join()
+
+    def test_query_over_http(self):
+        async def go():
+            mcq = AsyncHTTPMcCortexQuery(
+                port=self.wb.httpd.server_address[1], max_connections=2)
+            singles = await asyncio.gather(*[mcq.query(k) for k in KMERS])
+            many = await mcq.query_many(KMERS)
+            await mcq.stop()
+            return singles, many
+        singles, many = run(go())
+        assert [q.data for q in singles] == [many[k].data for k in KMERS]
+        assert singles[0].kmer == "ATTACGG"
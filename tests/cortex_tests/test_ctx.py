@@ -0,0 +1,161 @@
+import json
+import os
+import shutil
+import struct
+import tempfile
+from unittest import TestCase
+
+from mykatlas.cortex.ctx import CtxGraph
+from mykatlas.cortex.ctx import read_ctx_header
+from mykatlas.cortex.server import GraphWalker
+from mykatlas.kmer import encode
+from fake_mccortex import FakeMcCortexProc
+from fake_mccortex import KMER_SIZE
+from fake_mccortex import SEQ
+from fake_mccortex import canonical
+
+ALT = SEQ[:15] + "A" + SEQ[16:]
+
+
+def _string(s):
+    return struct.pack("<I", len(s)) + s.encode("UTF-8")
+
+
+def write_ctx(path, proc, sample="sample"):
+    """Writes the graph of a FakeMcCortexProc as a one colour version 6
+    .ctx file, with records in reverse order"""
+    header = b"CORTEX" + struct.pack("<4I", 6, proc.k, 1, 1)
+    header += struct.pack("<I", 100) + struct.pack("<Q", 1000)
+    header += _string(sample) + b"\x00" * 16
+    header += b"\x00" * 4 + struct.pack("<2I", 0, 0) + _string("")
+    header += b"CORTEX"
+    with open(path, "wb") as outfile:
+        outfile.write(header)
+        for key in sorted(proc.covgs, reverse=True):
+            data = json.loads(proc.respond(key))
+            edges = 0
+            for b in data["right"]:
+                edges |= 1 << "ACGT".index(b)
+            for b in data["left"]:
+                edges |= 1 << ("TGCA".index(b) + 4)
+            outfile.write(struct.pack("<QIB", encode(key), data["colours"][0],
+                                      edges))
+
+
+# Header of a 25 colour, k=47 graph written by mccortex. From cortexpy's
+# test fixtures (Apache License 2.0).
+MCCORTEX_HEADER = os.path.join(os.path.dirname(__file__),
+                               "many_colours_header_only.ctx")
+
+# A version 7, two colour graph with one record, written out byte by byte
+# in mccortex's layout
+KNOWN_CTX = (
+    b"CORTEX"
+    b"\x07\x00\x00\x00"  # version
+    b"\x07\x00\x00\x00"  # kmer size
+    b"\x01\x00\x00\x00"  # words per kmer
+    b"\x02\x00\x00\x00"  # colours
+    b"\x01\x00\x00\x00\x00\x00\x00\x00"  # kmers
+    b"\x00\x00\x00\x00"  # shades
+    b"\x64\x00\x00\x00" b"\x4b\x00\x00\x00"  # mean read lengths
+    b"\xe8\x03\x00\x00\x00\x00\x00\x00"  # total sequence, per colour
+    b"\xd0\x07\x00\x00\x00\x00\x00\x00"
+    b"\x02\x00\x00\x00s1" b"\x02\x00\x00\x00s2"  # sample names
+    + b"\x00" * 32 +  # error rates, 16 byte long doubles
+    b"\x00" * 16 + b"\x00" * 16 +  # cleaning info, per colour
+    b"CORTEX"
+    # ACGTACG, 2 bits per base (A=0, C=1, G=2, T=3) with the first base
+    # in the most significant bits: 0b00011011000110 = 0x6c6
+    b"\xc6\x06\x00\x00\x00\x00\x00\x00"
+    b"\x05\x00\x00\x00" b"\x07\x00\x00\x00"  # coverage, per colour
+    # Edges, per colour. The low 4 bits are edges to the right (A, C, G,
+    # T) and the high 4 the complement of the base to the left: colour 1
+    # goes A to the right and G (complement C) to the left, colour 2 G to
+    # the right and A (complement T) to the left.
+    b"\x21\x84")
+
+
+class CtxGraphTest(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.proc = FakeMcCortexProc([SEQ, ALT])
+        self.ctx = os.path.join(self.tmp_dir, "sample.ctx")
+        write_ctx(self.ctx, self.proc)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_lookup_matches_server(self):
+        graph = CtxGraph(self.ctx)
+        assert graph.kmer_size == KMER_SIZE
+        assert len(graph) == len(self.proc.covgs)
+        for kmer in [SEQ[:KMER_SIZE], canonical(SEQ[5:5 + KMER_SIZE]),
+                     ALT[10:10 + KMER_SIZE], "AAAAAAA", "NCGTAAT"]:
+            expected = json.loads(self.proc.respond(kmer))
+            data = graph.lookup(kmer)
+            for key in ["key", "colours", "left", "right"]:
+                assert data.get(key) == expected.get(key)
+
+    def test_sorted_graph_is_written_once(self):
+        CtxGraph(self.ctx)
+        sorted_filepath = self.ctx + ".sorted.npy"
+        assert os.path.exists(sorted_filepath)
+        mtime = os.path.getmtime(sorted_filepath)
+        graph = CtxGraph(self.ctx)
+        assert os.path.getmtime(sorted_filepath) == mtime
+        assert SEQ[:KMER_SIZE] in graph
+
+    def test_walk_in_process(self):
+        expected = GraphWalker(self.proc, kmer_size=KMER_SIZE,
+                               print_depths=True).breath_first_search(
+            N=len(SEQ), seed=SEQ[:KMER_SIZE], end_kmers=[SEQ[-KMER_SIZE:]])
+        gw = GraphWalker(None, kmer_size=KMER_SIZE, print_depths=True,
+                         mcq=CtxGraph(self.ctx))
+        paths = gw.breath_first_search(
+            N=len(SEQ), seed=SEQ[:KMER_SIZE], end_kmers=[SEQ[-KMER_SIZE:]])
+        assert len(paths) == 2
+        assert paths == expected
+
+    def test_known_record(self):
+        ctx = os.path.join(self.tmp_dir, "known.ctx")
+        with open(ctx, "wb") as outfile:
+            outfile.write(KNOWN_CTX)
+        graph = CtxGraph(ctx)
+        assert graph.header["num_kmers"] == 1
+        assert graph.header["mean_read_lengths"] == [100, 75]
+        assert graph.header["total_seq"] == [1000, 2000]
+        assert graph.header["sample_names"] == ["s1", "s2"]
+        expected = {"key": "ACGTACG", "colours": [5, 7], "left": "AG",
+                    "right": "AG", "edges": "2184", "links": []}
+        assert graph.lookup("ACGTACG") == expected
+        # Looked up by its reverse complement too
+        assert graph.lookup("CGTACGT") == expected
+        assert graph.lookup("ACGTACC") == {}
+
+    def test_shaded_graphs_are_rejected(self):
+        ctx = os.path.join(self.tmp_dir, "shaded.ctx")
+        with open(ctx, "wb") as outfile:
+            # 8 shades, after the magic word, 4 ints and the kmer count
+            outfile.write(KNOWN_CTX[:30] + struct.pack("<I", 8) +
+                          KNOWN_CTX[34:])
+        with self.assertRaises(ValueError):
+            CtxGraph(ctx)
+
+    def test_mccortex_header(self):
+        with open(MCCORTEX_HEADER, "rb") as infile:
+            header = read_ctx_header(infile)
+            # The header is the whole file
+            assert infile.read() == b""
+        assert header["version"] == 6
+        assert header["kmer_size"] == 47
+        assert header["num_words"] == 2
+        assert header["num_colours"] == 25
+        assert len(header["sample_names"]) == 25
+        assert header["sample_names"][0] == "PG0051-C.ERR019061"
+        assert header["total_seq"][0] == 2937887623
+        assert header["mean_read_lengths"][:3] == [74, 75, 73]
+        assert header["offset"] == os.path.getsize(MCCORTEX_HEADER)
+        # Only graphs with k <= 32 are read in process
+        with self.assertRaises(ValueError):
+            CtxGraph(MCCORTEX_HEADER)
@@ -0,0 +1,62 @@
+import os
+import shutil
+import stat
+import sys
+import tempfile
+from unittest import TestCase
+
+from mykatlas.cortex import McCortexGenoRunner
+from mykatlas.typing import CoverageParser
+from mykatlas.typing import Panel
+
+# Stands in for mccortex31: `build` writes the skeleton and `geno` checks
+# it's there and writes coverage rows to stdout
+FAKE_MCCORTEX = """#!%s
+import sys
+if sys.argv[1] == "build":
+    open(sys.argv[-1], "w").close()
+else:
+    import os
+    assert sys.argv[sys.argv.index("-o") + 1] == "-"
+    assert os.path.exists(sys.argv[sys.argv.index("-I") + 1])
+    sys.stdout.write("ref-A1T?num_alts=1&ref=t1\\t31\\t25\\t20\\t1.0\\t10\\n")
+    sys.stdout.write("alt-A1T?num_alts=1&ref=t1\\t31\\t0\\t0\\t0.0\\t10\\n")
+""" % sys.executable
+
+
+class StreamingCoverageTest(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.mccortex = os.path.join(self.tmp_dir, "mccortex31")
+        with open(self.mccortex, "w") as outfile:
+            outfile.write(FAKE_MCCORTEX)
+        os.chmod(self.mccortex, stat.S_IRWXU)
+        self.panel = os.path.join(self.tmp_dir, "panel.fasta")
+        with open(self.panel, "w") as outfile:
+            outfile.write(">ref-A1T?num_alts=1&ref=t1\nAAAAAAA\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_stream_skips_tmp_files(self):
+        runner = McCortexGenoRunner(
+            "s1", [Panel(self.panel)], seq=["s1.fq"], stream=True,
+            tmp_dir=self.tmp_dir, mccortex31_path=self.mccortex)
+        cmd = runner.coverages_cmd
+        assert cmd[-1] == os.devnull
+        runner.keep_tmp = True
+        assert runner.coverages_cmd[-1] == runner.ctx_tmp_filepath
+
+    def test_coverage_parser_reads_stream(self):
+        cp = CoverageParser(
+            sample="s1", panel_file_paths=[self.panel], kmer=31, force=False,
+            seq=["s1.fq"], tmp_dir=self.tmp_dir,
+            skeleton_dir=os.path.join(self.tmp_dir, "skeletons"),
+            mccortex31_path=self.mccortex, stream=True)
+        cp.run()
+        covgs = cp.variant_covgs["ref-A1T?num_alts=1&ref=t1"][0]
+        assert covgs.reference_coverage.median_depth == 25
+        assert covgs.alternate_coverages[0].median_depth == 0
+        assert not os.path.exists(cp.mc_cortex_runner.covg_tmp_file_path)
+        cp.remove_temporary_files()
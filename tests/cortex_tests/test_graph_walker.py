@@ -0,0 +1,155 @@
+from mykatlas.cortex.server import McCortexQuery
+from mykatlas.cortex.server import GraphWalker
+from mykatlas.cortex.server import KmerCache
+from mykatlas.cortex.server import KMER_CACHE_ENTRY_OVERHEAD
+from mykatlas.cmds.walk import find_start_kmer
+from fake_mccortex import FakeMcCortexProc
+from fake_mccortex import KMER_SIZE
+from fake_mccortex import SEQ
+from fake_mccortex import canonical
+
+
+def test_query_many_is_a_single_round_trip():
+    proc = FakeMcCortexProc([SEQ])
+    mcq = McCortexQuery(proc)
+    results = mcq.query_many(["CCGTAAT", "AGGCATT", "AAAAAAA", "CCGTAAT"])
+    assert proc.flushes == 1
+    assert sorted(results.keys()) == ["AAAAAAA", "AGGCATT", "CCGTAAT"]
+    assert results["CCGTAAT"].depth == 20
+    assert results["AGGCATT"].complement
+    assert results["AAAAAAA"].data == {}
+
+
+def test_walk_linear_sequence():
+    seq = SEQ
+    proc = FakeMcCortexProc([seq])
+    gw = GraphWalker(proc, kmer_size=KMER_SIZE)
+    paths = list(gw.breath_first_search(
+        N=len(seq), seed=seq[:KMER_SIZE], end_kmers=[seq[-KMER_SIZE:]]))
+    assert len(paths) == 1
+    assert paths[0]["dna"] == seq + "*"
+
+
+def test_depth_filter_queries_neighbours_once():
+    seq = SEQ
+    # Low coverage error branching off after ATGCCTT
+    proc = FakeMcCortexProc([seq])
+    proc.covgs[canonical("TGCCTTA")] = 1
+    gw = GraphWalker(proc, kmer_size=KMER_SIZE)
+    paths = list(gw.breath_first_search(
+        N=len(seq), seed=seq[:KMER_SIZE], end_kmers=[seq[-KMER_SIZE:]]))
+    assert [p["dna"] for p in paths] == [seq + "*"]
+    assert proc.queried.count("TGCCTTT") == 1
+    assert proc.queried.count("TGCCTTA") == 1
+
+
+def test_find_start_kmer_skips_missing_kmers():
+    seq = SEQ
+    proc = FakeMcCortexProc([seq[3:]])
+    mcq = McCortexQuery(proc)
+    kmer, skipped = find_start_kmer(seq, mcq, KMER_SIZE)
+    assert kmer == seq[3:3 + KMER_SIZE]
+    assert skipped == 3
+    assert proc.flushes == 1
+    assert find_start_kmer("TTTTTTTTTT", mcq, KMER_SIZE) == (None, -1)
+
+
+def test_cache_is_keyed_on_canonical_kmer():
+    proc = FakeMcCortexProc([SEQ])
+    mcq = McCortexQuery(proc)
+    q = mcq.query("CCGTAAT")
+    rc_q = mcq.query("ATTACGG")
+    assert proc.queried == ["CCGTAAT"]
+    assert q.complement != rc_q.complement
+    assert mcq.cache.stats["hits"] == 1
+    assert mcq.cache.stats["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = KmerCache(max_bytes=3 * (KMER_CACHE_ENTRY_OVERHEAD + 10))
+    for kmer in ["AAAAAAA", "CCCCCCA", "GGGGGGA"]:
+        cache.put(kmer, {"key": kmer}, 10)
+    assert cache.get("AAAAAAA") is not None
+    cache.put("CAAAAAA", {"key": "CAAAAAA"}, 10)
+    assert len(cache) == 3
+    assert "AAAAAAA" in cache
+    assert "CCCCCCA" not in cache
+    assert cache.bytes <= cache.max_bytes
+
+
+def test_cache_is_shared_between_walkers():
+    cache = KmerCache()
+    proc1 = FakeMcCortexProc([SEQ])
+    proc2 = FakeMcCortexProc([SEQ])
+    for proc in [proc1, proc2]:
+        gw = GraphWalker(proc, kmer_size=KMER_SIZE, cache=cache)
+        paths = list(gw.breath_first_search(
+            N=len(SEQ), seed=SEQ[:KMER_SIZE], end_kmers=[SEQ[-KMER_SIZE:]]))
+        assert paths[0]["dna"] == SEQ + "*"
+    assert proc1.queried
+    assert proc2.queried == []
+
+
+def test_walk_extends_left_of_seed():
+    proc = FakeMcCortexProc([SEQ])
+    gw = GraphWalker(proc, kmer_size=KMER_SIZE, print_depths=True)
+    paths = list(gw.breath_first_search(
+        N=len(SEQ), seed=SEQ[3:3 + KMER_SIZE],
+        end_kmers=[SEQ[-KMER_SIZE:]], N_left=3))
+    assert len(paths) == 1
+    assert paths[0]["dna"] == SEQ + "*"
+    assert paths[0]["median_depth"] == 20
+    assert "kmers" not in paths[0]
+
+
+def test_walk_left_stops_at_a_cycle():
+    # A circular graph: walking left from the seed comes back round to it
+    loop = SEQ[:12]
+    proc = FakeMcCortexProc([loop + loop[:KMER_SIZE - 1]])
+    gw = GraphWalker(proc, kmer_size=KMER_SIZE)
+    N = len(loop) + KMER_SIZE + 1
+    paths = list(gw.breath_first_search(
+        N=N, seed=loop[:KMER_SIZE], end_kmers=[loop[2:2 + KMER_SIZE]],
+        N_left=len(loop)))
+    assert [p["dna"] for p in paths] == [(loop + loop)[1:1 + N] + "*"]
+
+
+def _snp(seq, i, base):
+    return seq[:i] + base + seq[i + 1:]
+
+
+def test_walk_follows_both_sides_of_a_bubble():
+    alt = _snp(SEQ, 15, "A")
+    proc = FakeMcCortexProc([SEQ, alt])
+    gw = GraphWalker(proc, kmer_size=KMER_SIZE)
+    paths = gw.breath_first_search(
+        N=len(SEQ), seed=SEQ[:KMER_SIZE], end_kmers=[SEQ[-KMER_SIZE:]])
+    assert sorted(p["dna"] for p in paths) == sorted([SEQ + "*", alt + "*"])
+    assert len(set(p["start_kmer"] for p in paths)) == 2
+
+
+def test_walk_stops_when_every_path_has_ended():
+    proc = FakeMcCortexProc([SEQ])
+    gw = GraphWalker(proc, kmer_size=KMER_SIZE)
+    paths = gw.breath_first_search(
+        N=10 * len(SEQ), seed=SEQ[:KMER_SIZE], end_kmers=[SEQ[-KMER_SIZE:]])
+    assert paths == []
+    assert len(proc.queried) < len(SEQ)
+
+
+def test_walk_caps_number_of_branches():
+    alt1 = _snp(SEQ, 12, "A")
+    alt2 = _snp(SEQ, 20, "G")
+    proc = FakeMcCortexProc([SEQ, alt1, alt2, _snp(alt1, 20, "G")])
+    gw = GraphWalker(proc, kmer_size=KMER_SIZE)
+    paths = gw.breath_first_search(
+        N=len(SEQ), seed=SEQ[:KMER_SIZE], end_kmers=[SEQ[-KMER_SIZE:]])
+    assert len(paths) == 4
+    gw = GraphWalker(proc, kmer_size=KMER_SIZE, max_branches=3)
+    try:
+        gw.breath_first_search(
+            N=len(SEQ), seed=SEQ[:KMER_SIZE], end_kmers=[SEQ[-KMER_SIZE:]])
+    except ValueError:
+        pass
+    else:
+        assert False, "expected ValueError"
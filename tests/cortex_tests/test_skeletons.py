@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from mykatlas.cortex.skeletons import SkeletonCache
+from mykatlas.cortex.skeletons import skeleton_key
+
+
+class SkeletonCacheTest(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.skeleton_dir = os.path.join(self.tmp_dir, "skeletons")
+        self.panel = os.path.join(self.tmp_dir, "panel.fasta")
+        self._write_panel(">ref-A1T?\nAAAAAAAAAAAA\n")
+        self.builds = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_panel(self, s):
+        with open(self.panel, "w") as outfile:
+            outfile.write(s)
+
+    def _build(self, filepath, size=10):
+        self.builds.append(filepath)
+        time.sleep(0.05)
+        with open(filepath, "w") as outfile:
+            outfile.write("x" * size)
+
+    def test_key_depends_on_panel_contents_and_kmer(self):
+        key = skeleton_key([self.panel], 31)
+        assert key == skeleton_key([self.panel], 31)
+        assert key != skeleton_key([self.panel], 21)
+        self._write_panel(">ref-A1T?\nAAAAAAAAAAAC\n")
+        assert key != skeleton_key([self.panel], 31)
+
+    def _get(self, cache, key):
+        with cache.get(key, self._build) as filepath:
+            return filepath
+
+    def test_concurrent_jobs_build_once(self):
+        cache = SkeletonCache(self.skeleton_dir)
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(self._get(cache, "abc")))
+            for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(self.builds) == 1
+        assert results == [cache.filepath("abc")] * 4
+        assert not [f for f in os.listdir(self.skeleton_dir)
+                    if f.startswith(".")]
+
+    def test_least_recently_used_skeletons_are_evicted(self):
+        cache = SkeletonCache(self.skeleton_dir, max_bytes=25)
+        self._get(cache, "a")
+        self._get(cache, "b")
+        os.utime(cache.filepath("a"), (0, 0))
+        self._get(cache, "c")
+        assert not os.path.exists(cache.filepath("a"))
+        assert os.path.exists(cache.filepath("b"))
+        assert os.path.exists(cache.filepath("c"))
+
+    def test_skeletons_in_use_are_not_evicted(self):
+        cache = SkeletonCache(self.skeleton_dir, max_bytes=25)
+        with cache.get("a", self._build) as filepath:
+            self._get(cache, "b")
+            os.utime(filepath, (0, 0))
+            # Another job adds a skeleton while "a" is still being used
+            other_job = threading.Thread(
+                target=lambda: self._get(cache, "c"))
+            other_job.start()
+            other_job.join()
+            assert os.path.exists(filepath)
+            assert not os.path.exists(cache.filepath("b"))
+        self._get(cache, "d")
+        assert not os.path.exists(filepath)
+
+    def test_evicted_skeletons_are_rebuilt(self):
+        cache = SkeletonCache(self.skeleton_dir)
+        filepath = self._get(cache, "a")
+        os.remove(filepath)
+        assert self._get(cache, "a") == filepath
+        assert os.path.exists(filepath)
+        assert len(self.builds) == 2
@@ -0,0 +1,58 @@
+from mykatlas.cortex.server import GraphWalker
+from mykatlas.cortex.unitigs import UnitigIndex
+from mykatlas.cortex.unitigs import parse_unitigs
+from mykatlas.kmer import reverse_complement
+from fake_mccortex import FakeMcCortexProc
+from fake_mccortex import KMER_SIZE
+from fake_mccortex import SEQ
+
+ALT = SEQ[:15] + "A" + SEQ[16:]
+# Unitigs of the graph of SEQ and ALT, which differ at base 15
+BUBBLE_UNITIGS = [SEQ[:15], SEQ[9:22], ALT[9:22], SEQ[16:]]
+
+
+def _walk(seqs, unitigs, seed_offset=0, print_depths=False, stride=16):
+    proc = FakeMcCortexProc(seqs)
+    if unitigs is not None:
+        unitigs = UnitigIndex(unitigs, kmer_size=KMER_SIZE, stride=stride)
+    gw = GraphWalker(proc, kmer_size=KMER_SIZE, print_depths=print_depths,
+                     unitigs=unitigs)
+    paths = gw.breath_first_search(
+        N=len(SEQ), seed=SEQ[seed_offset:seed_offset + KMER_SIZE],
+        end_kmers=[SEQ[-KMER_SIZE:]], N_left=seed_offset)
+    return paths, proc
+
+
+def test_parse_unitigs():
+    fasta = ">unitig.0 len=9\nACGTA\nCGTA\n>unitig.1 len=7\nTTTTTTT\n"
+    assert list(parse_unitigs(fasta)) == ["ACGTACGTA", "TTTTTTT"]
+
+
+def test_tail_reads_in_direction_of_kmer():
+    index = UnitigIndex([SEQ], kmer_size=KMER_SIZE, stride=4)
+    assert index.tail(SEQ[:KMER_SIZE]) == SEQ[KMER_SIZE:]
+    assert index.tail(SEQ[4:4 + KMER_SIZE]) == SEQ[4 + KMER_SIZE:]
+    rc = reverse_complement(SEQ)
+    assert index.tail(rc[:KMER_SIZE]) == rc[KMER_SIZE:]
+    # Not indexed
+    assert index.tail(SEQ[1:1 + KMER_SIZE]) == ""
+    assert index.tail(SEQ[-KMER_SIZE:]) == ""
+
+
+def test_linear_walk_jumps_the_unitig():
+    paths, proc = _walk([SEQ], [SEQ])
+    assert [p["dna"] for p in paths] == [SEQ + "*"]
+    assert proc.queried == []
+
+
+def test_unitig_walk_matches_base_by_base_walk():
+    for seed_offset in [0, 3]:
+        expected, proc = _walk([SEQ, ALT], None, seed_offset, True)
+        paths, unitig_proc = _walk(
+            [SEQ, ALT], BUBBLE_UNITIGS, seed_offset, True, stride=4)
+        assert sorted(p["dna"] for p in paths) == sorted(
+            p["dna"] for p in expected)
+        assert len(paths) == 2
+        assert sorted(p["depth"] for p in paths) == sorted(
+            p["depth"] for p in expected)
+        assert unitig_proc.flushes < proc.flushes
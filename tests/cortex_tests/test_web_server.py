@@ -0,0 +1,62 @@
+import json
+import threading
+from unittest import TestCase
+from http.client import HTTPConnection
+from multiprocessing.pool import ThreadPool
+from mykatlas.cortex.server import WebServer
+from fake_mccortex import SEQ
+from fake_mccortex import fill_pool
+
+
+class WebServerTest(TestCase):
+
+    def setUp(self):
+        self.wb = WebServer(port=0, args=[], threads=2)
+        fill_pool(self.wb.pool, [SEQ])
+        self.wb.mccortex = self.wb.pool.procs[0]
+        self.thread = threading.Thread(target=self.wb.serve)
+        self.thread.start()
+        while self.wb.httpd is None:
+            pass
+        self.port = self.wb.httpd.server_address[1]
+
+    def tearDown(self):
+        self.wb.httpd.shutdown()
+        self.wb.httpd.server_close()
+        self.thread.join()
+
+    def _get(self, conn, kmer):
+        conn.request("GET", "/" + kmer)
+        return json.loads(conn.getresponse().read().decode("UTF-8"))
+
+    def test_keep_alive_get(self):
+        conn = HTTPConnection("localhost", self.port)
+        assert self._get(conn, "CCGTAAT")["colours"] == [20]
+        assert self._get(conn, "AAAAAAA") == {}
+        assert "error" in self._get(conn, "A")
+        conn.close()
+
+    def test_batch_query(self):
+        conn = HTTPConnection("localhost", self.port)
+        conn.request("POST", "/query", json.dumps(["CCGTAAT", "AAAAAAA"]))
+        out = json.loads(conn.getresponse().read().decode("UTF-8"))
+        assert out["CCGTAAT"]["key"] == "ATTACGG"
+        assert out["AAAAAAA"] == {}
+        conn.request("POST", "/query", "not json")
+        assert "error" in json.loads(
+            conn.getresponse().read().decode("UTF-8"))
+        conn.close()
+
+    def test_concurrent_clients(self):
+        kmers = [SEQ[i:i + 7] for i in range(len(SEQ) - 6)]
+
+        def client(kmer):
+            conn = HTTPConnection("localhost", self.port)
+            try:
+                return self._get(conn, kmer)["colours"]
+            finally:
+                conn.close()
+        pool = ThreadPool(8)
+        assert pool.map(client, kmers * 4) == [[20]] * len(kmers) * 4
+        pool.close()
+        assert all(proc.pending == [] for proc in self.wb.pool.procs)
@@ -0,0 +1,36 @@
+from Bio.Seq import Seq
+from mykatlas.kmer import reverse_complement
+from mykatlas.kmer import canonical
+from mykatlas.kmer import encode
+from mykatlas.kmer import decode
+from mykatlas.kmer import encode_canonical
+from nose.tools import assert_raises
+
+KMER = "CCGTAATGCCTTTCCCTAACAGAGTTTTTCA"
+
+
+def test_reverse_complement():
+    assert reverse_complement("AACGTN") == "NACGTT"
+    assert reverse_complement(KMER) == str(Seq(KMER).reverse_complement())
+
+
+def test_canonical():
+    assert canonical("TTTT") == "AAAA"
+    assert canonical("AAAA") == "AAAA"
+    assert canonical(KMER) == canonical(reverse_complement(KMER))
+
+
+def test_encode_decode():
+    assert encode("A") == 0
+    assert encode("T") == 3
+    assert encode("CA") == 4
+    assert decode(encode(KMER), len(KMER)) == KMER
+    assert decode(0, 3) == "AAA"
+    with assert_raises(ValueError):
+        encode("ACNT")
+
+
+def test_packed_order_matches_string_order():
+    kmers = ["ACGT", "TTTT", "AAAA", "CAGT", "GATC"]
+    assert sorted(kmers, key=encode) == sorted(kmers)
+    assert encode_canonical(KMER) == encode(canonical(KMER))
@@ -0,0 +1,97 @@
+import json
+
+import numpy as np
+
+from mykatlas.metagenomics import AMRSpeciesPredictor
+from mykatlas.metagenomics import estimate_abundances
+from mykatlas.metagenomics.abundance import abundance_expected_depths
+from mykatlas.typing import ProbeCoverage
+from mykatlas.typing import PresenceTyper
+from mykatlas.typing import SequenceProbeCoverage
+from mykatlas.typing import VariantProbeCoverage
+from mykatlas.typing import VariantTyper
+
+
+def _mixture():
+    rng = np.random.RandomState(0)
+    covgs = {
+        "Mtuberculosis": {"total_bases": 1000,
+                          "median": rng.poisson(40, 100),
+                          "length": rng.randint(100, 1000, 100)},
+        # A fifth of the probes are only covered by noise
+        "Mabscessus": {"total_bases": 1000,
+                       "median": np.concatenate([rng.poisson(10, 64),
+                                                 rng.poisson(1, 16)]),
+                       "length": rng.randint(100, 1000, 80)},
+        "Mavium": {"total_bases": 1000,
+                   "median": np.array([], dtype=int),
+                   "length": np.array([], dtype=int)}}
+    for covg in covgs.values():
+        covg["percent_coverage"] = np.full(len(covg["median"]), 100.0)
+    return covgs
+
+
+def test_estimate_abundances_of_mixture():
+    abundances = estimate_abundances(_mixture())
+    mtb = abundances["Mtuberculosis"]
+    mabs = abundances["Mabscessus"]
+    assert abs(mtb["depth"] - 40) < 2
+    assert abs(mabs["depth"] - 10) < 1
+    assert abs(mabs["fraction_present"] - 0.8) < 0.05
+    assert abundances["Mavium"]["relative_abundance"] == 0
+    assert abs(sum(a["relative_abundance"]
+                   for a in abundances.values()) - 1) < 1e-9
+    assert abundance_expected_depths(abundances) == [mtb["depth"],
+                                                     mabs["depth"]]
+    assert abundance_expected_depths(
+        abundances, min_relative_abundance=0.5) == [mtb["depth"]]
+    assert estimate_abundances({}) == {}
+
+
+def test_species_predictor_reports_abundance():
+    out = {}
+    predictor = AMRSpeciesPredictor({}, {}, _mixture(), {}, out,
+                                    estimate_abundance=True)
+    predictor.run()
+    assert set(out["phylogenetics"]["abundance"]) == set(_mixture())
+    assert len(predictor.expected_depths()) == 2
+    json.dumps(out)
+
+
+def test_typers_accept_several_expected_depths():
+    pc = ProbeCoverage(percent_coverage=100, median_depth=10,
+                       min_depth=8, k_count=300)
+    call = PresenceTyper(expected_depths=[40, 10]).type(
+        SequenceProbeCoverage(name="gene", probe_coverage=pc))
+    assert call.genotype == [1, 1]
+    assert call.info["copy_number"] == 1
+    vpc = VariantProbeCoverage(
+        reference_coverages=[ProbeCoverage(percent_coverage=100,
+                                           median_depth=40, min_depth=30,
+                                           k_count=1200)],
+        alternate_coverages=[ProbeCoverage(percent_coverage=100,
+                                           median_depth=10, min_depth=8,
+                                           k_count=300)],
+        var_name="A1T")
+    vt = VariantTyper(expected_depths=[40, 10])
+    call = vt.type([vpc], variant="A1T")
+    assert call["genotype_likelihoods"][1] == vt.type_many(
+        [("A1T", [vpc])])[0]["genotype_likelihoods"][1]
+    assert call == vt.type_many([("A1T", [vpc])])[0]
+
+
+def test_sparsely_covered_taxon_is_not_abundant():
+    rng = np.random.RandomState(1)
+    # Coverage as CoverageParser gives it: only covered probes are kept
+    covgs = {"full": {"total_bases": 100000,
+                      "median": rng.poisson(30, 100),
+                      "length": np.full(100, 1000)},
+             "sparse": {"total_bases": 100000,
+                        "median": np.array([30, 31]),
+                        "length": np.array([1000, 1000])}}
+    abundances = estimate_abundances(covgs)
+    assert abs(abundances["sparse"]["fraction_present"] - 0.02) < 0.01
+    assert abundances["sparse"]["relative_abundance"] < 0.05
+    assert abundances["full"]["fraction_present"] > 0.99
+    assert abundance_expected_depths(abundances) == [
+        abundances["full"]["depth"]]
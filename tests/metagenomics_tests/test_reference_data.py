@@ -0,0 +1,55 @@
+import os
+import json
+import shutil
+import tempfile
+
+from mykatlas.reference_data import ReferenceData
+from mykatlas.reference_data import REFERENCE_DATA
+from mykatlas.metagenomics import SpeciesPredictor
+from mykatlas.metagenomics.phylo import TaxonomyIndex
+
+
+def _write_json(filepath, data):
+    if not os.path.exists(os.path.dirname(filepath)):
+        os.makedirs(os.path.dirname(filepath))
+    with open(filepath, "w") as outfile:
+        json.dump(data, outfile)
+
+
+def test_loads_once_until_file_changes():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        _write_json(os.path.join(tmp_dir, "predict",
+                                 "taxon_coverage_threshold.json"), {"a": 1})
+        _write_json(os.path.join(tmp_dir, "predict", "tb",
+                                 "variant_to_resistance_drug.json"),
+                    {"katG_S315X": ["Isoniazid"]})
+        _write_json(os.path.join(tmp_dir, "phylo", "tb_hierarchy.json"),
+                    {"MTBC": {"children": {}}})
+        data = ReferenceData(tmp_dir)
+        thresholds = data.taxon_coverage_thresholds()
+        assert thresholds == {"a": 1}
+        assert data.taxon_coverage_thresholds() is thresholds
+        os.utime(data.taxon_coverage_thresholds_filepath, (0, 0))
+        assert data.taxon_coverage_thresholds() is not thresholds
+
+        data = ReferenceData(tmp_dir).preload()
+        assert len(data) == 3
+        assert data.variant_to_resistance_drug("tb") == {
+            "katG_S315X": ["Isoniazid"]}
+        index = data.hierarchy(
+            os.path.join(tmp_dir, "phylo", "tb_hierarchy.json"))
+        assert isinstance(index, TaxonomyIndex)
+        assert "MTBC" in index
+        assert len(data) == 3
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def test_species_predictor_shares_thresholds():
+    predictors = [SpeciesPredictor({}, {}, {}, {}, {}) for _ in range(2)]
+    for predictor in predictors:
+        predictor._load_taxon_thresholds()
+    assert predictors[0].threshold is predictors[1].threshold
+    assert predictors[0].threshold is \
+        REFERENCE_DATA.taxon_coverage_thresholds()
@@ -0,0 +1,78 @@
+import json
+import random
+
+import numpy as np
+
+from mykatlas.metagenomics import SpeciesPredictor
+from mykatlas.metagenomics.phylo import DEFAULT_THRESHOLD
+from mykatlas.stats import percent_coverage_from_expected_coverage
+from mykatlas.utils import median
+
+
+def _list_aggregate(predictor, covgs, threshold=5):
+    # The list based implementation _aggregate replaced
+    out = {}
+    for phylo_group, covg_dict in covgs.items():
+        percent_coverage = np.asarray(covg_dict["percent_coverage"]).tolist()
+        length = np.asarray(covg_dict["length"]).tolist()
+        _median = np.asarray(covg_dict["median"]).tolist()
+        total_bases = covg_dict["total_bases"]
+        bases_covered = sum([percent_coverage[i] * length[i]
+                             for i in range(len(length))])
+        total_percent_covered = round(bases_covered / total_bases, 3)
+        minimum = percent_coverage_from_expected_coverage(
+            predictor.expected_depth) * predictor.threshold.get(
+                phylo_group, DEFAULT_THRESHOLD)
+        if total_percent_covered < minimum or median(
+                _median) < 0.1 * predictor.expected_depth:
+            _index = [i for i, d in enumerate(_median)
+                      if d > 0.1 * predictor.expected_depth]
+            percent_coverage = [percent_coverage[i] for i in _index]
+            length = [length[i] for i in _index]
+            bases_covered = sum([percent_coverage[i] * length[i]
+                                 for i in range(len(length))])
+            _median = [_median[i] for i in _index]
+            total_percent_covered = round(bases_covered / total_bases, 3)
+        if total_percent_covered > threshold:
+            out[phylo_group] = {"percent_coverage": total_percent_covered,
+                                "median_depth": median(_median)}
+    return out
+
+
+def _covgs(rng, n):
+    covgs = {}
+    for i in range(n):
+        k = rng.randint(0, 30)
+        lengths = [rng.randint(50, 2000) for _ in range(k)]
+        covgs["taxon%i" % i] = {
+            "total_bases": sum(lengths) + rng.randint(1, 5000),
+            "percent_coverage": np.array(
+                [rng.choice([76.0, 80.5, 99.9, 100.0]) for _ in range(k)]),
+            "length": np.array(lengths),
+            "median": np.array([rng.randint(1, 60) for _ in range(k)],
+                               dtype=int)}
+    return covgs
+
+
+def test_aggregate_matches_list_implementation():
+    rng = random.Random(4)
+    for _ in range(20):
+        covgs = _covgs(rng, 50)
+        predictor = SpeciesPredictor(covgs, {}, {}, {}, {})
+        predictor._load_taxon_thresholds()
+        predictor.expected_depth = predictor.calc_expected_depth()
+        assert predictor.expected_depth == median(
+            [m for c in covgs.values() for m in c["median"].tolist()])
+        expected = _list_aggregate(predictor, covgs)
+        predictor._aggregate(covgs)
+        assert json.dumps(covgs, sort_keys=True) == json.dumps(
+            expected, sort_keys=True)
+
+
+def test_run_output_is_serialisable():
+    rng = random.Random(5)
+    out = {}
+    predictor = SpeciesPredictor(_covgs(rng, 3), _covgs(rng, 3),
+                                 _covgs(rng, 5), _covgs(rng, 5), out)
+    predictor.run()
+    json.dumps(out)
@@ -0,0 +1,54 @@
+import os
+import json
+import shutil
+import tempfile
+
+from mykatlas.metagenomics.phylo import Hierarchy
+from mykatlas.metagenomics.phylo import TaxonomyIndex
+
+TREE = {
+    "complex1": {"children": {
+        "sub1": {"children": {
+            "species1": {"children": {
+                "lineage1": {"children": {
+                    "sublineage1": {"children": {}}}}}},
+            "species2": {"children": {}}}},
+        "Unknown": {"children": {"species3": {"children": {}}}}}},
+    "complex2": {"children": {
+        "species2": {"children": {"lineage2": {"children": {}}}}}}}
+
+
+def test_index_lookups():
+    index = TaxonomyIndex(TREE)
+    assert len(index) == 10
+    assert index.get("species1") is TREE["complex1"]["children"][
+        "sub1"]["children"]["species1"]
+    assert index.parent("species1") == "sub1"
+    assert index.parent("complex1") is None
+    assert index.depth("complex1") == 0
+    assert index.depth("sublineage1") == 4
+    assert list(index.children("species1")) == ["lineage1"]
+    assert index.children("missing") == {}
+    # The first species2 in a pre-order walk
+    assert index.parent("species2") == "sub1"
+    assert index.grandchildren("complex1") == [
+        "species1", "species2", "species3"]
+    assert index.grandchildren("complex1", exclude=["Unknown"]) == [
+        "species1", "species2"]
+
+
+def test_hierarchy_from_file_is_cached():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filepath = os.path.join(tmp_dir, "hierarchy.json")
+        with open(filepath, "w") as outfile:
+            json.dump(TREE, outfile)
+        h = Hierarchy.from_file(filepath)
+        assert h.get_phylo_group("lineage2") == {"children": {}}
+        assert list(h.get_children("complex2")) == ["species2"]
+        assert Hierarchy.from_file(filepath).index is h.index
+        # A changed file is indexed again
+        os.utime(filepath, (0, 0))
+        assert Hierarchy.from_file(filepath).index is not h.index
+    finally:
+        shutil.rmtree(tmp_dir)
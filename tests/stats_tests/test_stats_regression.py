@@ -0,0 +1,103 @@
+"""Pins the likelihoods given by the original summed log-factorial so
+changes to how they're computed don't change genotype calls"""
+import numpy as np
+
+from mykatlas.stats import log_factorial
+from mykatlas.stats import log_factorial_array
+from mykatlas.stats import log_lik_depth
+from mykatlas.stats import log_lik_R_S_coverage
+from mykatlas.stats import log_lik_R_S_kmer_count
+from mykatlas.stats import log_lik_probability_of_N_gaps
+from mykatlas.stats import log_poisson_prob_array
+from mykatlas.stats import log_lik_R_S_coverage_array
+from mykatlas.stats import log_lik_R_S_kmer_count_array
+from mykatlas.stats import LogPoissonCache
+from mykatlas.stats.stats import log_poisson_prob
+
+LOG_FACTORIALS = [(0, 0.0),
+                  (1, 0.0),
+                  (2, 0.6931471805599453),
+                  (10, 15.104412573075518),
+                  (100, 363.7393755555636),
+                  (1000, 5912.128178488171),
+                  (5000, 37591.14350887684)]
+
+LOG_POISSON_PROBS = [(0.5, 0, -0.5),
+                     (3.5, 2, -1.6876212435692093),
+                     (100, 80, -5.259509406646373),
+                     (3200.01, 3000, -11.307211696766899),
+                     (1.0e-3, 5, -39.32726813769273),
+                     (16.01, 1, -13.236786472991378)]
+
+
+def close(a, b):
+    # Differences in rounding between summing logs and lgamma are ~1e-11
+    # once large terms cancel
+    return np.allclose(a, b, rtol=1e-12, atol=1e-9)
+
+
+def test_log_factorial():
+    for n, expected in LOG_FACTORIALS:
+        assert close(log_factorial(n), expected)
+    assert close(log_factorial(10.7), log_factorial(10))
+
+
+def test_log_factorial_array():
+    n = np.array([n for n, _ in LOG_FACTORIALS])
+    expected = np.array([e for _, e in LOG_FACTORIALS])
+    assert close(log_factorial_array(n), expected)
+    assert close(log_factorial_array(n.reshape(1, -1)), expected)
+    # Scalar and array versions agree exactly
+    for n, _ in LOG_FACTORIALS:
+        assert log_factorial_array([n])[0] == log_factorial(n)
+
+
+def test_log_poisson_prob():
+    for lam, k, expected in LOG_POISSON_PROBS:
+        assert close(log_poisson_prob(lam, k), expected)
+    lam = np.array([lam for lam, _, _ in LOG_POISSON_PROBS])
+    k = np.array([k for _, k, _ in LOG_POISSON_PROBS])
+    expected = np.array([e for _, _, e in LOG_POISSON_PROBS])
+    assert close(log_poisson_prob_array(lam, k), expected)
+
+
+def test_log_likelihoods():
+    assert close(log_lik_depth(10, 10), -2.078561643135057)
+    assert close(log_lik_depth(1, 10), -7.697414907005954)
+    assert close(log_lik_R_S_coverage(2, 50, 100 * 0.05 / 3, 100),
+                 -19.5574202520631)
+    assert close(log_lik_R_S_kmer_count(1500, 3, 50, 50 * 0.05 / 3),
+                 -26.385505914002188)
+    assert close(log_lik_R_S_kmer_count(700, 800, 25.4, 25.4),
+                 -16.77549312955898)
+    assert close(log_lik_probability_of_N_gaps(5, 90), -6.6101660647996106)
+
+
+def test_array_likelihoods_match_scalar():
+    assert close(
+        log_lik_R_S_coverage_array(np.array([2, 0]), np.array([50, 3]),
+                                   np.array([100 * 0.05 / 3, 1.0]),
+                                   np.array([100, 2.0])),
+        [-19.5574202520631, log_lik_R_S_coverage(0, 3, 1.0, 2.0)])
+    assert close(
+        log_lik_R_S_kmer_count_array(np.array([1500, 700]),
+                                     np.array([3, 800]),
+                                     np.array([50, 25.4]),
+                                     np.array([50 * 0.05 / 3, 25.4])),
+        [-26.385505914002188, -16.77549312955898])
+
+
+def test_log_poisson_cache():
+    cache = LogPoissonCache(max_entries=2)
+    for lam, k, expected in LOG_POISSON_PROBS[:2]:
+        assert cache.log_poisson_prob(lam, k) == log_poisson_prob(lam, k)
+    assert cache.log_poisson_prob(0.5, 0) == -0.5
+    assert cache.stats == {"hits": 1, "misses": 2, "entries": 2}
+    cache.log_poisson_prob(100, 80)
+    assert len(cache) == 2
+    # The oldest entry was dropped
+    cache.log_poisson_prob(0.5, 0)
+    assert cache.misses == 4
+    assert close(log_lik_R_S_kmer_count(1500, 3, 50, 50 * 0.05 / 3,
+                                        cache=cache),
+                 -26.385505914002188)
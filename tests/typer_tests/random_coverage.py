@@ -0,0 +1,12 @@
+from mykatlas.typing import ProbeCoverage
+
+
+def random_probe_coverage(rng):
+    """Probe coverage drawn from rng, covering missing, partial and full
+    probes at a range of depths"""
+    depth = rng.choice([0, 0, 1, 5, 20, 50, 100])
+    return ProbeCoverage(
+        percent_coverage=rng.choice([0, 30, 80, 100, 100]),
+        median_depth=depth,
+        min_depth=depth // 2,
+        k_count=depth * rng.randint(0, 40))
@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+
+from mykatlas.typing import CoverageParser
+from mykatlas.typing import Genotyper
+from mykatlas.typing import Panel
+from mykatlas.typing.typer import genotyper
+
+COVGS = [
+    "ref-A1T?num_alts=2&ref=t1\t31\t25\t20\t1.0\t10\n",
+    "ref-A1T?num_alts=2&ref=t1\t31\t24\t20\t0.9\t10\n",
+    "alt-A1T?num_alts=2&ref=t1\t31\t2\t0\t0.5\t10\n",
+    "alt-A1T?num_alts=2&ref=t1\t31\t0\t0\t0.0\t10\n",
+    "\n",
+    "tem-1?name=tem&version=1&length=861\t861\t30\t21\t0.99\t800\n",
+    "tem-2?name=tem&version=2&length=861\t861\t0\t0\t0.1\t800\n",
+    "p1?panel_type=species&name=MTBC&length=100\t100\t40\t10\t1.0\t70\n",
+    "p2?panel_type=species&name=Mabs&length=50\t50\t0\t0\t0.0\t20\n",
+    "p3?panel_type=species&name=MTBC&length=200\t200\t30\t10\t0.8\t170\n",
+    "p4?panel_type=species&name=MTBC&length=60\t60\t3\t0\t0.5\t30\n",
+]
+
+
+def _parse(lines, panel="panel.fasta"):
+    cp = CoverageParser(sample="s1", panel_file_paths=[panel],
+                        kmer=31, force=False)
+    cp._parse_covgs_lines(lines)
+    return cp
+
+
+def test_parse_variant_probes():
+    cp = _parse(COVGS)
+    vpc = cp.variant_covgs["ref-A1T?num_alts=2&ref=t1"][0]
+    assert vpc.var_name == "A1T"
+    assert [c.median_depth for c in vpc.reference_coverages] == [25, 24]
+    assert [c.percent_coverage for c in vpc.reference_coverages] == [
+        100.0, 90.0]
+    assert [c.median_depth for c in vpc.alternate_coverages] == [2, 0]
+    assert type(vpc.alternate_coverages[0].k_count) is int
+
+
+def test_parse_presence_probes():
+    cp = _parse(COVGS)
+    tem = cp.gene_presence_covgs["tem"]
+    assert sorted(tem.keys()) == ["1", "2"]
+    assert tem["1"].percent_coverage == 99.0
+    assert tem["1"].length == "861"
+
+
+def _lists(covgs):
+    return {name: {k: v.tolist() if hasattr(v, "tolist") else v
+                   for k, v in covg.items()}
+            for name, covg in covgs.items()}
+
+
+def test_parse_species_probes():
+    cp = _parse(COVGS)
+    species = _lists(cp.covgs["species"])
+    assert list(species.keys()) == ["MTBC", "Mabs"]
+    assert species["MTBC"] == {
+        "total_bases": 360,
+        "percent_coverage": [100.0, 80.0],
+        "length": [100, 200],
+        "median": [40, 30]}
+    assert species["Mabs"] == {
+        "total_bases": 50, "percent_coverage": [], "length": [],
+        "median": []}
+
+
+def test_unparsable_rows_are_zeroed():
+    cp = _parse(COVGS[:4] + ["ref-B2C?num_alts=1\t31\tx\t0\t0.1\t1\n",
+                             "alt-B2C?num_alts=1\t31\t7\t0\t0.1\t1\n"])
+    vpc = cp.variant_covgs["ref-B2C?num_alts=1"][0]
+    assert vpc.reference_coverages[0].median_depth == 0
+    assert vpc.alternate_coverages[0].median_depth == 7
+
+
+def _summary(cp):
+    variants = {k: [(c.var_name, [r.median_depth for r in c.reference_coverages],
+                     [a.median_depth for a in c.alternate_coverages])
+                    for c in v] for k, v in cp.variant_covgs.items()}
+    genes = {k: {v: (c.percent_coverage, c.median_depth, c.length)
+                 for v, c in g.items()}
+             for k, g in cp.gene_presence_covgs.items()}
+    return variants, genes, _lists(cp.covgs["species"])
+
+
+def test_chunked_parse_matches(monkeypatch):
+    expected = _summary(_parse(COVGS))
+    monkeypatch.setattr(genotyper, "COVGS_TABLE_CHUNK_ROWS", 3)
+    # A chunk of unparsable rows falls back without affecting the others
+    cp = _parse(iter(COVGS + ["ref-B2C?num_alts=1\t31\tx\t0\t0.1\t1\n",
+                              "alt-B2C?num_alts=1\t31\t7\t0\t0.1\t1\n"]))
+    variants, genes, species = _summary(cp)
+    assert variants.pop("ref-B2C?num_alts=1") == [("B2C", [0], [7])]
+    assert (variants, genes, species) == expected
+
+
+def test_indexed_panel_parses_the_same():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        panel = os.path.join(tmp_dir, "panel.fasta")
+        with open(panel, "w") as outfile:
+            for line in COVGS:
+                if line.strip():
+                    outfile.write(">%s\nACGT\n" % line.split("\t")[0])
+        expected = _parse(COVGS, panel)
+        assert expected.probe_ids == {}
+        index = Panel(panel).build_index()
+        assert len(index) == 10
+        assert list(index["group_size"][:4]) == [4, 0, 0, 0]
+        cp = _parse(COVGS, panel)
+        assert _summary(cp) == _summary(expected)
+        probe_name = "ref-A1T?num_alts=2&ref=t1"
+        assert cp.probe_ids == {probe_name: "A1T"}
+        gt = Genotyper(sample="s1", expected_depths=[20],
+                       variant_covgs={}, gene_presence_covgs={})
+        assert gt._name_to_id(probe_name) == "A1T"
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def _variant_call_ids(cp):
+    gt = Genotyper(sample="s1", expected_depths=[20],
+                   variant_covgs=cp.variant_covgs, gene_presence_covgs={},
+                   base_json={"s1": {}}, report_all_calls=True,
+                   probe_ids=cp.probe_ids)
+    gt.run()
+    return sorted(gt.out_json["s1"]["variant_calls"])
+
+
+def test_indexed_panel_reports_the_same_ids():
+    covgs = COVGS[:4] + [
+        "ref-B2C?var_name=X2Y&num_alts=1\t31\t0\t0\t0.0\t1\n",
+        "alt-B2C?var_name=X2Y&num_alts=1\t31\t20\t20\t1.0\t1\n",
+        "ref-C3G?var_name=C3G&gene=katG&mut=S315T&num_alts=1"
+        "\t31\t0\t0\t0.0\t1\n",
+        "alt-C3G?var_name=C3G&gene=katG&mut=S315T&num_alts=1"
+        "\t31\t20\t20\t1.0\t1\n"]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        panel = os.path.join(tmp_dir, "panel.fasta")
+        with open(panel, "w") as outfile:
+            for line in covgs:
+                outfile.write(">%s\nACGT\n" % line.split("\t")[0])
+        expected = _variant_call_ids(_parse(covgs, panel))
+        assert expected == ["A1T", "B2C", "katG_S315T-C3G"]
+        Panel(panel).build_index()
+        assert _variant_call_ids(_parse(covgs, panel)) == expected
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,34 @@
+import random
+
+from mykatlas.typing import ProbeCoverage
+from mykatlas.typing import SequenceProbeCoverage
+from mykatlas.typing.typer.presence import GeneCollectionTyper
+
+
+def _sorted_best_version(sequence_coverages, min_gene_percent_covg_threshold):
+    # The sort and scan get_best_version replaced
+    sequence_coverages = list(sequence_coverages)
+    sequence_coverages.sort(key=lambda x: x.percent_coverage, reverse=True)
+    current_best_genes = [sequence_coverages[0]]
+    for gene in sequence_coverages[1:]:
+        if gene.percent_coverage >= min_gene_percent_covg_threshold:
+            current_best_genes.append(gene)
+        else:
+            return current_best_genes
+    return current_best_genes
+
+
+def test_best_version_matches_full_sort():
+    rng = random.Random(6)
+    gt = GeneCollectionTyper(expected_depths=[50])
+    for _ in range(200):
+        versions = [SequenceProbeCoverage(
+            name="blaTEM",
+            probe_coverage=ProbeCoverage(
+                percent_coverage=rng.choice([0, 50, 98.5, 99, 99.5, 100]),
+                median_depth=10, min_depth=5, k_count=100),
+            version=str(v)) for v in range(rng.randint(1, 300))]
+        threshold = rng.choice([0, 99, 100, 101])
+        best = gt.get_best_version(iter(versions), threshold)
+        expected = _sorted_best_version(versions, threshold)
+        assert [g.version for g in best] == [g.version for g in expected]
@@ -0,0 +1,51 @@
+import json
+import random
+
+from mykatlas.typing import Genotyper
+from mykatlas.typing import SequenceProbeCoverage
+from mykatlas.typing import VariantProbeCoverage
+from random_coverage import random_probe_coverage
+
+
+def _covgs(rng, num_genes, num_variants):
+    genes = {}
+    for i in range(num_genes):
+        genes["gene%i" % i] = {
+            v: SequenceProbeCoverage(name="gene%i" % i,
+                                     probe_coverage=random_probe_coverage(rng),
+                                     version=v)
+            for v in range(rng.randint(1, 3))}
+    variants = {}
+    for i in range(num_variants):
+        variants["ref-A%iT?var_name=A%iT" % (i, i)] = [VariantProbeCoverage(
+            reference_coverages=[random_probe_coverage(rng)],
+            alternate_coverages=[random_probe_coverage(rng)],
+            var_name="A%iT" % i) for _ in range(rng.randint(1, 3))]
+    return genes, variants
+
+
+def _genotype(threads):
+    genes, variants = _covgs(random.Random(3), 200, 1000)
+    gt = Genotyper(sample="s1", expected_depths=[50],
+                   variant_covgs=variants, gene_presence_covgs=genes,
+                   base_json={"s1": {}}, report_all_calls=True,
+                   threads=threads)
+    gt.run()
+    return gt
+
+
+def test_parallel_typing_matches_serial():
+    serial = _genotype(1)
+    parallel = _genotype(2)
+    assert json.dumps(parallel.out_json, sort_keys=True) == json.dumps(
+        serial.out_json, sort_keys=True)
+    assert list(parallel.out_json["s1"]["variant_calls"]) == list(
+        serial.out_json["s1"]["variant_calls"])
+    assert list(parallel.gene_presence_covgs) == list(
+        serial.gene_presence_covgs)
+    # Workers' cache stats are summed, so both count every lookup
+    assert parallel._worker_cache_stats
+    lookups = [gt.likelihood_cache_stats["hits"] +
+               gt.likelihood_cache_stats["misses"]
+               for gt in [serial, parallel]]
+    assert lookups[0] == lookups[1] > 0
@@ -0,0 +1,31 @@
+import pickle
+
+from ga4ghmongo.schema import SequenceCall as SequenceCallDocument
+
+from mykatlas.typing import SequenceCall
+from mykatlas.typing import ProbeCoverage
+from mykatlas.typing import SequenceProbeCoverage
+from mykatlas.typing import PresenceTyper
+
+
+def test_to_dict_matches_mongo_document():
+    for gt, info in [("-/-", {}), ("1/1", {"copy_number": 1.5,
+                                            "coverage": {"median_depth": 3}})]:
+        call = SequenceCall(genotype=gt, genotype_likelihoods=[-1, -2.5, -9],
+                            info=info)
+        document = SequenceCallDocument.create(
+            sequence=None, call_set=None, genotype=gt,
+            genotype_likelihoods=[-1, -2.5, -9], info=info)
+        assert call.to_dict() == document.to_mongo().to_dict()
+        assert call.to_document().to_mongo().to_dict() == call.to_dict()
+        assert call.genotype_conf == document.genotype_conf
+
+
+def test_presence_typer_call_pickles():
+    pc = ProbeCoverage(min_depth=100, percent_coverage=100,
+                       median_depth=100, k_count=1000)
+    call = PresenceTyper(expected_depths=[100]).type(
+        SequenceProbeCoverage(name="A123T", probe_coverage=pc,
+                              percent_coverage_threshold=80))
+    assert call.genotype == [1, 1]
+    assert pickle.loads(pickle.dumps(call)).to_dict() == call.to_dict()
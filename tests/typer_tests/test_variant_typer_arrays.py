@@ -0,0 +1,63 @@
+import random
+
+from mykatlas.typing import VariantProbeCoverage
+from mykatlas.typing import VariantTyper
+from mykatlas.stats import LogPoissonCache
+from random_coverage import random_probe_coverage
+
+FILTERS = ["MISSING_WT", "LOW_PERCENT_COVERAGE", "LOW_GT_CONF"]
+
+
+def _variants(n, rng):
+    variants = []
+    for i in range(n):
+        vpcs = [VariantProbeCoverage(
+            reference_coverages=[random_probe_coverage(rng)],
+            alternate_coverages=[random_probe_coverage(rng)],
+            var_name="A%iT" % i) for _ in range(rng.randint(1, 3))]
+        variants.append(("ref-A%iT" % i, vpcs))
+    return variants
+
+
+def test_type_many_matches_type():
+    rng = random.Random(1)
+    variants = _variants(300, rng)
+    for model in ["kmer_count", "depth"]:
+        for contamination_depths in [[], [10]]:
+            vt = VariantTyper(expected_depths=[50], model=model,
+                              contamination_depths=contamination_depths,
+                              filters=FILTERS, confidence_threshold=3)
+            expected = [vt.type(vpcs, variant=v) for v, vpcs in variants]
+            calls = vt.type_many(variants)
+            assert len(calls) == len(expected)
+            for call, expected_call in zip(calls, expected):
+                assert call["variant"] == expected_call["variant"]
+                assert call["genotype"] == expected_call["genotype"]
+                assert call["info"] == expected_call["info"]
+                for l, expected_l in zip(call["genotype_likelihoods"],
+                                         expected_call["genotype_likelihoods"]):
+                    assert abs(l - expected_l) < 1e-6
+
+
+def test_type_many_with_no_variants():
+    assert VariantTyper(expected_depths=[50]).type_many([]) == []
+
+
+def test_typers_share_likelihood_cache():
+    rng = random.Random(2)
+    variants = _variants(100, rng)
+    cache = LogPoissonCache()
+    vt = VariantTyper(expected_depths=[50], model="kmer_count",
+                      likelihood_cache=cache)
+    uncached = VariantTyper(expected_depths=[50], model="kmer_count",
+                            likelihood_cache=LogPoissonCache(max_entries=0))
+    for v, vpcs in variants:
+        call = vt.type(vpcs, variant=v)
+        assert call["genotype_likelihoods"] == uncached.type(
+            vpcs, variant=v)["genotype_likelihoods"]
+    # Zero counts and the same expected depths repeat across probes
+    assert cache.hits > cache.misses
+    misses = cache.misses
+    for v, vpcs in variants:
+        vt.type(vpcs, variant=v)
+    assert cache.misses == misses